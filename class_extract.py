@@ -0,0 +1,443 @@
+"""Class diagrams extracted from Python source with :mod:`ast`.
+
+``generate_class_diagram`` walks a package, parses changed modules in a
+process pool and emits ``class_``/``class_rel`` entries for classes, their
+fields and methods, and inheritance between classes found in the tree.
+
+A :class:`ClassCache` persists each module's extraction keyed by mtime, size
+and SHA-256. Files whose mtime and size are unchanged are not even read;
+files that were touched but not edited are read and hashed but not parsed.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping, Sequence
+
+    from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+_CACHE_VERSION = 1
+# Below this many files to parse, pool start-up costs more than it saves.
+_POOL_MIN_FILES = 8
+_POOL_CHUNK_SIZE = 16
+_SKIP_DIRS = frozenset({"__pycache__", "node_modules"})
+_IDENT_RE = re.compile(r"\W+")
+_TYPE_SPACE_RE = re.compile(r"\s+")
+_INHERITS = "<|--"
+# Mermaid writes generics as List~int~; quotes from string annotations go.
+_TYPE_TRANSLATION = str.maketrans("[]", "~~", "\"'")
+
+Field = tuple[str, str | None]
+
+
+@dataclass(frozen=True)
+class ClassInfo:
+    module: str
+    qualname: str
+    bases: tuple[str, ...]
+    fields: tuple[Field, ...]
+    methods: tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        return self.qualname.rpartition(".")[2]
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "qualname": self.qualname,
+            "bases": list(self.bases),
+            "fields": [list(field) for field in self.fields],
+            "methods": list(self.methods),
+        }
+
+    @classmethod
+    def from_json(cls, module: str, payload: Mapping[str, object]) -> ClassInfo:
+        fields = cast("list[list[str | None]]", payload["fields"])
+        return cls(
+            module=module,
+            qualname=str(payload["qualname"]),
+            bases=tuple(cast("list[str]", payload["bases"])),
+            fields=tuple((str(name), kind) for name, kind in fields),
+            methods=tuple(cast("list[str]", payload["methods"])),
+        )
+
+
+@dataclass(frozen=True)
+class ClassReport:
+    files: int
+    parsed: int
+    cached: int
+    failed: int
+    classes: int
+    relationships: int
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "files": self.files,
+            "parsed": self.parsed,
+            "cached": self.cached,
+            "failed": self.failed,
+            "classes": self.classes,
+            "relationships": self.relationships,
+        }
+
+
+# Extraction (runs in worker processes)
+
+
+def _base_name(node: ast.expr) -> str:
+    if isinstance(node, ast.Subscript):  # Generic[T], Protocol[T]
+        node = node.value
+    return ast.unparse(node)
+
+
+def _self_attributes(method: ast.FunctionDef | ast.AsyncFunctionDef) -> Iterator[Field]:
+    if not method.args.args:
+        return
+    receiver = method.args.args[0].arg
+    for node in ast.walk(method):
+        if isinstance(node, ast.AnnAssign):
+            targets: list[ast.expr] = [node.target]
+            annotation: str | None = ast.unparse(node.annotation)
+        elif isinstance(node, ast.Assign):
+            targets, annotation = node.targets, None
+        else:
+            continue
+        for target in targets:
+            if (
+                isinstance(target, ast.Attribute)
+                and isinstance(target.value, ast.Name)
+                and target.value.id == receiver
+            ):
+                yield target.attr, annotation
+
+
+def _class_info(module: str, prefix: str, node: ast.ClassDef) -> ClassInfo:
+    fields: dict[str, str | None] = {}
+    methods: list[str] = []
+    for item in node.body:
+        if isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name):
+            fields[item.target.id] = ast.unparse(item.annotation)
+        elif isinstance(item, ast.Assign):
+            for target in item.targets:
+                if isinstance(target, ast.Name):
+                    fields.setdefault(target.id, None)
+        elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            methods.append(item.name)
+            for name, annotation in _self_attributes(item):
+                if annotation is not None or name not in fields:
+                    fields[name] = annotation
+    return ClassInfo(
+        module=module,
+        qualname=f"{prefix}{node.name}",
+        bases=tuple(_base_name(base) for base in node.bases),
+        fields=tuple(fields.items()),
+        methods=tuple(methods),
+    )
+
+
+def extract_classes(source: str | bytes, module: str) -> list[ClassInfo]:
+    """Classes defined at module level or nested in other classes."""
+    found: list[ClassInfo] = []
+
+    def visit(body: Iterable[ast.stmt], prefix: str) -> None:
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                found.append(_class_info(module, prefix, node))
+                visit(node.body, f"{prefix}{node.name}.")
+
+    visit(ast.parse(source, filename=module).body, "")
+    return found
+
+
+def _parse_file(path: str, module: str) -> list[dict[str, object]] | None:
+    try:
+        classes = extract_classes(Path(path).read_bytes(), module)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    return [info.to_json() for info in classes]
+
+
+# Cache
+
+
+@dataclass(frozen=True)
+class _CacheEntry:
+    mtime_ns: int
+    size: int
+    sha256: str
+    # None records a file that failed to parse, so it is not retried until
+    # it changes.
+    classes: tuple[dict[str, object], ...] | None
+
+
+class ClassCache:
+    """Per-file extraction results, persisted to ``path`` as JSON when given."""
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path is not None else None
+        self._entries: dict[str, _CacheEntry] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            payload_obj = cast("object", json.loads(self.path.read_bytes()))
+        except (OSError, ValueError):
+            return
+        if not isinstance(payload_obj, dict):
+            return
+        payload = cast("dict[str, object]", payload_obj)
+        if payload.get("version") != _CACHE_VERSION:
+            return
+        files = cast("dict[str, dict[str, object]]", payload.get("files", {}))
+        for key, entry in files.items():
+            self._entries[key] = _CacheEntry(
+                mtime_ns=cast("int", entry["mtime_ns"]),
+                size=cast("int", entry["size"]),
+                sha256=str(entry["sha256"]),
+                classes=(
+                    None
+                    if entry["classes"] is None
+                    else tuple(cast("list[dict[str, object]]", entry["classes"]))
+                ),
+            )
+
+    def get(self, key: str) -> _CacheEntry | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, entry: _CacheEntry) -> None:
+        self._entries[key] = entry
+
+    def prune(self, keep: Iterable[str]) -> None:
+        live = set(keep)
+        for key in [key for key in self._entries if key not in live]:
+            del self._entries[key]
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        payload = {
+            "version": _CACHE_VERSION,
+            "files": {
+                key: {
+                    "mtime_ns": entry.mtime_ns,
+                    "size": entry.size,
+                    "sha256": entry.sha256,
+                    "classes": (None if entry.classes is None else list(entry.classes)),
+                }
+                for key, entry in sorted(self._entries.items())
+            },
+        }
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            staging = self.path.with_suffix(f".{os.getpid()}.tmp")
+            staging.write_text(json.dumps(payload), encoding="utf-8")
+            staging.replace(self.path)
+
+
+# Package walk
+
+
+def _iter_modules(root: Path) -> Iterator[tuple[str, Path]]:
+    """``(module, path)`` for every ``.py`` file below ``root``, sorted."""
+    package = root.name
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if d not in _SKIP_DIRS and not d.startswith(".")
+        )
+        relative = Path(directory).relative_to(root).parts
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            stem = filename.removesuffix(".py")
+            parts = (
+                (package, *relative)
+                if stem == "__init__"
+                else (
+                    package,
+                    *relative,
+                    stem,
+                )
+            )
+            yield ".".join(parts), Path(directory) / filename
+
+
+def _parse_all(
+    jobs: Sequence[tuple[str, str]], max_workers: int | None
+) -> list[list[dict[str, object]] | None]:
+    if len(jobs) < _POOL_MIN_FILES or max_workers == 1:
+        return [_parse_file(path, module) for path, module in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(
+            pool.map(
+                _parse_file,
+                [path for path, _module in jobs],
+                [module for _path, module in jobs],
+                chunksize=_POOL_CHUNK_SIZE,
+            )
+        )
+
+
+def scan_package(
+    root: str | Path,
+    *,
+    cache: ClassCache | None = None,
+    max_workers: int | None = None,
+) -> tuple[list[ClassInfo], ClassReport]:
+    """Extract every class below ``root``, reusing ``cache`` where it can."""
+    base = Path(root).resolve()
+    store = cache if cache is not None else ClassCache()
+    results: dict[str, tuple[dict[str, object], ...] | None] = {}
+    modules: dict[str, str] = {}
+    stale: list[tuple[str, str, os.stat_result, str]] = []
+    cached = 0
+    for module, path in _iter_modules(base):
+        key = path.relative_to(base).as_posix()
+        modules[key] = module
+        stat = path.stat()
+        entry = store.get(key)
+        if entry is not None and (entry.mtime_ns, entry.size) == (
+            stat.st_mtime_ns,
+            stat.st_size,
+        ):
+            results[key] = entry.classes
+            cached += 1
+            continue
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        if entry is not None and entry.sha256 == digest:
+            store.put(
+                key, _CacheEntry(stat.st_mtime_ns, stat.st_size, digest, entry.classes)
+            )
+            results[key] = entry.classes
+            cached += 1
+            continue
+        stale.append((key, str(path), stat, digest))
+
+    parsed = _parse_all(
+        [(path, modules[key]) for key, path, _s, _d in stale], max_workers
+    )
+    for (key, _path, stat, digest), classes in zip(stale, parsed, strict=True):
+        results[key] = None if classes is None else tuple(classes)
+        store.put(
+            key, _CacheEntry(stat.st_mtime_ns, stat.st_size, digest, results[key])
+        )
+    store.prune(modules)
+    store.save()
+
+    infos = [
+        ClassInfo.from_json(modules[key], payload)
+        for key, payloads in sorted(results.items())
+        for payload in payloads or ()
+    ]
+    report = ClassReport(
+        files=len(modules),
+        parsed=len(stale),
+        cached=cached,
+        failed=sum(1 for payloads in results.values() if payloads is None),
+        classes=len(infos),
+        relationships=0,
+    )
+    return infos, report
+
+
+# Emission
+
+
+def _ident(name: str) -> str:
+    return _IDENT_RE.sub("_", name).strip("_") or "_"
+
+
+def _member(name: str) -> str:
+    return f"-{name}" if name.startswith("_") else f"+{name}"
+
+
+def _field(name: str, annotation: str | None) -> str:
+    if annotation is None:
+        return _member(name)
+    kind = _TYPE_SPACE_RE.sub("", annotation).translate(_TYPE_TRANSLATION)
+    return f"{_member(name)} {kind}"
+
+
+def _class_ids(classes: Sequence[ClassInfo]) -> dict[tuple[str, str], str]:
+    """Short names where unique, module-qualified ids where they collide."""
+    counts = Counter(info.name for info in classes)
+    return {
+        (info.module, info.qualname): (
+            _ident(info.name)
+            if counts[info.name] == 1
+            else _ident(f"{info.module}.{info.qualname}")
+        )
+        for info in classes
+    }
+
+
+def _resolve_base(
+    base: str, info: ClassInfo, by_name: Mapping[str, list[ClassInfo]]
+) -> ClassInfo | None:
+    candidates = by_name.get(base.rpartition(".")[2], [])
+    if len(candidates) == 1:
+        return candidates[0]
+    local = [c for c in candidates if c.module == info.module]
+    return local[0] if len(local) == 1 else None
+
+
+def generate_class_diagram(
+    builder: MermaidBuilder,
+    root: str | Path,
+    *,
+    cache: ClassCache | None = None,
+    max_workers: int | None = None,
+) -> ClassReport:
+    """Replace ``builder``'s document with a class diagram of ``root``.
+
+    Inheritance edges are drawn only between classes found under ``root``.
+    """
+    classes, report = scan_package(root, cache=cache, max_workers=max_workers)
+    ids = _class_ids(classes)
+    by_name: dict[str, list[ClassInfo]] = {}
+    for info in classes:
+        by_name.setdefault(info.name, []).append(info)
+    builder.class_diagram()
+    for info in classes:
+        builder.class_(
+            ids[info.module, info.qualname],
+            fields=[_field(name, annotation) for name, annotation in info.fields],
+            methods=[_member(name) for name in info.methods],
+        )
+    relationships = 0
+    for info in classes:
+        for base in info.bases:
+            parent = _resolve_base(base, info, by_name)
+            if parent is None or parent is info:
+                continue
+            builder.class_rel(
+                ids[parent.module, parent.qualname],
+                _INHERITS,
+                ids[info.module, info.qualname],
+            )
+            relationships += 1
+    return replace(report, relationships=relationships)
+
+
+__all__ = [
+    "ClassCache",
+    "ClassInfo",
+    "ClassReport",
+    "extract_classes",
+    "generate_class_diagram",
+    "scan_package",
+]
@@ -0,0 +1,385 @@
+"""Structural diffs between two versions of a flowchart.
+
+:func:`diff_flowcharts` compares the node and edge structure of two
+documents (builders, :class:`MermaidDoc` objects, or ``.mmd`` text read
+with :func:`parse_flowchart`). Both sides are indexed into dicts once, so a
+diff is linear in the size of the two diagrams.
+
+Nodes are matched by id and count as changed when their label or drawn
+shape differs (shapes the builder draws alike compare equal); nodes
+referenced only by edges are compared as bare ids. Edges are matched by
+endpoints, with repeated edges between the same pair matched in order, and
+count as changed when their label, arrow or style differs.
+
+:func:`render_diff` draws both versions as one flowchart, with added,
+removed and changed elements highlighted through ``style`` and
+``linkStyle`` lines.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from x_make_mermaid_x.x_cls_make_mermaid_x import FlowEdge, FlowNode, MermaidBuilder
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidDoc
+
+_FLOWCHART_HEADERS = ("flowchart", "graph")
+_DEFAULT_DIRECTION = "TD"
+# Lines that carry no node or edge structure; kept verbatim when parsing.
+_PASSTHROUGH = frozenset(
+    {"subgraph", "end", "direction", "style", "linkStyle", "classDef", "class", "click"}
+)
+# Node shape openers, longest first, mapped to the builder's shape names.
+_OPENERS: tuple[tuple[str, str, str | None], ...] = (
+    ("[[", "]]", "subroutine"),
+    ("[(", ")]", "cylinder"),
+    ("((", "))", "circle"),
+    ("{{", "}}", "hexagon"),
+    ("[", "]", None),
+    ("(", ")", "round"),
+    ("{", "}", "rhombus"),
+    (">", "]", "asym"),
+)
+_ID_RE = re.compile(r"\s*([\w.]+)")
+_ARROW_RE = re.compile(r"\s*(<?(?:-\.+-|-{2,}|={2,})[>ox]?|~~~)\s*")
+_TEXT_ARROW_RE = re.compile(r"\s*(--|==)\s+(.+?)\s+(-{2,}[>ox]?|={2,}>?)\s*")
+_PIPE_LABEL_RE = re.compile(r"\|([^|]*)\|\s*")
+
+
+class FlowchartSyntaxError(ValueError):
+    """A flowchart line could not be read as nodes and edges."""
+
+    def __init__(self, line_number: int, line: str) -> None:
+        super().__init__(f"line {line_number}: cannot parse {line!r}")
+        self.line_number = line_number
+        self.line = line
+
+
+def _unquote(text: str) -> str:
+    stripped = text.strip()
+    if len(stripped) > 1 and stripped[0] == stripped[-1] == '"':
+        return stripped[1:-1]
+    return stripped
+
+
+class _LineParser:
+    """Reads ``a[label] -->|text| b --> c`` statements left to right."""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.pos = 0
+
+    def node(self) -> FlowNode | None:
+        match = _ID_RE.match(self.text, self.pos)
+        if match is None:
+            return None
+        self.pos = match.end()
+        node_id = match.group(1)
+        for opener, closer, shape in _OPENERS:
+            if not self.text.startswith(opener, self.pos):
+                continue
+            start = self.pos + len(opener)
+            # Quoted labels may contain the closing delimiter.
+            search_from = start
+            if self.text.startswith('"', start):
+                search_from = self.text.find('"', start + 1) + 1
+            end = self.text.find(closer, max(search_from, start))
+            if end < 0:
+                return None
+            self.pos = end + len(closer)
+            return FlowNode(node_id, _unquote(self.text[start:end]), shape)
+        return FlowNode(node_id)
+
+    def link(self) -> tuple[str, str | None] | None:
+        match = _TEXT_ARROW_RE.match(self.text, self.pos)
+        if match is not None:
+            self.pos = match.end()
+            return match.group(3), match.group(2)
+        match = _ARROW_RE.match(self.text, self.pos)
+        if match is None:
+            return None
+        self.pos = match.end()
+        label = _PIPE_LABEL_RE.match(self.text, self.pos)
+        if label is None:
+            return match.group(1), None
+        self.pos = label.end()
+        return match.group(1), _unquote(label.group(1)) or None
+
+    def rest(self) -> str:
+        return self.text[self.pos :].strip()
+
+
+def _statements(source: str) -> Iterable[tuple[int, str]]:
+    for number, raw_line in enumerate(source.splitlines(), 1):
+        for part in raw_line.split(";"):
+            stripped = part.strip()
+            if stripped and not stripped.startswith("%%"):
+                yield number, stripped
+
+
+def _parse_statement(builder: MermaidBuilder, statement: str) -> bool:
+    parser = _LineParser(statement)
+    node = parser.node()
+    if node is None:
+        return False
+    if node.label is not None or not parser.rest():
+        builder.node(node.node_id, node.label, node.shape)
+    while parser.rest():
+        link = parser.link()
+        target = parser.node() if link is not None else None
+        if link is None or target is None:
+            return False
+        if target.label is not None:
+            builder.node(target.node_id, target.label, target.shape)
+        arrow, label = link
+        rest = parser.rest()
+        if rest.startswith("&"):
+            return False
+        # The builder writes an edge style after the target id.
+        style = None if not rest or _ARROW_RE.match(rest) else rest
+        builder.edge(node.node_id, target.node_id, label, arrow, style)
+        if style is not None:
+            break
+        node = target
+    return True
+
+
+def parse_flowchart(source: str) -> MermaidDoc:
+    """Parse flowchart text, such as a saved ``.mmd`` file, into a document.
+
+    Node declarations and edge chains are rebuilt through the builder, so the
+    result has the same structure a builder would have recorded; subgraph,
+    style and other decoration lines are kept as raw lines.
+    """
+    builder = MermaidBuilder()
+    statements = iter(_statements(source))
+    header = next(statements, None)
+    if header is None or header[1].split()[0] not in _FLOWCHART_HEADERS:
+        message = "source is not a flowchart"
+        raise ValueError(message)
+    words = header[1].split()
+    builder.flowchart(words[1] if len(words) > 1 else _DEFAULT_DIRECTION)
+    for number, statement in statements:
+        if statement.split(maxsplit=1)[0] in _PASSTHROUGH:
+            builder.raw(statement)
+        elif not _parse_statement(builder, statement):
+            raise FlowchartSyntaxError(number, statement)
+    return builder.doc
+
+
+EdgeKey = tuple[str, str, int]
+
+
+# Nodes are compared by the delimiters the builder draws them with, so a
+# saved .mmd diffs clean against the builder that wrote it: ``stadium`` is
+# drawn like ``circle``, and ``rect`` or unknown shapes as ``[...]``.
+_SHAPE_ALIASES = {"stadium": "circle"}
+_DRAWN_SHAPES = frozenset(shape for _opener, _closer, shape in _OPENERS if shape)
+
+
+def _shape(node: FlowNode) -> str | None:
+    if node.label is None or node.shape is None:
+        return None
+    shape = _SHAPE_ALIASES.get(node.shape, node.shape)
+    return shape if shape in _DRAWN_SHAPES else None
+
+
+def _node_index(doc: MermaidDoc) -> dict[str, FlowNode]:
+    nodes = dict(doc.nodes)
+    for edge in doc.edges:
+        nodes.setdefault(edge.src, FlowNode(edge.src))
+        nodes.setdefault(edge.dst, FlowNode(edge.dst))
+    return nodes
+
+
+def _edge_index(doc: MermaidDoc) -> dict[EdgeKey, FlowEdge]:
+    seen: dict[tuple[str, str], int] = {}
+    edges: dict[EdgeKey, FlowEdge] = {}
+    for edge in doc.edges:
+        pair = (edge.src, edge.dst)
+        occurrence = seen.get(pair, 0)
+        seen[pair] = occurrence + 1
+        edges[(*pair, occurrence)] = edge
+    return edges
+
+
+@dataclass
+class FlowchartDiff:
+    """Added, removed and changed elements between two flowcharts."""
+
+    added_nodes: list[str] = field(default_factory=list)
+    removed_nodes: list[str] = field(default_factory=list)
+    changed_nodes: list[str] = field(default_factory=list)
+    added_edges: list[EdgeKey] = field(default_factory=list)
+    removed_edges: list[EdgeKey] = field(default_factory=list)
+    changed_edges: list[EdgeKey] = field(default_factory=list)
+    old_nodes: dict[str, FlowNode] = field(default_factory=dict, repr=False)
+    new_nodes: dict[str, FlowNode] = field(default_factory=dict, repr=False)
+    old_edges: dict[EdgeKey, FlowEdge] = field(default_factory=dict, repr=False)
+    new_edges: dict[EdgeKey, FlowEdge] = field(default_factory=dict, repr=False)
+    direction: str = _DEFAULT_DIRECTION
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.added_nodes
+            or self.removed_nodes
+            or self.changed_nodes
+            or self.added_edges
+            or self.removed_edges
+            or self.changed_edges
+        )
+
+    def to_metadata(self) -> dict[str, object]:
+        def edges(keys: list[EdgeKey]) -> list[list[str]]:
+            return [[src, dst] for src, dst, _occurrence in keys]
+
+        return {
+            "added_nodes": list(self.added_nodes),
+            "removed_nodes": list(self.removed_nodes),
+            "changed_nodes": list(self.changed_nodes),
+            "added_edges": edges(self.added_edges),
+            "removed_edges": edges(self.removed_edges),
+            "changed_edges": edges(self.changed_edges),
+        }
+
+
+def _as_doc(diagram: MermaidBuilder | MermaidDoc) -> MermaidDoc:
+    doc = diagram.doc if isinstance(diagram, MermaidBuilder) else diagram
+    if doc.kind != "flowchart":
+        message = "diff_flowcharts() only supports flowchart diagrams"
+        raise ValueError(message)
+    return doc
+
+
+def diff_flowcharts(
+    old: MermaidBuilder | MermaidDoc, new: MermaidBuilder | MermaidDoc
+) -> FlowchartDiff:
+    """Compare the nodes and edges of two flowcharts."""
+    old_doc, new_doc = _as_doc(old), _as_doc(new)
+    words = new_doc.header.split()
+    diff = FlowchartDiff(
+        old_nodes=_node_index(old_doc),
+        new_nodes=_node_index(new_doc),
+        old_edges=_edge_index(old_doc),
+        new_edges=_edge_index(new_doc),
+        direction=words[1] if len(words) > 1 else _DEFAULT_DIRECTION,
+    )
+    for node_id, node in diff.new_nodes.items():
+        before = diff.old_nodes.get(node_id)
+        if before is None:
+            diff.added_nodes.append(node_id)
+        elif (before.label, _shape(before)) != (node.label, _shape(node)):
+            diff.changed_nodes.append(node_id)
+    diff.removed_nodes = [i for i in diff.old_nodes if i not in diff.new_nodes]
+    for key, edge in diff.new_edges.items():
+        previous = diff.old_edges.get(key)
+        if previous is None:
+            diff.added_edges.append(key)
+        elif (previous.label, previous.arrow, previous.style) != (
+            edge.label,
+            edge.arrow,
+            edge.style,
+        ):
+            diff.changed_edges.append(key)
+    diff.removed_edges = [k for k in diff.old_edges if k not in diff.new_edges]
+    return diff
+
+
+@dataclass(frozen=True)
+class DiffStyles:
+    """CSS used by :func:`render_diff`."""
+
+    added: str = "fill:#e6ffed,stroke:#22863a,stroke-width:2px"
+    removed: str = "fill:#ffeef0,stroke:#cb2431,stroke-dasharray:5 5"
+    changed: str = "fill:#fff5b1,stroke:#b08800,stroke-width:2px"
+    added_link: str = "stroke:#22863a,stroke-width:2px"
+    removed_link: str = "stroke:#cb2431,stroke-dasharray:5 5"
+    changed_link: str = "stroke:#b08800,stroke-width:2px"
+
+
+def render_diff(
+    builder: MermaidBuilder, diff: FlowchartDiff, styles: DiffStyles | None = None
+) -> MermaidBuilder:
+    """Replace ``builder``'s document with both versions overlaid.
+
+    Nodes and edges of the new version come first, followed by removed ones;
+    changed elements are drawn as they are in the new version.
+    """
+    css = styles or DiffStyles()
+    builder.flowchart(diff.direction)
+    nodes = [*diff.new_nodes.values()]
+    nodes.extend(diff.old_nodes[node_id] for node_id in diff.removed_nodes)
+    for node in nodes:
+        builder.node(node.node_id, node.label, node.shape)
+    edges = [*diff.new_edges.values()]
+    edges.extend(diff.old_edges[key] for key in diff.removed_edges)
+    for edge in edges:
+        builder.edge(edge.src, edge.dst, edge.label, edge.arrow, edge.style)
+
+    for node_ids, style in (
+        (diff.added_nodes, css.added),
+        (diff.removed_nodes, css.removed),
+        (diff.changed_nodes, css.changed),
+    ):
+        for node_id in node_ids:
+            builder.style_node(node_id, style)
+    # linkStyle counts edges in the order they were drawn above.
+    position = {key: index for index, key in enumerate(diff.new_edges)}
+    offset = len(position)
+    position.update(
+        (key, offset + index) for index, key in enumerate(diff.removed_edges)
+    )
+    for keys, style in (
+        (diff.added_edges, css.added_link),
+        (diff.removed_edges, css.removed_link),
+        (diff.changed_edges, css.changed_link),
+    ):
+        for key in keys:
+            builder.link_style(position[key], style)
+    return builder
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff two flowchart .mmd files")
+    parser.add_argument("old", help="Previous version")
+    parser.add_argument("new", help="Current version")
+    parser.add_argument("--highlight", help="Write an overlay diagram to this path")
+    parsed = parser.parse_args(argv)
+    old_doc, new_doc = (
+        parse_flowchart(Path(cast("str", path)).read_text(encoding="utf-8"))
+        for path in (parsed.old, parsed.new)
+    )
+    diff = diff_flowcharts(old_doc, new_doc)
+    highlight = cast("str | None", parsed.highlight)
+    if highlight:
+        render_diff(MermaidBuilder(), diff).save(highlight)
+    json.dump(diff.to_metadata(), sys.stdout)
+    sys.stdout.write("\n")
+    return 0 if diff.is_empty else 1
+
+
+__all__ = [
+    "DiffStyles",
+    "EdgeKey",
+    "FlowchartDiff",
+    "FlowchartSyntaxError",
+    "diff_flowcharts",
+    "main",
+    "parse_flowchart",
+    "render_diff",
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
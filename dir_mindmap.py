@@ -0,0 +1,239 @@
+"""Mindmaps of directory trees.
+
+``generate_dir_mindmap`` walks a tree with :func:`os.scandir`, one directory
+listing at a time, and emits every node once through
+:meth:`MermaidBuilder.mindmap_entry`. Directory labels carry the file count
+and size of their whole subtree; the label line is reserved when the
+directory is entered and filled in once its children have been walked, so
+totals need no second pass.
+
+Directories at ``max_depth`` are summarised rather than expanded, and each
+directory shows at most ``max_children`` entries followed by an "N more…"
+node that totals the rest.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_MAX_CHILDREN = 20
+_SIZE_UNITS: tuple[str, ...] = ("B", "KiB", "MiB", "GiB", "TiB")
+_UNIT_STEP = 1024
+_SEPARATOR = " · "
+_DIR_SHAPE = ("[", "]")
+_FILE_SHAPE = ("(", ")")
+_OVERFLOW_SHAPE = ("{{", "}}")
+
+
+@dataclass(frozen=True)
+class MindmapOptions:
+    """Walk limits for :func:`generate_dir_mindmap`.
+
+    ``aggregate=False`` stops the walk at ``max_depth``; directories there
+    are then shown without totals.
+    """
+
+    max_depth: int = DEFAULT_MAX_DEPTH
+    max_children: int = DEFAULT_MAX_CHILDREN
+    include_files: bool = True
+    include_hidden: bool = False
+    aggregate: bool = True
+
+
+@dataclass
+class _Totals:
+    files: int = 0
+    bytes: int = 0
+
+    def add(self, other: _Totals) -> None:
+        self.files += other.files
+        self.bytes += other.bytes
+
+
+@dataclass
+class MindmapReport:
+    nodes: int = 0
+    directories: int = 0
+    files: int = 0
+    bytes: int = 0
+    overflow_nodes: int = 0
+    unreadable: list[str] = field(default_factory=list)
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "nodes": self.nodes,
+            "directories": self.directories,
+            "files": self.files,
+            "bytes": self.bytes,
+            "overflow_nodes": self.overflow_nodes,
+            "unreadable": list(self.unreadable),
+        }
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in _SIZE_UNITS[:-1]:
+        if value < _UNIT_STEP:
+            return f"{size} B" if unit == "B" else f"{value:.1f} {unit}"
+        value /= _UNIT_STEP
+    return f"{value:.1f} {_SIZE_UNITS[-1]}"
+
+
+def _quote(text: str) -> str:
+    # Quoted node text keeps brackets in file names from being read as
+    # mindmap shape delimiters.
+    return '"' + text.replace('"', "'") + '"'
+
+
+class _Walker:
+    def __init__(
+        self, builder: MermaidBuilder, options: MindmapOptions, report: MindmapReport
+    ) -> None:
+        self.builder = builder
+        self.options = options
+        self.report = report
+        self.ids = 0
+
+    def _emit(
+        self, depth: int, shape: tuple[str, str], text: str, node_id: int = 0
+    ) -> int:
+        """Append a node and return its line index; ``node_id`` rewrites it."""
+        if not node_id:
+            self.ids += 1
+            self.report.nodes += 1
+            node_id = self.ids
+        opening, closing = shape
+        self.builder.mindmap_entry(depth, f"n{node_id}{opening}{_quote(text)}{closing}")
+        return len(self.builder.doc.lines) - 1
+
+    def _entries(self, path: str) -> list[os.DirEntry[str]]:
+        try:
+            with os.scandir(path) as listing:
+                entries = [
+                    entry
+                    for entry in listing
+                    if self.options.include_hidden or not entry.name.startswith(".")
+                ]
+        except OSError:
+            self.report.unreadable.append(path)
+            return []
+        # Directories first, then files, each by name.
+        entries.sort(key=lambda e: (not e.is_dir(follow_symlinks=False), e.name))
+        return entries
+
+    def _file_size(self, entry: os.DirEntry[str]) -> int:
+        try:
+            return entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            self.report.unreadable.append(entry.path)
+            return 0
+
+    def totals(self, path: str) -> _Totals:
+        """Totals of a subtree that is not displayed, walked iteratively."""
+        totals = _Totals()
+        pending = [path]
+        while pending:
+            for entry in self._entries(pending.pop()):
+                if entry.is_dir(follow_symlinks=False):
+                    self.report.directories += 1
+                    pending.append(entry.path)
+                else:
+                    totals.files += 1
+                    totals.bytes += self._file_size(entry)
+        return totals
+
+    def directory(self, path: str, name: str, depth: int) -> _Totals:
+        index = self._emit(depth, _DIR_SHAPE, name)
+        node_id = self.ids
+        self.report.directories += 1
+        if depth >= self.options.max_depth:
+            if not self.options.aggregate:
+                return _Totals()
+            totals = self.totals(path)
+        else:
+            totals = self._children(path, depth + 1)
+        label = _SEPARATOR.join(
+            (f"{name}/", f"{totals.files} files", format_size(totals.bytes))
+        )
+        # Fill in the line reserved on entry now that the totals are known.
+        lines = self.builder.doc.lines
+        self._emit(depth, _DIR_SHAPE, label, node_id)
+        lines[index] = lines.pop()
+        return totals
+
+    def _children(self, path: str, depth: int) -> _Totals:
+        totals = _Totals()
+        hidden = _Totals()
+        hidden_entries = 0
+        shown = 0
+        for entry in self._entries(path):
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and not self.options.include_files:
+                totals.files += 1
+                totals.bytes += self._file_size(entry)
+                continue
+            if shown >= self.options.max_children:
+                hidden_entries += 1
+                if is_dir:
+                    self.report.directories += 1
+                    sub = (
+                        self.totals(entry.path) if self.options.aggregate else _Totals()
+                    )
+                else:
+                    sub = _Totals(1, self._file_size(entry))
+                hidden.add(sub)
+                continue
+            shown += 1
+            if is_dir:
+                totals.add(self.directory(entry.path, entry.name, depth))
+            else:
+                size = self._file_size(entry)
+                totals.add(_Totals(1, size))
+                self._emit(
+                    depth, _FILE_SHAPE, f"{entry.name}{_SEPARATOR}{format_size(size)}"
+                )
+        if hidden_entries:
+            self.report.overflow_nodes += 1
+            self._emit(
+                depth,
+                _OVERFLOW_SHAPE,
+                f"{hidden_entries} more…{_SEPARATOR}{format_size(hidden.bytes)}",
+            )
+            totals.add(hidden)
+        return totals
+
+
+def generate_dir_mindmap(
+    builder: MermaidBuilder,
+    root: str | Path,
+    options: MindmapOptions | None = None,
+) -> MindmapReport:
+    """Replace ``builder``'s document with a mindmap of the tree at ``root``."""
+    base = Path(root)
+    if not base.is_dir():
+        message = f"not a directory: {base}"
+        raise NotADirectoryError(message)
+    report = MindmapReport()
+    builder.mindmap()
+    walker = _Walker(builder, options or MindmapOptions(), report)
+    totals = walker.directory(str(base), base.resolve().name or str(base), 0)
+    report.files = totals.files
+    report.bytes = totals.bytes
+    return report
+
+
+__all__ = [
+    "DEFAULT_MAX_CHILDREN",
+    "DEFAULT_MAX_DEPTH",
+    "MindmapOptions",
+    "MindmapReport",
+    "format_size",
+    "generate_dir_mindmap",
+]
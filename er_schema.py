@@ -0,0 +1,334 @@
+"""ER diagrams generated from database schemas.
+
+``generate_er`` drives :meth:`MermaidBuilder.er`, ``er_entity`` and ``er_rel``
+from any :class:`SchemaIntrospector`. :class:`SQLiteIntrospector` reads a
+SQLite catalog with two ordered cursors (columns and foreign keys) that are
+merged table by table, so the whole schema is never materialised at once.
+
+Warehouse-sized schemas rarely fit mmdc in one diagram; :class:`ErOptions`
+narrows them with name filters, a per-entity column cap, the connected
+subset around a seed table and an overall table cap.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from collections import deque
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol, Self
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from types import TracebackType
+
+    from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+_IDENT_RE = re.compile(r"[^\w-]+")
+_TYPE_RE = re.compile(r"[^\w()\[\]-]+")
+# SQLite gives columns declared without a type BLOB affinity.
+_UNTYPED = "BLOB"
+_TABLES_WHERE = "m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'"
+_COLUMNS_SQL = f"""
+SELECT m.name, c.name, c.type, c."notnull", c.pk
+FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS c
+WHERE {_TABLES_WHERE}
+ORDER BY m.name, c.cid
+"""  # noqa: S608 - constant fragment, no user input
+_FOREIGN_KEYS_SQL = f"""
+SELECT m.name, f.id, f."table", f."from", f."to"
+FROM sqlite_master AS m JOIN pragma_foreign_key_list(m.name) AS f
+WHERE {_TABLES_WHERE}
+ORDER BY m.name, f.id, f.seq
+"""  # noqa: S608 - constant fragment, no user input
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str
+    not_null: bool = False
+    primary_key: bool = False
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    columns: tuple[str, ...]
+    ref_table: str
+    ref_columns: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    name: str
+    columns: tuple[Column, ...]
+    foreign_keys: tuple[ForeignKey, ...] = ()
+
+    def neighbours(self) -> set[str]:
+        return {fk.ref_table for fk in self.foreign_keys}
+
+
+class SchemaIntrospector(Protocol):
+    """Yields tables one at a time; implementations should not buffer."""
+
+    def iter_tables(self) -> Iterator[TableSchema]: ...
+
+
+_ColumnRow = tuple[str, str, str, int, int]
+_ForeignKeyRow = tuple[str, int, str, str, str | None]
+
+
+def _foreign_keys(rows: Iterable[_ForeignKeyRow]) -> tuple[ForeignKey, ...]:
+    keys: list[ForeignKey] = []
+    for _fk_id, group in groupby(rows, key=itemgetter(1)):
+        members = list(group)
+        ref_columns = tuple(row[4] for row in members if row[4] is not None)
+        keys.append(
+            ForeignKey(
+                columns=tuple(row[3] for row in members),
+                ref_table=members[0][2],
+                ref_columns=ref_columns,
+            )
+        )
+    return tuple(keys)
+
+
+class SQLiteIntrospector:
+    """Streams table schemas out of a SQLite database."""
+
+    def __init__(self, database: str | Path | sqlite3.Connection) -> None:
+        if isinstance(database, sqlite3.Connection):
+            self._connection = database
+            self._owned = False
+        else:
+            uri = f"{Path(database).resolve().as_uri()}?mode=ro"
+            self._connection = sqlite3.connect(uri, uri=True)
+            self._owned = True
+
+    def iter_tables(self) -> Iterator[TableSchema]:
+        columns = self._connection.execute(_COLUMNS_SQL)
+        fk_groups = groupby(
+            self._connection.execute(_FOREIGN_KEYS_SQL), key=itemgetter(0)
+        )
+        fk_table, fk_rows = next(fk_groups, (None, iter(())))
+        for table, rows in groupby(columns, key=itemgetter(0)):
+            # Both cursors are ordered by table name; advance the foreign
+            # key cursor until it reaches this table.
+            while fk_table is not None and fk_table < table:
+                fk_table, fk_rows = next(fk_groups, (None, iter(())))
+            foreign_keys: tuple[ForeignKey, ...] = ()
+            if fk_table == table:
+                foreign_keys = _foreign_keys(fk_rows)
+                fk_table, fk_rows = next(fk_groups, (None, iter(())))
+            yield TableSchema(
+                name=table,
+                columns=tuple(
+                    Column(name, type_, bool(not_null), bool(pk))
+                    for _table, name, type_, not_null, pk in rows
+                ),
+                foreign_keys=foreign_keys,
+            )
+
+    def close(self) -> None:
+        if self._owned:
+            self._connection.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+@dataclass(frozen=True)
+class ErOptions:
+    """Which tables and columns :func:`generate_er` emits.
+
+    ``include``/``exclude`` are case-sensitive glob patterns on table names.
+    ``seed`` keeps only tables connected to it through foreign keys, at most
+    ``depth`` hops away when given. ``max_columns`` caps attributes per
+    entity (key columns first); ``max_tables`` caps entities overall.
+    """
+
+    include: tuple[str, ...] = ()
+    exclude: tuple[str, ...] = ()
+    max_columns: int | None = None
+    seed: str | None = None
+    depth: int | None = None
+    max_tables: int | None = None
+
+    def selects(self, table: str) -> bool:
+        if self.include and not any(fnmatchcase(table, p) for p in self.include):
+            return False
+        return not any(fnmatchcase(table, p) for p in self.exclude)
+
+
+@dataclass(frozen=True)
+class ErReport:
+    tables: int
+    relationships: int
+    truncated_columns: int
+    omitted_tables: int
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "tables": self.tables,
+            "relationships": self.relationships,
+            "truncated_columns": self.truncated_columns,
+            "omitted_tables": self.omitted_tables,
+        }
+
+
+def _ident(name: str) -> str:
+    return _IDENT_RE.sub("_", name).strip("_") or "_"
+
+
+def _unique_ident(name: str, taken: set[str]) -> str:
+    """``_ident(name)``, suffixed when another table already maps to it."""
+    base = _ident(name)
+    ident = base
+    suffix = 2
+    while ident in taken:
+        ident = f"{base}_{suffix}"
+        suffix += 1
+    taken.add(ident)
+    return ident
+
+
+def _attribute(column: Column, fk_columns: set[str]) -> str:
+    type_name = _TYPE_RE.sub("_", column.type).strip("_") or _UNTYPED
+    keys = [
+        key
+        for key, flag in (
+            ("PK", column.primary_key),
+            ("FK", column.name in fk_columns),
+        )
+        if flag
+    ]
+    suffix = f" {', '.join(keys)}" if keys else ""
+    return f"{type_name} {_ident(column.name)}{suffix}"
+
+
+def _attributes(table: TableSchema, max_columns: int | None) -> tuple[list[str], int]:
+    fk_columns = {name for fk in table.foreign_keys for name in fk.columns}
+    columns = table.columns
+    if max_columns is not None and len(columns) > max_columns:
+        ranked = sorted(
+            range(len(columns)),
+            key=lambda i: not (columns[i].primary_key or columns[i].name in fk_columns),
+        )
+        keep = sorted(ranked[:max_columns])
+        hidden = len(columns) - len(keep)
+        fields = [_attribute(columns[i], fk_columns) for i in keep]
+        fields.append(f'string _more "{hidden} more columns"')
+        return fields, hidden
+    return [_attribute(column, fk_columns) for column in columns], 0
+
+
+def _relationship(fk: ForeignKey, table: TableSchema) -> tuple[str, str]:
+    required = all(
+        column.not_null for column in table.columns if column.name in fk.columns
+    )
+    card = "}o--||" if required else "}o--o|"
+    return card, f'"{", ".join(fk.columns)}"'
+
+
+def _connected_subset(
+    tables: Iterable[TableSchema], options: ErOptions
+) -> list[TableSchema]:
+    """Tables within ``options.depth`` foreign-key hops of the seed, nearest first."""
+    by_name: dict[str, TableSchema] = {}
+    adjacency: dict[str, set[str]] = {}
+    for table in tables:
+        by_name[table.name] = table
+        for neighbour in table.neighbours():
+            if neighbour != table.name:
+                adjacency.setdefault(table.name, set()).add(neighbour)
+                adjacency.setdefault(neighbour, set()).add(table.name)
+    seed = options.seed
+    if seed is None or seed not in by_name:
+        message = f"seed table not found among selected tables: {seed!r}"
+        raise ValueError(message)
+    order = [seed]
+    distance = {seed: 0}
+    frontier = deque(order)
+    while frontier:
+        current = frontier.popleft()
+        if options.depth is not None and distance[current] >= options.depth:
+            continue
+        for neighbour in sorted(adjacency.get(current, ())):
+            if neighbour in by_name and neighbour not in distance:
+                distance[neighbour] = distance[current] + 1
+                order.append(neighbour)
+                frontier.append(neighbour)
+    return [by_name[name] for name in order]
+
+
+def generate_er(
+    builder: MermaidBuilder,
+    introspector: SchemaIntrospector,
+    options: ErOptions | None = None,
+) -> ErReport:
+    """Replace ``builder``'s document with an ER diagram of the schema.
+
+    Entities are emitted as tables stream in; relationships are held back
+    until the end and only emitted when both ends made it into the diagram.
+    Table names that sanitise to the same identifier (``"a b"`` and ``a_b``)
+    get numbered entity ids, and relationships resolve through them.
+    """
+    opts = options or ErOptions()
+    builder.er()
+    tables: Iterable[TableSchema] = (
+        table for table in introspector.iter_tables() if opts.selects(table.name)
+    )
+    if opts.seed is not None:
+        tables = _connected_subset(tables, opts)
+    entity_ids: dict[str, str] = {}
+    taken: set[str] = set()
+    pending: list[tuple[str, str, str, str]] = []
+    truncated = 0
+    omitted = 0
+    for table in tables:
+        if opts.max_tables is not None and len(entity_ids) >= opts.max_tables:
+            omitted += 1
+            continue
+        fields, hidden = _attributes(table, opts.max_columns)
+        truncated += hidden
+        entity = _unique_ident(table.name, taken)
+        builder.er_entity(entity, *fields)
+        entity_ids[table.name] = entity
+        for fk in table.foreign_keys:
+            card, label = _relationship(fk, table)
+            pending.append((table.name, card, fk.ref_table, label))
+    relationships = 0
+    for child, card, parent, label in pending:
+        if parent in entity_ids:
+            builder.er_rel(entity_ids[child], card, entity_ids[parent], label)
+            relationships += 1
+    return ErReport(
+        tables=len(entity_ids),
+        relationships=relationships,
+        truncated_columns=truncated,
+        omitted_tables=omitted,
+    )
+
+
+__all__ = [
+    "Column",
+    "ErOptions",
+    "ErReport",
+    "ForeignKey",
+    "SQLiteIntrospector",
+    "SchemaIntrospector",
+    "TableSchema",
+    "generate_er",
+]
@@ -0,0 +1,360 @@
+"""gitGraph diagrams generated from repository history.
+
+:func:`read_git_log` streams ``git log --topo-order`` and stops the process
+once ``max_commits`` have been read, so the cost of a large history is
+bounded by the window rather than the repository. :func:`generate_gitgraph`
+turns that window into ``git_branch``/``git_checkout``/``git_commit``/
+``git_merge`` calls.
+
+Lanes follow first parents and are named newest-first: branch refs claim
+their first-parent history (the checked-out branch first), merge commits
+name their second parent's lane from the usual "Merge branch 'x'" subjects,
+and anything left over gets a numbered lane. Linear runs of unreferenced
+commits collapse into a single ``first..last`` commit.
+
+mermaid can only branch from the tip of the checked-out branch, so lanes
+are created right after the commit they fork from. Commits whose parents
+fall outside the window fork from whatever is checked out at that point.
+"""
+
+from __future__ import annotations
+
+import re
+import subprocess
+from dataclasses import dataclass, field
+from itertools import count, islice
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from pathlib import Path
+
+    from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+DEFAULT_MAX_COMMITS = 500
+DEFAULT_MIN_RUN = 3
+_SHORT_HASH = 7
+_FIELD_SEP = "\x1f"
+_LOG_FORMAT = "%H%x1f%P%x1f%D%x1f%s"
+_MERMAID_MAIN = "main"
+_HEAD_PREFIX = "HEAD -> "
+_TAG_PREFIX = "tag: "
+_BRANCH_NAME_RE = re.compile(r"[^\w./-]+")
+_MERGE_SUBJECT_RE = re.compile(
+    r"^Merge (?:(?:remote-tracking )?branch '([^']+)'|pull request #\d+ from (\S+))"
+)
+# Lane name sources, strongest first; a weaker claim never displaces a
+# stronger one on a shared first-parent ancestor.
+_RANK_HEAD, _RANK_REF, _RANK_MERGE, _RANK_ANON = range(4)
+
+
+@dataclass(frozen=True)
+class GitCommit:
+    sha: str
+    parents: tuple[str, ...]
+    branches: tuple[str, ...] = ()
+    tags: tuple[str, ...] = ()
+    subject: str = ""
+    head: bool = False
+
+    @classmethod
+    def from_log_line(cls, line: str) -> GitCommit:
+        sha, parents, decorations, subject = line.rstrip("\n").split(_FIELD_SEP, 3)
+        branches: list[str] = []
+        tags: list[str] = []
+        head = False
+        for ref in filter(None, (part.strip() for part in decorations.split(","))):
+            if ref.startswith(_TAG_PREFIX):
+                tags.append(ref.removeprefix(_TAG_PREFIX))
+            elif ref.startswith(_HEAD_PREFIX):
+                head = True
+                branches.insert(0, ref.removeprefix(_HEAD_PREFIX))
+            elif ref != "HEAD" and not ref.endswith("/HEAD"):
+                branches.append(ref)
+        return cls(
+            sha=sha,
+            parents=tuple(parents.split()),
+            branches=tuple(branches),
+            tags=tuple(tags),
+            subject=subject,
+            head=head,
+        )
+
+
+def read_git_log(
+    repo: str | Path,
+    *,
+    revisions: Sequence[str] = ("HEAD",),
+    max_commits: int = DEFAULT_MAX_COMMITS,
+) -> Iterator[GitCommit]:
+    """Stream at most ``max_commits`` commits, newest first, in topo order."""
+    argv = [
+        "git",
+        "-C",
+        str(repo),
+        "log",
+        "--topo-order",
+        "--decorate=short",
+        f"--format={_LOG_FORMAT}",
+        f"--max-count={max_commits}",
+        *revisions,
+        "--",
+    ]
+    process = subprocess.Popen(  # noqa: S603 - fixed argv, no shell
+        argv,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    stdout = process.stdout
+    if stdout is None:  # pragma: no cover - PIPE always yields a stream
+        message = "git log produced no output stream"
+        raise RuntimeError(message)
+    try:
+        for line in stdout:
+            yield GitCommit.from_log_line(line)
+    finally:
+        # Callers that stop early leave git blocked on a full pipe.
+        if process.poll() is None:
+            process.kill()
+        _out, stderr = process.communicate()
+    if process.returncode != 0:
+        message = f"git log failed: {stderr.strip()}"
+        raise RuntimeError(message)
+
+
+@dataclass(frozen=True)
+class GitGraphOptions:
+    """``min_run`` is the shortest linear run collapsed; ``None`` disables it."""
+
+    max_commits: int = DEFAULT_MAX_COMMITS
+    min_run: int | None = DEFAULT_MIN_RUN
+
+
+@dataclass(frozen=True)
+class GitGraphReport:
+    commits: int
+    nodes: int
+    branches: int
+    merges: int
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "commits": self.commits,
+            "nodes": self.nodes,
+            "branches": self.branches,
+            "merges": self.merges,
+        }
+
+
+@dataclass
+class _Node:
+    """One emitted commit: a single commit or a collapsed linear run."""
+
+    members: list[GitCommit]
+
+    @property
+    def head(self) -> GitCommit:
+        return self.members[0]
+
+    @property
+    def tail(self) -> GitCommit:
+        return self.members[-1]
+
+
+@dataclass
+class _Lanes:
+    names: dict[int, str] = field(default_factory=dict)
+    ranks: dict[int, int] = field(default_factory=dict)
+    ids: Iterator[int] = field(default_factory=count)
+
+    def new(self, name: str, rank: int) -> int:
+        lane = next(self.ids)
+        self.names[lane] = _BRANCH_NAME_RE.sub("_", name) or "branch"
+        self.ranks[lane] = rank
+        return lane
+
+
+def _merge_source(subject: str) -> str | None:
+    match = _MERGE_SUBJECT_RE.match(subject)
+    if match is None:
+        return None
+    return match.group(1) or match.group(2)
+
+
+def _claim_lanes(window: Sequence[GitCommit], lanes: _Lanes) -> dict[str, int]:
+    """Assign every commit to a lane, visiting children before parents."""
+    claims: dict[str, int] = {}
+
+    def outranks(sha: str, rank: int) -> bool:
+        current = claims.get(sha)
+        return current is None or rank < lanes.ranks[current]
+
+    def claim_new(sha: str, name: str | None, rank: int) -> None:
+        if outranks(sha, rank):
+            claims[sha] = lanes.new(name or f"lane{len(lanes.names)}", rank)
+
+    for commit in window:
+        if commit.branches:
+            rank = _RANK_HEAD if commit.head else _RANK_REF
+            claim_new(commit.sha, commit.branches[0], rank)
+        claim_new(commit.sha, None, _RANK_ANON)
+        lane = claims[commit.sha]
+        if commit.parents and outranks(commit.parents[0], lanes.ranks[lane]):
+            claims[commit.parents[0]] = lane
+        source = _merge_source(commit.subject)
+        for parent in commit.parents[1:]:
+            claim_new(parent, source, _RANK_MERGE if source else _RANK_ANON)
+    return claims
+
+
+def _collapse(
+    ordered: Sequence[GitCommit], children: dict[str, int], min_run: int | None
+) -> list[_Node]:
+    """Group linear runs; ``ordered`` is parents first."""
+    nodes: list[_Node] = []
+    run_of: dict[str, _Node] = {}
+    for commit in ordered:
+        parent = commit.parents[0] if len(commit.parents) == 1 else None
+        run = run_of.pop(parent, None) if parent is not None else None
+        if (
+            run is not None
+            and min_run is not None
+            and children.get(run.tail.sha, 0) == 1
+            and not (run.tail.branches or run.tail.tags)
+            and len(run.tail.parents) <= 1
+        ):
+            run.members.append(commit)
+        else:
+            if run is not None:
+                run_of[run.tail.sha] = run
+            run = _Node([commit])
+            nodes.append(run)
+        run_of[commit.sha] = run
+    if min_run is None:
+        return nodes
+    expanded: list[_Node] = []
+    for node in nodes:
+        if len(node.members) >= min_run:
+            expanded.append(node)
+        else:
+            expanded.extend(_Node([member]) for member in node.members)
+    return expanded
+
+
+def _label(node: _Node) -> str:
+    head, tail = node.head.sha[:_SHORT_HASH], node.tail.sha[:_SHORT_HASH]
+    if len(node.members) == 1:
+        return head
+    return f"{head}..{tail} ({len(node.members)})"
+
+
+class _Emitter:
+    """Tracks mermaid's branch state while nodes are written."""
+
+    def __init__(self, builder: MermaidBuilder, lanes: _Lanes) -> None:
+        self.builder = builder.gitgraph()
+        self.lanes = lanes
+        self.created: dict[int, str] = {}
+        self.taken: set[str] = set()
+        self.current: int | None = None
+        self.merges = 0
+        self.emitted = 0
+
+    def _name(self, lane: int) -> str:
+        base = self.lanes.names[lane]
+        name, suffix = base, 1
+        while name in self.taken:
+            suffix += 1
+            name = f"{base}-{suffix}"
+        self.taken.add(name)
+        self.created[lane] = name
+        return name
+
+    def branch(self, lane: int) -> None:
+        """Create ``lane`` at the checked-out tip and switch to it."""
+        name = self._name(lane)
+        if self.current is None:
+            if name != _MERMAID_MAIN:
+                self.builder.set_directive({"gitGraph": {"mainBranchName": name}})
+        else:
+            self.builder.git_branch(name)
+        self.current = lane
+
+    def checkout(self, lane: int) -> None:
+        if lane not in self.created:
+            self.branch(lane)
+        elif self.current != lane:
+            self.builder.git_checkout(self.created[lane])
+            self.current = lane
+
+    def commit(self, node: _Node, lane: int, sources: Iterable[int]) -> None:
+        self.checkout(lane)
+        label = _label(node)
+        tag = ", ".join(node.tail.tags) or None
+        merged = [
+            source
+            for source in dict.fromkeys(sources)
+            if source != lane and source in self.created
+        ]
+        for index, source in enumerate(merged):
+            commit_id = label if index == 0 else f"{label}-{index + 1}"
+            self.builder.git_merge(self.created[source], commit_id=commit_id, tag=tag)
+        if not merged:
+            self.builder.git_commit(tag, commit_id=label)
+        self.merges += len(merged)
+        self.emitted += max(len(merged), 1)
+
+
+def generate_gitgraph(
+    builder: MermaidBuilder,
+    commits: Iterable[GitCommit],
+    options: GitGraphOptions | None = None,
+) -> GitGraphReport:
+    """Replace ``builder``'s document with a gitGraph of ``commits``.
+
+    ``commits`` must be newest first in topological order, as produced by
+    :func:`read_git_log`; only the first ``max_commits`` are used.
+    """
+    opts = options or GitGraphOptions()
+    window = list(islice(commits, opts.max_commits))
+    lanes = _Lanes()
+    claims = _claim_lanes(window, lanes)
+    present = {commit.sha for commit in window}
+    children: dict[str, int] = {}
+    forks: dict[str, list[int]] = {}
+    for commit in window:
+        for parent in commit.parents:
+            if parent in present:
+                children[parent] = children.get(parent, 0) + 1
+        first = commit.parents[0] if commit.parents else None
+        if first in present and claims[commit.sha] != claims[first]:
+            forks.setdefault(first, []).insert(0, claims[commit.sha])
+
+    emitter = _Emitter(builder, lanes)
+    for node in _collapse(window[::-1], children, opts.min_run):
+        sources = (claims[p] for p in node.head.parents[1:] if p in present)
+        emitter.commit(node, claims[node.tail.sha], sources)
+        for fork in forks.get(node.tail.sha, ()):
+            if fork not in emitter.created:
+                emitter.branch(fork)
+
+    return GitGraphReport(
+        commits=len(window),
+        nodes=emitter.emitted,
+        branches=len(emitter.created),
+        merges=emitter.merges,
+    )
+
+
+__all__ = [
+    "DEFAULT_MAX_COMMITS",
+    "DEFAULT_MIN_RUN",
+    "GitCommit",
+    "GitGraphOptions",
+    "GitGraphReport",
+    "generate_gitgraph",
+    "read_git_log",
+]
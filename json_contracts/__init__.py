@@ -163,6 +163,75 @@ _DOCUMENT_SCHEMA: dict[str, object] = {
     "additionalProperties": False,
 }
 
+_REDUCE_SCHEMA: dict[str, object] = {
+    "type": "object",
+    "properties": {
+        "max_nodes": {"type": "integer", "minimum": 1},
+        "strategies": {
+            "type": "array",
+            "items": {
+                "type": "string",
+                "enum": ["transitive", "chains", "cluster", "top_k"],
+            },
+        },
+        "cluster_by": {"type": "string", "enum": ["prefix", "shape", "group"]},
+        "prefix_separator": {"type": "string", "minLength": 1},
+        "prefix_depth": {"type": "integer", "minimum": 1},
+        "groups": {
+            "type": "object",
+            "additionalProperties": {"type": "string", "minLength": 1},
+        },
+    },
+    "required": ["max_nodes"],
+    "additionalProperties": False,
+}
+
+_COEFFICIENTS_SCHEMA: dict[str, object] = {
+    "type": "array",
+    "items": {"type": "number"},
+    "minItems": 6,
+    "maxItems": 6,
+}
+
+_BUDGET_SCHEMA: dict[str, object] = {
+    "type": "object",
+    "properties": {
+        "max_seconds": {"type": "number", "exclusiveMinimum": 0},
+        "max_svg_bytes": {"type": "integer", "minimum": 1},
+        "action": {"type": "string", "enum": ["reject", "reduce", "split"]},
+        "model": {
+            "type": "object",
+            "properties": {
+                "time_coefficients": _COEFFICIENTS_SCHEMA,
+                "size_coefficients": _COEFFICIENTS_SCHEMA,
+                "kind_factors": {
+                    "type": "object",
+                    "additionalProperties": {"type": "number"},
+                },
+            },
+            "additionalProperties": False,
+        },
+    },
+    "anyOf": [
+        {"required": ["max_seconds"]},
+        {"required": ["max_svg_bytes"]},
+    ],
+    "additionalProperties": False,
+}
+
+_OPTIMIZE_SVG_SCHEMA: dict[str, object] = {
+    "anyOf": [
+        {"type": "boolean"},
+        {
+            "type": "object",
+            "properties": {
+                "precision": {"type": ["integer", "null"], "minimum": 0},
+            },
+            "additionalProperties": False,
+        },
+    ],
+}
+
 _EXPORT_SCHEMA: dict[str, object] = {
     "type": "object",
     "properties": {
@@ -181,6 +250,16 @@ _EXPORT_SCHEMA: dict[str, object] = {
         },
         "binary_path": {"type": ["string", "null"], "minLength": 1},
         "detail": {"type": ["string", "null"]},
+        "optimization": {
+            "type": "object",
+            "properties": {
+                "bytes_before": {"type": "integer", "minimum": 0},
+                "bytes_after": {"type": "integer", "minimum": 0},
+                "precision": {"type": ["integer", "null"], "minimum": 0},
+            },
+            "required": ["bytes_before", "bytes_after"],
+            "additionalProperties": False,
+        },
     },
     "required": [
         "exporter",
@@ -195,12 +274,20 @@ _EXPORT_SCHEMA: dict[str, object] = {
     "additionalProperties": False,
 }
 
+_SHA256_SCHEMA: dict[str, object] = {"type": "string", "pattern": "^[0-9a-f]{64}$"}
+
 _MERMAID_ARTIFACT_SCHEMA: dict[str, object] = {
     "type": "object",
     "properties": {
         "source_path": {"type": "string", "minLength": 1},
         "source_bytes": {"type": "integer", "minimum": 0},
+        "source_sha256": _SHA256_SCHEMA,
         "svg": _EXPORT_SCHEMA,
+        "svg_sha256": _SHA256_SCHEMA,
+        "precompressed": {
+            "type": "array",
+            "items": {"type": "string", "minLength": 1},
+        },
     },
     "required": ["source_path", "source_bytes"],
     "additionalProperties": False,
@@ -219,8 +306,14 @@ INPUT_SCHEMA: dict[str, object] = {
                 "output_svg": {"type": ["string", "null"], "minLength": 1},
                 "mermaid_cli_path": {"type": ["string", "null"], "minLength": 1},
                 "export_svg": {"type": "boolean"},
+                "optimize_svg": _OPTIMIZE_SVG_SCHEMA,
+                "precompress": {"type": "boolean"},
+                "canonical": {"type": "boolean"},
                 "document": _DOCUMENT_SCHEMA,
                 "source": {"type": "string", "minLength": 1},
+                "reduce": _REDUCE_SCHEMA,
+                "budget": _BUDGET_SCHEMA,
+                "timeout_seconds": {"type": "number", "exclusiveMinimum": 0},
             },
             "required": ["output_mermaid"],
             "additionalProperties": False,
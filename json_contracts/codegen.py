@@ -0,0 +1,328 @@
+"""Compile the JSON contracts into specialised Python validators.
+
+Generic jsonschema validation walks the schema for every node and edge. The
+generator here turns a schema into straight-line Python with inlined type
+checks, frozen-set enums and precompiled ``pattern`` regexes. Generated
+validators only answer "valid or not"; callers re-run jsonschema on failure
+when they need the error message and path.
+
+Only the keywords the contracts use are supported; anything else raises
+``ValueError`` at generation time rather than being silently ignored.
+"""
+
+from __future__ import annotations
+
+import copy
+import re
+from collections.abc import Callable, Mapping, Sequence
+from typing import cast
+
+from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, INPUT_SCHEMA, OUTPUT_SCHEMA
+
+Validator = Callable[[object], bool]
+
+# ``format`` is an annotation under jsonschema's default (non-asserting) mode.
+_ANNOTATIONS = frozenset({"$schema", "title", "description", "format"})
+_KEYWORDS = frozenset(
+    {
+        "type",
+        "const",
+        "enum",
+        "minLength",
+        "pattern",
+        "minimum",
+        "exclusiveMinimum",
+        "items",
+        "minItems",
+        "maxItems",
+        "properties",
+        "required",
+        "additionalProperties",
+        "anyOf",
+    }
+)
+
+_TYPE_CHECKS: dict[str, str] = {
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "string": "isinstance({v}, str)",
+    "boolean": "isinstance({v}, bool)",
+    "null": "{v} is None",
+    "number": "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    "integer": (
+        "((isinstance({v}, int) and not isinstance({v}, bool))"
+        " or (isinstance({v}, float) and {v}.is_integer()))"
+    ),
+}
+_NUMBER_GUARD = "isinstance({v}, (int, float)) and not isinstance({v}, bool)"
+
+
+def _json_equal(left: object, right: object) -> bool:
+    """Equality as JSON Schema defines it: booleans never equal numbers."""
+    if isinstance(left, bool) or isinstance(right, bool):
+        return type(left) is type(right) and left == right
+    if isinstance(left, list) and isinstance(right, list):
+        left_items = cast("list[object]", left)
+        right_items = cast("list[object]", right)
+        return len(left_items) == len(right_items) and all(
+            _json_equal(a, b) for a, b in zip(left_items, right_items, strict=True)
+        )
+    if isinstance(left, dict) and isinstance(right, dict):
+        left_map = cast("dict[object, object]", left)
+        right_map = cast("dict[object, object]", right)
+        return left_map.keys() == right_map.keys() and all(
+            _json_equal(value, right_map[key]) for key, value in left_map.items()
+        )
+    return left == right
+
+
+class _Generator:
+    def __init__(self) -> None:
+        self.namespace: dict[str, object] = {"_json_equal": _json_equal}
+        self.functions: list[list[str]] = []
+        self._names = 0
+
+    def name(self, prefix: str) -> str:
+        self._names += 1
+        return f"{prefix}{self._names}"
+
+    def constant(self, prefix: str, value: object) -> str:
+        name = self.name(prefix)
+        self.namespace[name] = value
+        return name
+
+    def function(self, schema: Mapping[str, object]) -> str:
+        name = self.name("_check_")
+        body = self.body(schema, "value")
+        self.functions.append(
+            [
+                f"def {name}(value):",
+                *(f"    {line}" for line in body),
+                "    return True",
+            ]
+        )
+        return name
+
+    def body(self, schema: Mapping[str, object], var: str) -> list[str]:
+        unknown = set(schema) - _KEYWORDS - _ANNOTATIONS
+        if unknown:
+            message = f"unsupported schema keywords: {sorted(unknown)}"
+            raise ValueError(message)
+        lines: list[str] = []
+        lines.extend(self._type(schema, var))
+        lines.extend(self._values(schema, var))
+        lines.extend(self._string(schema, var))
+        lines.extend(self._number(schema, var))
+        lines.extend(self._array(schema, var))
+        lines.extend(self._object(schema, var))
+        if "anyOf" in schema:
+            branches = cast("Sequence[Mapping[str, object]]", schema["anyOf"])
+            calls = " or ".join(f"{self.function(b)}({var})" for b in branches)
+            lines += [f"if not ({calls}):", "    return False"]
+        return lines
+
+    def _type(self, schema: Mapping[str, object], var: str) -> list[str]:
+        if "type" not in schema:
+            return []
+        declared = schema["type"]
+        types = [declared] if isinstance(declared, str) else declared
+        checks = [_TYPE_CHECKS[str(t)].format(v=var) for t in cast("list[str]", types)]
+        return [f"if not ({' or '.join(checks)}):", "    return False"]
+
+    def _values(self, schema: Mapping[str, object], var: str) -> list[str]:
+        lines: list[str] = []
+        if "const" in schema:
+            const = self.constant("_const_", schema["const"])
+            lines += [f"if not _json_equal({var}, {const}):", "    return False"]
+        if "enum" in schema:
+            options = cast("list[object]", schema["enum"])
+            strings = [o for o in options if isinstance(o, str)]
+            if len(strings) + options.count(None) == len(options):
+                enum = self.constant("_enum_", frozenset(strings))
+                check = f"(isinstance({var}, str) and {var} in {enum})"
+                if None in options:
+                    check = f"({var} is None or {check})"
+            else:
+                enum = self.constant("_enum_", tuple(options))
+                check = f"any(_json_equal({var}, option) for option in {enum})"
+            lines += [f"if not {check}:", "    return False"]
+        return lines
+
+    def _string(self, schema: Mapping[str, object], var: str) -> list[str]:
+        checks: list[str] = []
+        if "minLength" in schema:
+            checks.append(f"len({var}) < {int(cast('int', schema['minLength']))}")
+        if "pattern" in schema:
+            regex = self.constant("_re_", re.compile(str(schema["pattern"])))
+            checks.append(f"{regex}.search({var}) is None")
+        if not checks:
+            return []
+        return [
+            f"if isinstance({var}, str) and ({' or '.join(checks)}):",
+            "    return False",
+        ]
+
+    def _number(self, schema: Mapping[str, object], var: str) -> list[str]:
+        checks: list[str] = []
+        if "minimum" in schema:
+            checks.append(f"{var} < {schema['minimum']!r}")
+        if "exclusiveMinimum" in schema:
+            checks.append(f"{var} <= {schema['exclusiveMinimum']!r}")
+        if not checks:
+            return []
+        guard = _NUMBER_GUARD.format(v=var)
+        return [f"if {guard} and ({' or '.join(checks)}):", "    return False"]
+
+    def _array(self, schema: Mapping[str, object], var: str) -> list[str]:
+        inner: list[str] = []
+        if "minItems" in schema:
+            minimum = int(cast("int", schema["minItems"]))
+            inner += [f"if len({var}) < {minimum}:", "    return False"]
+        if "maxItems" in schema:
+            maximum = int(cast("int", schema["maxItems"]))
+            inner += [f"if len({var}) > {maximum}:", "    return False"]
+        if "items" in schema:
+            item = self.name("item")
+            item_body = self.body(cast("Mapping[str, object]", schema["items"]), item)
+            if item_body:
+                inner += [f"for {item} in {var}:", *_indent(item_body)]
+        if not inner:
+            return []
+        return [f"if isinstance({var}, list):", *_indent(inner)]
+
+    def _object(self, schema: Mapping[str, object], var: str) -> list[str]:
+        properties = cast(
+            "Mapping[str, Mapping[str, object]]", schema.get("properties", {})
+        )
+        inner: list[str] = []
+        required = cast("list[str]", schema.get("required", []))
+        if required:
+            missing = " or ".join(f"{key!r} not in {var}" for key in required)
+            inner += [f"if {missing}:", "    return False"]
+        for key, subschema in properties.items():
+            prop = self.name("prop")
+            prop_body = self.body(subschema, prop)
+            if prop_body:
+                inner += [
+                    f"if {key!r} in {var}:",
+                    f"    {prop} = {var}[{key!r}]",
+                    *_indent(prop_body),
+                ]
+        inner += self._additional(schema, var, properties)
+        if not inner:
+            return []
+        return [f"if isinstance({var}, dict):", *_indent(inner)]
+
+    def _additional(
+        self,
+        schema: Mapping[str, object],
+        var: str,
+        properties: Mapping[str, object],
+    ) -> list[str]:
+        additional = schema.get("additionalProperties", True)
+        if additional is True:
+            return []
+        known = self.constant("_known_", frozenset(properties))
+        if additional is False:
+            return [f"if not {known}.issuperset({var}):", "    return False"]
+        extra = self.name("extra")
+        extra_body = self.body(cast("Mapping[str, object]", additional), extra)
+        if not extra_body:
+            return []
+        if not properties:
+            return [f"for {extra} in {var}.values():", *_indent(extra_body)]
+        key = self.name("key")
+        return [
+            f"for {key}, {extra} in {var}.items():",
+            f"    if {key} in {known}:",
+            "        continue",
+            *_indent(extra_body),
+        ]
+
+
+def _indent(lines: Sequence[str]) -> list[str]:
+    return [f"    {line}" for line in lines]
+
+
+def generate_validator_source(
+    schema: Mapping[str, object], name: str = "validate"
+) -> tuple[str, dict[str, object]]:
+    """Return Python source defining ``name(value) -> bool`` and its globals."""
+    generator = _Generator()
+    entry = generator.function(schema)
+    lines = [line for function in generator.functions for line in [*function, ""]]
+    lines.append(f"{name} = {entry}")
+    return "\n".join(lines) + "\n", generator.namespace
+
+
+def compile_validator(
+    schema: Mapping[str, object], name: str = "validate"
+) -> Validator:
+    """Generate, compile and return a fast validator for ``schema``."""
+    source, namespace = generate_validator_source(schema, name)
+    code = compile(source, f"<json_contracts.codegen:{name}>", "exec")
+    exec(code, namespace)  # noqa: S102 - executes source generated from our schemas
+    return cast("Validator", namespace[name])
+
+
+DOCUMENT_ARRAYS: tuple[str, ...] = (
+    "directives",
+    "comments",
+    "nodes",
+    "edges",
+    "lines",
+    "instructions",
+)
+
+
+def _document_properties(schema: Mapping[str, object]) -> dict[str, object]:
+    node: object = schema
+    for key in ("properties", "parameters", "properties", "document", "properties"):
+        node = cast("Mapping[str, object]", node)[key]
+    return cast("dict[str, object]", node)
+
+
+def _document_item_schema(name: str) -> Mapping[str, object]:
+    array = cast("Mapping[str, object]", _document_properties(INPUT_SCHEMA)[name])
+    return cast("Mapping[str, object]", array["items"])
+
+
+def _without_document_items(schema: Mapping[str, object]) -> dict[str, object]:
+    """Copy of ``schema`` that checks document arrays but not their elements."""
+    shell = copy.deepcopy(dict(schema))
+    properties = _document_properties(shell)
+    for name in DOCUMENT_ARRAYS:
+        cast("dict[str, object]", properties[name]).pop("items")
+    return shell
+
+
+is_valid_input: Validator = compile_validator(INPUT_SCHEMA, "is_valid_input")
+is_valid_output: Validator = compile_validator(OUTPUT_SCHEMA, "is_valid_output")
+is_valid_error: Validator = compile_validator(ERROR_SCHEMA, "is_valid_error")
+# For single-pass loaders: the shell validates everything except document
+# array elements, which are checked one by one with DOCUMENT_ITEM_VALIDATORS
+# while they are applied.
+is_valid_input_shell: Validator = compile_validator(
+    _without_document_items(INPUT_SCHEMA), "is_valid_input_shell"
+)
+DOCUMENT_ITEM_SCHEMAS: dict[str, Mapping[str, object]] = {
+    name: _document_item_schema(name) for name in DOCUMENT_ARRAYS
+}
+DOCUMENT_ITEM_VALIDATORS: dict[str, Validator] = {
+    name: compile_validator(schema, f"is_valid_{name}_item")
+    for name, schema in DOCUMENT_ITEM_SCHEMAS.items()
+}
+
+
+__all__ = [
+    "DOCUMENT_ARRAYS",
+    "DOCUMENT_ITEM_SCHEMAS",
+    "DOCUMENT_ITEM_VALIDATORS",
+    "Validator",
+    "compile_validator",
+    "generate_validator_source",
+    "is_valid_error",
+    "is_valid_input",
+    "is_valid_input_shell",
+    "is_valid_output",
+]
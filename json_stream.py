@@ -0,0 +1,175 @@
+"""Incremental JSON reading for very large payload files.
+
+``JsonStreamReader`` walks objects and arrays token by token and decodes one
+value at a time from a bounded buffer, so a multi-gigabyte array can be
+consumed element by element without materialising the whole document.
+A single value may be at most ``max_value_size`` characters; the reader
+raises ``ValueError`` rather than buffer more.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import IO, TYPE_CHECKING, NoReturn
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+DEFAULT_MAX_VALUE_SIZE = 1 << 27
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class JsonStreamReader:
+    """Pull parser over a text stream.
+
+    Containers are walked with :meth:`iter_object` / :meth:`iter_array`;
+    every key or element position they yield must be consumed with
+    :meth:`read_value`, :meth:`skip_value` or a nested iterator before the
+    iteration continues.
+    """
+
+    def __init__(
+        self,
+        handle: IO[str],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_value_size: int = DEFAULT_MAX_VALUE_SIZE,
+    ) -> None:
+        self._handle = handle
+        self._chunk_size = chunk_size
+        self._max_value_size = max_value_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._consumed = 0
+
+    @property
+    def offset(self) -> int:
+        """Characters consumed so far, for error messages."""
+        return self._consumed + self._pos
+
+    def _fill(self, size: int | None = None) -> bool:
+        if self._eof:
+            return False
+        chunk = self._handle.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._consumed += self._pos
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _fail(self, expected: str) -> NoReturn:
+        message = f"expected {expected} at offset {self.offset}"
+        raise ValueError(message)
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            end = len(buffer)
+            while pos < end and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < end:
+                return buffer[pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        if self.peek() != char:
+            self._fail(repr(char))
+        self._pos += 1
+
+    def read_value(self) -> object:
+        """Decode the next complete JSON value."""
+        self.peek()
+        # Each failed decode restarts at the value, so the read size doubles
+        # to keep a large value linear in its length.
+        read_size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if len(self._buffer) - self._pos > self._max_value_size:
+                    message = (
+                        f"JSON value at offset {self.offset} is malformed or"
+                        f" longer than {self._max_value_size} characters"
+                    )
+                    raise ValueError(message) from None
+                if not self._fill(read_size):
+                    raise
+                read_size *= 2
+                continue
+            # A number cut by the buffer edge (``1.`` of ``1.25``, ``2e`` of
+            # ``2e-3``) decodes to its prefix; refill until a delimiter follows.
+            if self._may_continue(value, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _may_continue(self, value: object, end: int) -> bool:
+        if end == len(self._buffer):
+            return True
+        if isinstance(value, bool) or not isinstance(value, int | float):
+            return False
+        return all(char in _NUMBER_CHARS for char in self._buffer[end:])
+
+    def skip_value(self) -> None:
+        """Consume the next value, walking containers so memory stays bounded."""
+        char = self.peek()
+        if char == "{":
+            for _key in self.iter_object():
+                self.skip_value()
+        elif char == "[":
+            for _index in self.iter_array():
+                self.skip_value()
+        else:
+            self.read_value()
+
+    def _separator(self, close: str) -> bool:
+        char = self.peek()
+        if char not in (",", close):
+            self._fail(f"',' or {close!r}")
+        self._pos += 1
+        return char == ","
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield each key of the next object; the caller consumes its value."""
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                self._fail("object key")
+            key = self.read_value()
+            self._expect(":")
+            yield str(key)
+            if not self._separator("}"):
+                return
+
+    def iter_array(self) -> Iterator[int]:
+        """Yield the index of each element; the caller consumes the element."""
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if not self._separator("]"):
+                return
+
+    def iter_values(self) -> Iterator[object]:
+        """Decode the elements of the next array one at a time."""
+        for _index in self.iter_array():
+            yield self.read_value()
+
+
+__all__ = ["DEFAULT_CHUNK_SIZE", "DEFAULT_MAX_VALUE_SIZE", "JsonStreamReader"]
@@ -0,0 +1,289 @@
+"""Lightweight metrics for Mermaid render operations.
+
+Metrics are disabled by default. Instrumented code fetches the registry with
+:func:`active_metrics` (or uses :func:`timed`) and does no bookkeeping while
+it is ``None``. Enabled registries expose Prometheus text and/or push
+snapshots to a callback.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from itertools import accumulate
+from pathlib import Path
+
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+METRIC_PREFIX = "x_make_mermaid_"
+_METRICS_FILE_ENV = "X_MAKE_MERMAID_METRICS_FILE"
+_DEFAULT_FLUSH_INTERVAL = 1.0
+
+_HELP: dict[str, str] = {
+    "renders_total": "Mermaid CLI exports attempted.",
+    "render_failures_total": "Mermaid CLI exports that did not produce an SVG.",
+    "cli_cache_hits_total": "Mermaid CLI lookups served from the binary cache.",
+    "cli_cache_misses_total": "Mermaid CLI lookups that required a search.",
+    "bytes_written_total": "Bytes written to Mermaid source and SVG files.",
+    "svg_bytes_saved_total": "Bytes removed from SVG files by the optimizer.",
+    "source_seconds": "Time spent assembling Mermaid source text.",
+    "schema_validation_seconds": "Time spent validating JSON payloads.",
+    "export_seconds": "Wall time of Mermaid CLI exports.",
+    "queue_wait_seconds": "Time payloads waited in the render scheduler.",
+    "memo_hits_total": "main_json results served from the result memo.",
+    "memo_misses_total": "main_json payloads the result memo could not serve.",
+}
+
+LabelSet = tuple[tuple[str, str], ...]
+MetricKey = tuple[str, LabelSet]
+MetricsCallback = Callable[[Mapping[str, object]], None]
+
+
+class _Histogram:
+    __slots__ = ("count", "counts", "total")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelSet, extra: tuple[str, str] | None = None) -> str:
+    pairs = [*labels, extra] if extra else list(labels)
+    if not pairs:
+        return ""
+    body = ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs)
+    return "{" + body + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return f"{bound:g}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms.
+
+    ``prometheus_file`` and ``callback`` are refreshed by :meth:`flush`, at
+    most once per ``flush_interval`` seconds unless forced.
+    """
+
+    def __init__(
+        self,
+        *,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        prometheus_file: str | Path | None = None,
+        callback: MetricsCallback | None = None,
+        flush_interval: float = _DEFAULT_FLUSH_INTERVAL,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._buckets = tuple(sorted(buckets))
+        self._counters: dict[MetricKey, float] = {}
+        self._histograms: dict[MetricKey, _Histogram] = {}
+        self._prometheus_file = Path(prometheus_file) if prometheus_file else None
+        self._callback = callback
+        self._flush_interval = flush_interval
+        self._last_flush = 0.0
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(self._buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = _Histogram(len(self._buckets))
+                self._histograms[key] = histogram
+            if index < len(histogram.counts):
+                histogram.counts[index] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def observations(self, name: str, **labels: str) -> int:
+        with self._lock:
+            histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+            return histogram.count if histogram else 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict[str, object]:
+        """Plain-data copy of every metric, keyed by Prometheus series name."""
+        with self._lock:
+            counters = {
+                METRIC_PREFIX + name + _format_labels(labels): value
+                for (name, labels), value in sorted(self._counters.items())
+            }
+            histograms = {
+                f"{METRIC_PREFIX}{name}{_format_labels(labels)}": {
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "buckets": dict(
+                        zip(
+                            map(_format_bound, self._buckets),
+                            accumulate(histogram.counts),
+                            strict=True,
+                        )
+                    ),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        described: set[str] = set()
+
+        def describe(name: str, kind: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            help_text = _HELP.get(name)
+            if help_text:
+                lines.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                describe(name, "counter")
+                lines.append(
+                    f"{METRIC_PREFIX}{name}{_format_labels(labels)} {_format_value(value)}"
+                )
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                describe(name, "histogram")
+                series = METRIC_PREFIX + name
+                cumulative = list(accumulate(histogram.counts))
+                for bound, count in zip(self._buckets, cumulative, strict=True):
+                    le = ("le", _format_bound(bound))
+                    lines.append(f"{series}_bucket{_format_labels(labels, le)} {count}")
+                inf = _format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{series}_bucket{inf} {histogram.count}")
+                lines.append(
+                    f"{series}_sum{_format_labels(labels)} {histogram.total!r}"
+                )
+                lines.append(
+                    f"{series}_count{_format_labels(labels)} {histogram.count}"
+                )
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write_prometheus(self, path: str | Path | None = None) -> Path:
+        """Atomically write :meth:`to_prometheus` for a node-exporter textfile."""
+        target = Path(path) if path else self._prometheus_file
+        if target is None:
+            message = "no Prometheus metrics file configured"
+            raise ValueError(message)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(
+            dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(self.to_prometheus())
+        Path(tmp_name).replace(target)
+        return target
+
+    def flush(self, *, force: bool = False) -> None:
+        """Push metrics to the configured file and callback."""
+        if self._prometheus_file is None and self._callback is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_flush < self._flush_interval:
+                return
+            self._last_flush = now
+        if self._prometheus_file is not None:
+            self.write_prometheus()
+        if self._callback is not None:
+            self._callback(self.snapshot())
+
+
+_ACTIVE: MetricsRegistry | None = None
+_DISABLED_TIMER: AbstractContextManager[None] = nullcontext()
+
+
+def active_metrics() -> MetricsRegistry | None:
+    """Return the enabled registry, or ``None`` when metrics are off."""
+    return _ACTIVE
+
+
+def enable_metrics(registry: MetricsRegistry | None = None) -> MetricsRegistry:
+    global _ACTIVE  # noqa: PLW0603 - process-wide switch
+    _ACTIVE = registry or MetricsRegistry()
+    return _ACTIVE
+
+
+def disable_metrics() -> None:
+    global _ACTIVE  # noqa: PLW0603 - process-wide switch
+    _ACTIVE = None
+
+
+def timed(name: str, **labels: str) -> AbstractContextManager[None]:
+    """Time a block into histogram ``name``; a shared no-op when disabled."""
+    registry = _ACTIVE
+    if registry is None:
+        return _DISABLED_TIMER
+    return registry.time(name, **labels)
+
+
+def flush_metrics() -> None:
+    registry = _ACTIVE
+    if registry is not None:
+        registry.flush()
+
+
+if os.environ.get(_METRICS_FILE_ENV):
+    enable_metrics(MetricsRegistry(prometheus_file=os.environ[_METRICS_FILE_ENV]))
+
+
+__all__ = [
+    "LATENCY_BUCKETS",
+    "METRIC_PREFIX",
+    "MetricsCallback",
+    "MetricsRegistry",
+    "active_metrics",
+    "disable_metrics",
+    "enable_metrics",
+    "flush_metrics",
+    "timed",
+]
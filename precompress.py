@@ -0,0 +1,193 @@
+"""Precompressed sidecars for static file servers.
+
+``PrecompressPool`` writes ``<file>.gz`` (and ``<file>.br`` when a brotli
+module is installed) next to rendered artifacts on background threads, so
+compression of one diagram overlaps with the render of the next. Sidecars
+are written atomically and gzip headers carry no timestamp, so identical
+inputs produce byte-identical sidecars.
+"""
+
+from __future__ import annotations
+
+import gzip
+import importlib
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol, Self, cast
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Sequence
+    from types import TracebackType
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+_DEFAULT_WORKERS = 2
+# Optional modules providing ``compress(data, quality=...)``.
+_BROTLI_MODULES: tuple[str, ...] = ("brotli", "brotlicffi")
+
+
+class _BrotliModule(Protocol):
+    def compress(self, data: bytes, *, quality: int = ...) -> bytes: ...
+
+
+def _load_brotli() -> _BrotliModule | None:
+    for name in _BROTLI_MODULES:
+        try:
+            return cast("_BrotliModule", importlib.import_module(name))
+        except ImportError:
+            continue
+    return None
+
+
+_BROTLI = _load_brotli()
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(data: bytes) -> bytes:
+    if _BROTLI is None:
+        message = "brotli compression requires the 'brotli' package"
+        raise RuntimeError(message)
+    return _BROTLI.compress(data, quality=BROTLI_QUALITY)
+
+
+_ENCODINGS: dict[str, tuple[str, Callable[[bytes], bytes]]] = {
+    "gzip": (".gz", _gzip),
+    "br": (".br", _brotli),
+}
+
+
+def available_encodings() -> tuple[str, ...]:
+    """Encodings this interpreter can produce, gzip first."""
+    return ("gzip", "br") if _BROTLI is not None else ("gzip",)
+
+
+def sidecar_path(path: str | Path, encoding: str) -> Path:
+    target = Path(path)
+    return target.with_name(target.name + _ENCODINGS[encoding][0])
+
+
+def _write_atomic(target: Path, data: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(
+        dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        Path(tmp_name).replace(target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def write_sidecars(
+    path: str | Path, encodings: Sequence[str] | None = None
+) -> list[Path]:
+    """Compress ``path`` once per encoding and return the sidecar paths."""
+    source = Path(path)
+    data = source.read_bytes()
+    written: list[Path] = []
+    for encoding in encodings or available_encodings():
+        _suffix, compress = _ENCODINGS[encoding]
+        target = sidecar_path(source, encoding)
+        _write_atomic(target, compress(data))
+        written.append(target)
+    return written
+
+
+class PrecompressPool:
+    """Background thread pool that writes compressed sidecars.
+
+    ``encodings`` defaults to :func:`available_encodings`; asking for ``br``
+    without a brotli module raises ``ValueError`` up front.
+    """
+
+    def __init__(
+        self,
+        *,
+        encodings: Sequence[str] | None = None,
+        max_workers: int = _DEFAULT_WORKERS,
+    ) -> None:
+        chosen = tuple(encodings) if encodings else available_encodings()
+        unsupported = [e for e in chosen if e not in available_encodings()]
+        if unsupported:
+            message = f"unsupported precompression encodings: {unsupported}"
+            raise ValueError(message)
+        self.encodings = chosen
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mermaid-precompress"
+        )
+        self._lock = threading.Lock()
+        self._pending: set[Future[list[Path]]] = set()
+
+    def submit(self, path: str | Path) -> Future[list[Path]]:
+        """Queue ``path`` for compression; the future yields its sidecars."""
+        future = self._executor.submit(write_sidecars, Path(path), self.encodings)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def sidecar_paths(self, path: str | Path) -> list[Path]:
+        """The sidecars :meth:`submit` writes for ``path``, in encoding order."""
+        return [sidecar_path(path, encoding) for encoding in self.encodings]
+
+    def submit_all(self, paths: Iterable[str | Path]) -> list[Future[list[Path]]]:
+        return [self.submit(path) for path in paths]
+
+    def _forget(self, future: Future[list[Path]]) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def wait(self) -> None:
+        """Block until every sidecar queued so far has been written."""
+        with self._lock:
+            pending = set(self._pending)
+        wait(pending)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+_SHARED_LOCK = threading.Lock()
+_SHARED: PrecompressPool | None = None
+
+
+def shared_precompress_pool() -> PrecompressPool:
+    """Process-wide pool used when callers pass ``precompress=True``."""
+    global _SHARED  # noqa: PLW0603 - lazily created process-wide pool
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = PrecompressPool()
+        return _SHARED
+
+
+def sidecars_of(futures: Iterable[Future[list[Path]]]) -> list[str]:
+    """Wait for ``futures`` and return every sidecar path they wrote."""
+    return [str(path) for future in futures for path in future.result()]
+
+
+__all__ = [
+    "PrecompressPool",
+    "available_encodings",
+    "shared_precompress_pool",
+    "sidecar_path",
+    "sidecars_of",
+    "write_sidecars",
+]
@@ -0,0 +1,330 @@
+"""Render cost estimation for Mermaid documents.
+
+Predicts mmdc render time and SVG size from structural features so that
+oversized diagrams can be rejected, reduced or split before export.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from statistics import median
+from typing import TYPE_CHECKING, cast
+
+if TYPE_CHECKING:
+    from x_make_common_x.exporters import ExportResult
+    from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidDoc
+
+FEATURE_NAMES: tuple[str, ...] = (
+    "bias",
+    "nodes",
+    "edges",
+    "label_kb",
+    "subgraph_depth",
+    "edges_sq_k",
+)
+
+_ARROW_RE = re.compile(r"[-=.]{2,}[>ox]|<[-=.]{2,}|-{3}")
+_OPEN_BLOCK_RE = re.compile(r"^\s*(subgraph\b|state\b.*\{\s*$)")
+_CLOSE_BLOCK_RE = re.compile(r"^\s*(end|\})\s*$")
+_MIN_CALIBRATION_SAMPLES = 2
+_RIDGE = 1e-6
+
+
+@dataclass(frozen=True)
+class DocFeatures:
+    kind: str
+    nodes: int
+    edges: int
+    label_bytes: int
+    subgraph_depth: int
+
+    def vector(self) -> tuple[float, ...]:
+        return (
+            1.0,
+            float(self.nodes),
+            float(self.edges),
+            self.label_bytes / 1024.0,
+            float(self.subgraph_depth),
+            (self.edges * self.edges) / 1000.0,
+        )
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "kind": self.kind,
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "label_bytes": self.label_bytes,
+            "subgraph_depth": self.subgraph_depth,
+        }
+
+
+def _max_block_depth(lines: Iterable[str]) -> int:
+    depth = 0
+    deepest = 0
+    for line in lines:
+        if _OPEN_BLOCK_RE.match(line):
+            depth += 1
+            deepest = max(deepest, depth)
+        elif _CLOSE_BLOCK_RE.match(line) and depth:
+            depth -= 1
+    return deepest
+
+
+def extract_features(doc: MermaidDoc) -> DocFeatures:
+    """Summarise ``doc`` into the features the cost model consumes."""
+    if doc.nodes or doc.edges:
+        endpoints = set(doc.nodes)
+        label_bytes = 0
+        for node in doc.nodes.values():
+            label_bytes += len((node.label or node.node_id).encode("utf-8"))
+        for edge in doc.edges:
+            endpoints.add(edge.src)
+            endpoints.add(edge.dst)
+            if edge.label:
+                label_bytes += len(edge.label.encode("utf-8"))
+        return DocFeatures(
+            kind=doc.kind,
+            nodes=len(endpoints),
+            edges=len(doc.edges),
+            label_bytes=label_bytes,
+            subgraph_depth=_max_block_depth(doc.lines),
+        )
+    return features_from_lines(doc.kind, doc.lines)
+
+
+def features_from_lines(kind: str, lines: Sequence[str]) -> DocFeatures:
+    """Approximate features for documents without a structured graph."""
+    edges = 0
+    label_bytes = 0
+    for line in lines:
+        if _ARROW_RE.search(line):
+            edges += 1
+        label_bytes += len(line.encode("utf-8"))
+    return DocFeatures(
+        kind=kind,
+        nodes=max(len(lines) - edges, 0),
+        edges=edges,
+        label_bytes=label_bytes,
+        subgraph_depth=_max_block_depth(lines),
+    )
+
+
+def features_from_source(source: str) -> DocFeatures:
+    """Approximate features for raw Mermaid text such as ``main_json`` sources."""
+    lines = [
+        stripped
+        for raw_line in source.replace(";", "\n").splitlines()
+        if (stripped := raw_line.strip()) and not stripped.startswith("%%")
+    ]
+    if not lines:
+        return DocFeatures(kind="", nodes=0, edges=0, label_bytes=0, subgraph_depth=0)
+    kind = lines[0].split()[0]
+    return features_from_lines(kind, lines[1:])
+
+
+@dataclass(frozen=True)
+class RenderEstimate:
+    seconds: float
+    svg_bytes: int
+    features: DocFeatures
+
+    def exceeds(self, *, max_seconds: float | None, max_svg_bytes: int | None) -> bool:
+        if max_seconds is not None and self.seconds > max_seconds:
+            return True
+        return max_svg_bytes is not None and self.svg_bytes > max_svg_bytes
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "seconds": round(self.seconds, 3),
+            "svg_bytes": self.svg_bytes,
+            "features": self.features.to_metadata(),
+        }
+
+
+@dataclass(frozen=True)
+class RenderSample:
+    """One measured mmdc run used for calibration."""
+
+    features: DocFeatures
+    seconds: float
+    svg_bytes: int
+
+    @classmethod
+    def from_export(
+        cls, features: DocFeatures, seconds: float, export: ExportResult
+    ) -> RenderSample | None:
+        if not export.succeeded or export.output_path is None:
+            return None
+        svg_bytes = Path(export.output_path).stat().st_size
+        return cls(features=features, seconds=seconds, svg_bytes=svg_bytes)
+
+
+# Conservative starting point until calibrated against local mmdc runs: a
+# fixed Chromium start-up cost dominates small diagrams, layout big ones.
+_DEFAULT_TIME_COEFFICIENTS: tuple[float, ...] = (1.6, 0.002, 0.003, 0.02, 0.05, 0.0004)
+_DEFAULT_SIZE_COEFFICIENTS: tuple[float, ...] = (
+    6000.0,
+    420.0,
+    260.0,
+    1400.0,
+    300.0,
+    0.0,
+)
+_DEFAULT_KIND_FACTORS: dict[str, float] = {
+    "flowchart": 1.0,
+    "sequenceDiagram": 1.2,
+    "classDiagram": 1.3,
+    "stateDiagram-v2": 1.2,
+    "erDiagram": 1.3,
+    "gantt": 0.8,
+    "mindmap": 0.9,
+}
+
+
+def _new_kind_factors() -> dict[str, float]:
+    return dict(_DEFAULT_KIND_FACTORS)
+
+
+def _dot(left: Sequence[float], right: Sequence[float]) -> float:
+    return sum(a * b for a, b in zip(left, right, strict=True))
+
+
+def _solve_least_squares(
+    rows: Sequence[Sequence[float]], targets: Sequence[float]
+) -> tuple[float, ...]:
+    """Ridge-regularised normal equations solved by Gaussian elimination."""
+    width = len(rows[0])
+    matrix = [[0.0] * (width + 1) for _ in range(width)]
+    for row, target in zip(rows, targets, strict=True):
+        for i in range(width):
+            for j in range(width):
+                matrix[i][j] += row[i] * row[j]
+            matrix[i][width] += row[i] * target
+    for i in range(width):
+        matrix[i][i] += _RIDGE
+    for col in range(width):
+        pivot = max(range(col, width), key=lambda r: abs(matrix[r][col]))
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        lead = matrix[col][col]
+        if abs(lead) < _RIDGE:
+            continue
+        for r in range(width):
+            if r == col:
+                continue
+            factor = matrix[r][col] / lead
+            for c in range(col, width + 1):
+                matrix[r][c] -= factor * matrix[col][c]
+    return tuple(
+        matrix[i][width] / matrix[i][i] if abs(matrix[i][i]) >= _RIDGE else 0.0
+        for i in range(width)
+    )
+
+
+@dataclass
+class RenderCostModel:
+    """Linear cost model over :data:`FEATURE_NAMES` with per-kind factors."""
+
+    time_coefficients: tuple[float, ...] = _DEFAULT_TIME_COEFFICIENTS
+    size_coefficients: tuple[float, ...] = _DEFAULT_SIZE_COEFFICIENTS
+    kind_factors: dict[str, float] = field(default_factory=_new_kind_factors)
+
+    def estimate(self, features: DocFeatures) -> RenderEstimate:
+        vector = features.vector()
+        factor = self.kind_factors.get(features.kind, 1.0)
+        seconds = max(_dot(self.time_coefficients, vector), 0.0) * factor
+        svg_bytes = max(_dot(self.size_coefficients, vector), 0.0)
+        return RenderEstimate(
+            seconds=seconds, svg_bytes=int(svg_bytes), features=features
+        )
+
+    @classmethod
+    def calibrate(cls, samples: Iterable[RenderSample]) -> RenderCostModel:
+        """Fit coefficients to measured mmdc runs.
+
+        Coefficients are fitted across all samples; each kind then gets the
+        median ratio of measured to predicted time as its factor.
+        """
+        measured = list(samples)
+        if len(measured) < _MIN_CALIBRATION_SAMPLES:
+            message = f"calibration needs at least {_MIN_CALIBRATION_SAMPLES} samples"
+            raise ValueError(message)
+        rows = [sample.features.vector() for sample in measured]
+        model = cls(
+            time_coefficients=_solve_least_squares(
+                rows, [sample.seconds for sample in measured]
+            ),
+            size_coefficients=_solve_least_squares(
+                rows, [float(sample.svg_bytes) for sample in measured]
+            ),
+            kind_factors={},
+        )
+        ratios: dict[str, list[float]] = {}
+        for sample, row in zip(measured, rows, strict=True):
+            predicted = _dot(model.time_coefficients, row)
+            if predicted > 0:
+                ratios.setdefault(sample.features.kind, []).append(
+                    sample.seconds / predicted
+                )
+        model.kind_factors = {kind: median(values) for kind, values in ratios.items()}
+        return model
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "time_coefficients": list(self.time_coefficients),
+            "size_coefficients": list(self.size_coefficients),
+            "kind_factors": dict(self.kind_factors),
+        }
+
+    @classmethod
+    def from_json(cls, payload: Mapping[str, object]) -> RenderCostModel:
+        model = cls()
+        time_obj = payload.get("time_coefficients")
+        if isinstance(time_obj, Sequence) and len(time_obj) == len(FEATURE_NAMES):
+            model.time_coefficients = tuple(float(v) for v in time_obj)
+        size_obj = payload.get("size_coefficients")
+        if isinstance(size_obj, Sequence) and len(size_obj) == len(FEATURE_NAMES):
+            model.size_coefficients = tuple(float(v) for v in size_obj)
+        factors_obj = payload.get("kind_factors")
+        if isinstance(factors_obj, Mapping):
+            factors = cast("Mapping[str, object]", factors_obj)
+            model.kind_factors.update(
+                {
+                    str(kind): float(value)
+                    for kind, value in factors.items()
+                    if isinstance(value, (int, float))
+                }
+            )
+        return model
+
+    def save(self, path: str | Path) -> Path:
+        target = Path(path)
+        target.write_text(json.dumps(self.to_json(), indent=2), encoding="utf-8")
+        return target
+
+    @classmethod
+    def load(cls, path: str | Path) -> RenderCostModel:
+        payload_obj = cast("object", json.loads(Path(path).read_text("utf-8")))
+        if not isinstance(payload_obj, Mapping):
+            message = "render cost model file must contain a JSON object"
+            raise TypeError(message)
+        return cls.from_json(cast("Mapping[str, object]", payload_obj))
+
+
+DEFAULT_COST_MODEL = RenderCostModel()
+
+
+__all__ = [
+    "DEFAULT_COST_MODEL",
+    "FEATURE_NAMES",
+    "DocFeatures",
+    "RenderCostModel",
+    "RenderEstimate",
+    "RenderSample",
+    "extract_features",
+    "features_from_lines",
+    "features_from_source",
+]
@@ -0,0 +1,339 @@
+"""Render queue backed by a shared spool directory.
+
+Producers drop ``main_json`` payloads into ``pending/``; workers on any host
+that mounts the directory claim a job by renaming it into ``claimed/``, which
+succeeds for exactly one of them. The claim file's mtime is the heartbeat:
+the worker touches it while rendering. Claims not touched within the lease
+are renamed back into ``pending/`` with the attempt counter bumped, and jobs
+that keep failing to finish land in ``dead/`` with a failure result.
+
+Delivery is at-least-once: a worker that stalls past its lease may finish
+after the job was re-queued, in which case both write the same result.
+
+Layout::
+
+    <root>/pending/<job>@<attempt>.json
+    <root>/claimed/<job>@<attempt>.json
+    <root>/results/<job>.json
+    <root>/dead/<job>@<attempt>.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from x_make_mermaid_x.x_cls_make_mermaid_x import main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping, Sequence
+
+    RenderFunction = Callable[[Mapping[str, object]], Mapping[str, object]]
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 0.5
+_ATTEMPT_SEP = "@"
+_JOB_SUFFIX = ".json"
+_SPOOLS: tuple[str, ...] = ("pending", "claimed", "results", "dead")
+
+
+def _write_atomic(target: Path, data: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(
+        dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        Path(tmp_name).replace(target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _dump(document: Mapping[str, object]) -> bytes:
+    return json.dumps(document, indent=2).encode("utf-8")
+
+
+def _parse_name(name: str) -> tuple[str, int]:
+    stem = name.removesuffix(_JOB_SUFFIX)
+    job_id, _sep, attempt = stem.rpartition(_ATTEMPT_SEP)
+    return job_id, int(attempt)
+
+
+def _job_name(job_id: str, attempt: int) -> str:
+    return f"{job_id}{_ATTEMPT_SEP}{attempt}{_JOB_SUFFIX}"
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    job_id: str
+    attempt: int
+    path: Path
+
+
+class SpoolQueue:
+    """Filesystem job queue shared by producers and workers."""
+
+    def __init__(
+        self,
+        root: str | Path,
+        *,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> None:
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        for name in _SPOOLS:
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+
+    def _spool(self, name: str) -> Path:
+        return self.root / name
+
+    # Producers
+
+    def submit(
+        self, payload: Mapping[str, object], *, job_id: str | None = None
+    ) -> str:
+        """Queue ``payload``; ids sort in submission order unless given."""
+        if job_id is None:
+            job_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        elif _ATTEMPT_SEP in job_id or "/" in job_id or job_id.startswith("."):
+            message = f"invalid job id: {job_id!r}"
+            raise ValueError(message)
+        _write_atomic(self._spool("pending") / _job_name(job_id, 1), _dump(payload))
+        return job_id
+
+    def result(self, job_id: str) -> dict[str, object] | None:
+        try:
+            raw = (self._spool("results") / f"{job_id}{_JOB_SUFFIX}").read_bytes()
+        except FileNotFoundError:
+            return None
+        return cast("dict[str, object]", json.loads(raw))
+
+    def wait(
+        self,
+        job_ids: Iterable[str],
+        *,
+        timeout: float | None = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> dict[str, dict[str, object]]:
+        """Poll until every job has a result or ``timeout`` elapses."""
+        remaining = list(job_ids)
+        results: dict[str, dict[str, object]] = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while remaining:
+            for job_id in list(remaining):
+                result = self.result(job_id)
+                if result is not None:
+                    results[job_id] = result
+                    remaining.remove(job_id)
+            if not remaining or (deadline is not None and time.monotonic() >= deadline):
+                break
+            time.sleep(poll_interval)
+        return results
+
+    def counts(self) -> dict[str, int]:
+        return {
+            name: sum(1 for p in self._spool(name).iterdir() if p.suffix == _JOB_SUFFIX)
+            for name in _SPOOLS
+        }
+
+    # Workers
+
+    def claim(self) -> ClaimedJob | None:
+        """Atomically take the oldest pending job, or return ``None``."""
+        pending = sorted(
+            entry.name
+            for entry in os.scandir(self._spool("pending"))
+            if entry.name.endswith(_JOB_SUFFIX) and not entry.name.startswith(".")
+        )
+        for name in pending:
+            source = self._spool("pending") / name
+            target = self._spool("claimed") / name
+            try:
+                # Rename keeps the producer's mtime; refresh it first so a
+                # fresh claim never looks expired to another worker's scan.
+                os.utime(source)
+                source.rename(target)
+            except FileNotFoundError:
+                continue  # another worker won this one
+            job_id, attempt = _parse_name(name)
+            return ClaimedJob(job_id, attempt, target)
+        return None
+
+    def heartbeat(self, job: ClaimedJob) -> None:
+        with suppress(FileNotFoundError):
+            os.utime(job.path)
+
+    def complete(self, job: ClaimedJob, result: Mapping[str, object]) -> Path:
+        target = self._spool("results") / f"{job.job_id}{_JOB_SUFFIX}"
+        _write_atomic(target, _dump(result))
+        job.path.unlink(missing_ok=True)
+        return target
+
+    def requeue_expired(self, *, now: float | None = None) -> list[str]:
+        """Return expired claims to ``pending/``; give up after max attempts."""
+        current = time.time() if now is None else now
+        requeued: list[str] = []
+        for entry in os.scandir(self._spool("claimed")):
+            if not entry.name.endswith(_JOB_SUFFIX) or entry.name.startswith("."):
+                continue
+            try:
+                beat = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue  # completed while we were scanning
+            if current - beat <= self.lease_seconds:
+                continue
+            if self._release(Path(entry.path)):
+                requeued.append(_parse_name(entry.name)[0])
+        return requeued
+
+    def _release(self, claim: Path) -> bool:
+        job_id, attempt = _parse_name(claim.name)
+        exhausted = attempt >= self.max_attempts
+        target = (
+            self._spool("dead") / claim.name
+            if exhausted
+            else self._spool("pending") / _job_name(job_id, attempt + 1)
+        )
+        try:
+            claim.rename(target)
+        except FileNotFoundError:
+            return False  # finished or released by someone else meanwhile
+        if exhausted:
+            failure = {
+                "status": "failure",
+                "message": "render job abandoned after repeated expired claims",
+                "details": {"job_id": job_id, "attempts": attempt},
+            }
+            _write_atomic(
+                self._spool("results") / f"{job_id}{_JOB_SUFFIX}", _dump(failure)
+            )
+        return not exhausted
+
+
+class _Heartbeat:
+    """Touch a claim file on a daemon thread while its job renders."""
+
+    def __init__(self, queue: SpoolQueue, job: ClaimedJob, interval: float) -> None:
+        self._queue = queue
+        self._job = job
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._beat, name="mermaid-spool-heartbeat", daemon=True
+        )
+
+    def _beat(self) -> None:
+        while not self._stop.wait(self._interval):
+            self._queue.heartbeat(self._job)
+
+    def __enter__(self) -> None:
+        self._thread.start()
+
+    def __exit__(self, *_exc: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class SpoolWorker:
+    """Claims and renders jobs from a :class:`SpoolQueue`."""
+
+    def __init__(
+        self,
+        queue: SpoolQueue,
+        *,
+        render: RenderFunction = main_json,
+        heartbeat_interval: float | None = None,
+    ) -> None:
+        self.queue = queue
+        self._render = render
+        self._heartbeat_interval = heartbeat_interval or queue.lease_seconds / 3
+
+    def run_once(self) -> str | None:
+        """Process one job; return its id, or ``None`` when nothing is pending."""
+        job = self.queue.claim()
+        if job is None:
+            return None
+        try:
+            payload = cast("object", json.loads(job.path.read_bytes()))
+        except (OSError, ValueError) as exc:
+            result: Mapping[str, object] = {
+                "status": "failure",
+                "message": "failed to read JSON payload",
+                "details": {"error": str(exc), "job_id": job.job_id},
+            }
+        else:
+            with _Heartbeat(self.queue, job, self._heartbeat_interval):
+                result = self._render(cast("Mapping[str, object]", payload))
+        self.queue.complete(job, result)
+        return job.job_id
+
+    def run(
+        self,
+        *,
+        stop: threading.Event | None = None,
+        idle_timeout: float | None = None,
+        max_jobs: int | None = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> int:
+        """Work until stopped, idle for ``idle_timeout`` or ``max_jobs`` done."""
+        processed = 0
+        idle_since = time.monotonic()
+        while not (stop is not None and stop.is_set()):
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            self.queue.requeue_expired()
+            if self.run_once() is not None:
+                processed += 1
+                idle_since = time.monotonic()
+                continue
+            if (
+                idle_timeout is not None
+                and time.monotonic() - idle_since >= idle_timeout
+            ):
+                break
+            time.sleep(poll_interval)
+        return processed
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Render jobs from a spool directory")
+    parser.add_argument("root", help="Shared spool directory")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument("--idle-timeout", type=float, default=None)
+    parsed = parser.parse_args(argv)
+    queue = SpoolQueue(
+        cast("str", parsed.root),
+        lease_seconds=cast("float", parsed.lease),
+        max_attempts=cast("int", parsed.max_attempts),
+    )
+    worker = SpoolWorker(queue)
+    worker.run(idle_timeout=cast("float | None", parsed.idle_timeout))
+    return 0
+
+
+__all__ = [
+    "DEFAULT_LEASE_SECONDS",
+    "DEFAULT_MAX_ATTEMPTS",
+    "ClaimedJob",
+    "SpoolQueue",
+    "SpoolWorker",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,287 @@
+"""Priority scheduling in front of the ``main_json`` export path.
+
+``RenderScheduler`` accepts payloads from many callers and runs at most
+``max_concurrent_renders`` of them at once, which bounds the number of mmdc
+processes a shared render service starts. Dispatch order is:
+
+1. Priority class, strictly: ``interactive`` before ``normal`` before
+   ``batch``.
+2. Within a class, the tenant that has been charged the least estimated
+   render time so far, so one tenant's bulk export cannot crowd out others.
+3. Within a tenant, the cheapest payload according to the render cost model.
+   Payloads earn credit while they wait, so oversized diagrams still run
+   once they have waited long enough.
+
+Results carry a ``queue`` entry with the wait time and the scheduling
+decision inputs: in ``summary`` on success, in ``details`` on failure.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self, cast
+
+from x_make_mermaid_x.metrics import active_metrics
+from x_make_mermaid_x.render_cost import (
+    DEFAULT_COST_MODEL,
+    DocFeatures,
+    RenderCostModel,
+    features_from_lines,
+    features_from_source,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+    from types import TracebackType
+
+    RenderFunction = Callable[[Mapping[str, object]], Mapping[str, object]]
+
+PRIORITY_CLASSES: tuple[str, ...] = ("interactive", "normal", "batch")
+DEFAULT_PRIORITY = "normal"
+DEFAULT_TENANT = "default"
+DEFAULT_MAX_CONCURRENT_RENDERS = 2
+# Seconds of estimated render time a queued payload is credited per second
+# of waiting.
+DEFAULT_AGING_RATE = 0.1
+# Payloads that skip mmdc still cost their tenant something, so a flood of
+# source-only payloads cannot hold a tenant's share at zero.
+_MIN_CHARGE_SECONDS = 0.01
+_FLOW = "flowchart"
+
+
+def _document_features(document: Mapping[str, object]) -> DocFeatures:
+    kind_obj = document.get("diagram")
+    kind = kind_obj if isinstance(kind_obj, str) and kind_obj else _FLOW
+    lines_obj = document.get("lines")
+    lines = (
+        [line for line in cast("list[object]", lines_obj) if isinstance(line, str)]
+        if isinstance(lines_obj, list)
+        else []
+    )
+    features = features_from_lines(kind, lines)
+    counts = {
+        key: len(cast("list[object]", value))
+        for key in ("nodes", "edges", "instructions")
+        if isinstance(value := document.get(key), list)
+    }
+    return DocFeatures(
+        kind=kind,
+        nodes=features.nodes + counts.get("nodes", 0) + counts.get("instructions", 0),
+        edges=features.edges + counts.get("edges", 0),
+        label_bytes=features.label_bytes,
+        subgraph_depth=features.subgraph_depth,
+    )
+
+
+def estimate_payload_seconds(
+    payload: Mapping[str, object], model: RenderCostModel = DEFAULT_COST_MODEL
+) -> float:
+    """Estimated mmdc time for ``payload``; zero when it does not export."""
+    parameters_obj = payload.get("parameters")
+    if not isinstance(parameters_obj, dict):
+        return 0.0
+    parameters = cast("dict[str, object]", parameters_obj)
+    if not (parameters.get("export_svg") or parameters.get("output_svg")):
+        return 0.0
+    source = parameters.get("source")
+    document = parameters.get("document")
+    if isinstance(source, str):
+        features = features_from_source(source)
+    elif isinstance(document, dict):
+        features = _document_features(cast("dict[str, object]", document))
+    else:
+        return 0.0
+    return model.estimate(features).seconds
+
+
+@dataclass
+class _Job:
+    payload: Mapping[str, object]
+    priority: str
+    tenant: str
+    estimate: float
+    enqueued: float
+    future: Future[dict[str, object]] = field(default_factory=Future)
+
+
+@dataclass
+class _PriorityClass:
+    """Pending jobs of one priority class, grouped by tenant."""
+
+    queues: dict[str, list[tuple[float, int, _Job]]] = field(default_factory=dict)
+    charged: dict[str, float] = field(default_factory=dict)
+
+    def push(self, key: float, seq: int, job: _Job) -> None:
+        queue = self.queues.get(job.tenant)
+        if queue is None:
+            # A tenant returning from idle starts level with the least
+            # charged active tenant instead of spending credit banked while
+            # it was away.
+            floor = min((self.charged[t] for t in self.queues), default=0.0)
+            self.charged[job.tenant] = max(self.charged.get(job.tenant, 0.0), floor)
+            queue = self.queues[job.tenant] = []
+        heapq.heappush(queue, (key, seq, job))
+
+    def pop(self) -> _Job | None:
+        if not self.queues:
+            return None
+        tenant = min(self.queues, key=lambda t: (self.charged[t], t))
+        queue = self.queues[tenant]
+        _key, _seq, job = heapq.heappop(queue)
+        if not queue:
+            del self.queues[tenant]
+        self.charged[tenant] += max(job.estimate, _MIN_CHARGE_SECONDS)
+        return job
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class RenderScheduler:
+    """Runs ``main_json`` payloads by priority, tenant share and cost."""
+
+    def __init__(
+        self,
+        *,
+        max_concurrent_renders: int = DEFAULT_MAX_CONCURRENT_RENDERS,
+        cost_model: RenderCostModel | None = None,
+        aging_rate: float = DEFAULT_AGING_RATE,
+        render: RenderFunction = main_json,
+    ) -> None:
+        if max_concurrent_renders < 1:
+            message = "max_concurrent_renders must be at least 1"
+            raise ValueError(message)
+        self._model = cost_model or DEFAULT_COST_MODEL
+        self._aging_rate = aging_rate
+        self._render = render
+        self._classes = {name: _PriorityClass() for name in PRIORITY_CLASSES}
+        self._seq = itertools.count()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._workers = [
+            threading.Thread(
+                target=self._work, name=f"mermaid-render-{index}", daemon=True
+            )
+            for index in range(max_concurrent_renders)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        payload: Mapping[str, object],
+        *,
+        priority: str = DEFAULT_PRIORITY,
+        tenant: str = DEFAULT_TENANT,
+    ) -> Future[dict[str, object]]:
+        """Queue ``payload``; the future yields the ``main_json`` result."""
+        if priority not in self._classes:
+            message = f"unknown priority class: {priority!r}"
+            raise ValueError(message)
+        estimate = estimate_payload_seconds(payload, self._model)
+        enqueued = time.monotonic()
+        job = _Job(payload, priority, tenant, estimate, enqueued)
+        # Uniform aging keeps heap keys static: estimate - rate * (now - t)
+        # orders the same as estimate + rate * t.
+        key = estimate + self._aging_rate * enqueued
+        with self._ready:
+            if self._closed:
+                message = "render scheduler is closed"
+                raise RuntimeError(message)
+            self._classes[priority].push(key, next(self._seq), job)
+            self._ready.notify()
+        return job.future
+
+    def run(
+        self,
+        payload: Mapping[str, object],
+        *,
+        priority: str = DEFAULT_PRIORITY,
+        tenant: str = DEFAULT_TENANT,
+    ) -> dict[str, object]:
+        return self.submit(payload, priority=priority, tenant=tenant).result()
+
+    def pending(self) -> dict[str, int]:
+        with self._ready:
+            return {name: len(queued) for name, queued in self._classes.items()}
+
+    def _next_job(self) -> _Job | None:
+        with self._ready:
+            while True:
+                for queued in self._classes.values():
+                    job = queued.pop()
+                    if job is not None:
+                        return job
+                if self._closed:
+                    return None
+                self._ready.wait()
+
+    def _work(self) -> None:
+        while (job := self._next_job()) is not None:
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            waited = time.monotonic() - job.enqueued
+            registry = active_metrics()
+            if registry is not None:
+                registry.observe("queue_wait_seconds", waited, priority=job.priority)
+            try:
+                result = dict(self._render(job.payload))
+            except Exception as exc:  # noqa: BLE001 - surfaced through the future
+                job.future.set_exception(exc)
+                continue
+            queue: dict[str, object] = {
+                "priority": job.priority,
+                "tenant": job.tenant,
+                "wait_seconds": round(waited, 6),
+                "estimated_seconds": round(job.estimate, 3),
+            }
+            summary = result.get("summary")
+            if isinstance(summary, dict):
+                cast("dict[str, object]", summary)["queue"] = queue
+            else:
+                details = result.get("details")
+                # Failures are where the wait matters most for timeouts.
+                merged = (
+                    dict(cast("dict[str, object]", details))
+                    if isinstance(details, dict)
+                    else {}
+                )
+                merged["queue"] = queue
+                result["details"] = merged
+            job.future.set_result(result)
+
+    def close(self, *, wait: bool = True) -> None:
+        """Stop accepting payloads; workers drain what is already queued."""
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+__all__ = [
+    "DEFAULT_MAX_CONCURRENT_RENDERS",
+    "DEFAULT_PRIORITY",
+    "DEFAULT_TENANT",
+    "PRIORITY_CLASSES",
+    "RenderScheduler",
+    "estimate_payload_seconds",
+]
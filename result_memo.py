@@ -0,0 +1,262 @@
+"""Memoized ``main_json`` results.
+
+``main_json`` consults a :class:`ResultMemo` before building anything.
+Entries are keyed by :func:`payload_key`, a SHA-256 of the canonical JSON
+of the payload parameters together with the output schema version and, for
+exporting payloads, the Mermaid CLI version. A stored result is only served
+while every artifact it names still has the size and mtime recorded when
+it was written, so deleted or rewritten outputs are rebuilt.
+
+The memory tier is an LRU of ``max_entries`` results. With a ``directory``
+entries are also written there as JSON files and shared between processes;
+the directory keeps at most ``max_disk_entries`` files, dropping the least
+recently used (by file mtime, refreshed on every hit).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from x_make_mermaid_x.metrics import active_metrics
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_DISK_ENTRIES = 4096
+_MEMO_FORMAT_VERSION = 1
+_ENTRY_SUFFIX = ".json"
+
+
+def payload_key(
+    parameters: Mapping[str, object],
+    *,
+    schema_version: str,
+    cli_version: str | None,
+) -> str:
+    """Canonical hash of everything that determines a ``main_json`` result."""
+    canonical = json.dumps(
+        {
+            "memo": _MEMO_FORMAT_VERSION,
+            "schema": schema_version,
+            "cli": cli_version,
+            "parameters": parameters,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class ArtifactStamp:
+    path: str
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def probe(cls, path: str) -> ArtifactStamp | None:
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return None
+        return cls(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    def is_current(self) -> bool:
+        return ArtifactStamp.probe(self.path) == self
+
+
+@dataclass(frozen=True)
+class _Entry:
+    result_json: str
+    artifacts: tuple[ArtifactStamp, ...]
+
+    def is_current(self) -> bool:
+        return all(stamp.is_current() for stamp in self.artifacts)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "version": _MEMO_FORMAT_VERSION,
+                "result": self.result_json,
+                "artifacts": [[a.path, a.size, a.mtime_ns] for a in self.artifacts],
+            }
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> _Entry | None:
+        try:
+            payload = cast("dict[str, object]", json.loads(text))
+            if payload.get("version") != _MEMO_FORMAT_VERSION:
+                return None
+            stamps = cast("list[list[object]]", payload["artifacts"])
+            artifacts = tuple(
+                ArtifactStamp(str(path), int(cast("int", size)), int(cast("int", ns)))
+                for path, size, ns in stamps
+            )
+            return cls(result_json=str(payload["result"]), artifacts=artifacts)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+
+def _record(outcome: str, tier: str) -> None:
+    metrics = active_metrics()
+    if metrics is not None:
+        metrics.inc(f"memo_{outcome}_total", tier=tier)
+
+
+class ResultMemo:
+    """Two-tier store of ``main_json`` results keyed by :func:`payload_key`."""
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+    ) -> None:
+        if max_entries < 0 or max_disk_entries < 1:
+            message = "max_entries must be >= 0 and max_disk_entries >= 1"
+            raise ValueError(message)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._directory = Path(directory) if directory is not None else None
+        self._max_entries = max_entries
+        self._max_disk_entries = max_disk_entries
+        self._disk_count: int | None = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: str) -> dict[str, object] | None:
+        """A fresh copy of the stored result, if its artifacts are unchanged."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        tier = "memory"
+        if entry is None and self._directory is not None:
+            tier = "disk"
+            entry = self._read_disk(key)
+        if entry is not None and not entry.is_current():
+            self.discard(key)
+            entry = None
+        if entry is None:
+            _record("misses", tier)
+            return None
+        if tier == "disk":
+            self._remember(key, entry)
+        _record("hits", tier)
+        return cast("dict[str, object]", json.loads(entry.result_json))
+
+    def put(
+        self, key: str, result: Mapping[str, object], artifacts: Iterable[str]
+    ) -> bool:
+        """Store ``result``; ``False`` when one of its artifacts is missing."""
+        stamps: list[ArtifactStamp] = []
+        for path in artifacts:
+            stamp = ArtifactStamp.probe(path)
+            if stamp is None:
+                return False
+            stamps.append(stamp)
+        entry = _Entry(json.dumps(result), tuple(stamps))
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+        return True
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            path = self._entry_path(key)
+            if path is not None and path.exists():
+                path.unlink(missing_ok=True)
+                if self._disk_count is not None:
+                    self._disk_count -= 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._directory is not None and self._directory.is_dir():
+                for path in self._directory.glob(f"*{_ENTRY_SUFFIX}"):
+                    path.unlink(missing_ok=True)
+            self._disk_count = None
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        if not self._max_entries:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _entry_path(self, key: str) -> Path | None:
+        if self._directory is None:
+            return None
+        return self._directory / f"{key}{_ENTRY_SUFFIX}"
+
+    def _read_disk(self, key: str) -> _Entry | None:
+        path = self._entry_path(key)
+        if path is None:
+            return None
+        try:
+            text = path.read_text(encoding="utf-8")
+            # Hits refresh the mtime that eviction orders by.
+            os.utime(path)
+        except OSError:
+            return None
+        return _Entry.from_json(text)
+
+    def _write_disk(self, key: str, entry: _Entry) -> None:
+        path = self._entry_path(key)
+        if path is None or self._directory is None:
+            return
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            existed = path.exists()
+            staging = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            staging.write_text(entry.to_json(), encoding="utf-8")
+            staging.replace(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = sum(
+                    1 for _ in self._directory.glob(f"*{_ENTRY_SUFFIX}")
+                )
+            elif not existed:
+                self._disk_count += 1
+            if self._disk_count > self._max_disk_entries:
+                self._evict_disk(self._directory)
+
+    def _evict_disk(self, directory: Path) -> None:
+        """Drop the least recently used files; called with the lock held."""
+        stamped: list[tuple[int, Path]] = []
+        for path in directory.glob(f"*{_ENTRY_SUFFIX}"):
+            try:
+                stamped.append((path.stat().st_mtime_ns, path))
+            except OSError:
+                continue
+        stamped.sort()
+        excess = len(stamped) - self._max_disk_entries
+        for _mtime, path in stamped[: max(excess, 0)]:
+            path.unlink(missing_ok=True)
+        self._disk_count = min(len(stamped), self._max_disk_entries)
+
+
+__all__ = [
+    "DEFAULT_MAX_DISK_ENTRIES",
+    "DEFAULT_MAX_ENTRIES",
+    "ArtifactStamp",
+    "ResultMemo",
+    "payload_key",
+]
@@ -0,0 +1,224 @@
+"""Post-processing for SVG files written by mermaid-cli.
+
+mmdc output carries indentation, repeated ``<style>`` rules, long float
+coordinates and marker/gradient definitions no element uses. The optimizer
+works on the serialized text with targeted regexes so namespaces, HTML
+labels in ``<foreignObject>`` and attribute order survive untouched.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_PRECISION = 2
+_MAX_DEFS_PASSES = 8
+
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_STYLE_RE = re.compile(r"(<style\b[^>]*>)(.*?)(</style>)", re.DOTALL)
+# Text content where whitespace between tags may be significant.
+_PROTECTED_RE = re.compile(r"<(foreignObject|text|style)\b[^>]*>(.*?)</\1>", re.DOTALL)
+_INTER_TAG_SPACE_RE = re.compile(r">\s*\n\s*<")
+_GEOMETRY_ATTR_RE = re.compile(
+    r"(\s(?:x|y|x1|y1|x2|y2|cx|cy|r|rx|ry|dx|dy|width|height|d|points"
+    r"|transform|viewBox))=\"([^\"]*)\""
+)
+_DECIMAL_RE = re.compile(r"-?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_DEFINITION_RE = re.compile(
+    r"<(marker|linearGradient|radialGradient|filter|clipPath|mask|pattern|symbol)"
+    r"\b[^>]*?\bid=\"([^\"]+)\"[^>]*?(?:/>|>.*?</\1>)",
+    re.DOTALL,
+)
+_REFERENCE_RE = re.compile(r"#([-\w.:]+)")
+_EMPTY_DEFS_RE = re.compile(r"<defs\b[^>]*?(?:/>|>\s*</defs>)")
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE_RE = re.compile(r"\s+")
+# Spaces before ":" can be a descendant combinator (".a :hover"); keep them.
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,>])\s*|(:)\s+")
+
+
+@dataclass(frozen=True)
+class SvgOptimization:
+    """Byte counts for one optimized file."""
+
+    path: Path
+    bytes_before: int
+    bytes_after: int
+    precision: int | None
+
+    @property
+    def saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def to_metadata(self) -> dict[str, object]:
+        return {
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "precision": self.precision,
+        }
+
+
+def _format_number(value: float, precision: int) -> str:
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text in {"0", "-0"}:
+        return "0"
+    # SVG numbers may omit the leading zero: "0.5" -> ".5", "-0.5" -> "-.5".
+    return text.replace("0.", ".", 1) if text.lstrip("-").startswith("0.") else text
+
+
+def _round_numbers(value: str, precision: int) -> str:
+    def shorten(match: re.Match[str]) -> str:
+        rounded = _format_number(float(match.group()), precision)
+        # "1.2.7" relies on the second dot to separate numbers; keep a gap
+        # when rounding drops the first number's own dot.
+        end = match.end()
+        if "." not in rounded and end < len(value) and value[end] == ".":
+            rounded += " "
+        return rounded
+
+    return _DECIMAL_RE.sub(shorten, value)
+
+
+def _split_css_rules(css: str) -> list[str]:
+    rules: list[str] = []
+    depth = 0
+    start = 0
+    for index, char in enumerate(css):
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                rules.append(css[start : index + 1])
+                start = index + 1
+        elif char == ";" and depth == 0:
+            # Statement at-rules such as @import end at the semicolon.
+            rules.append(css[start : index + 1])
+            start = index + 1
+    tail = css[start:].strip()
+    if tail:
+        rules.append(tail)
+    return [rule for rule in rules if rule.strip()]
+
+
+def _minify_css(css: str) -> str:
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _CSS_SPACE_RE.sub(" ", css)
+    css = _CSS_PUNCT_RE.sub(lambda m: m.group(1) or m.group(2), css)
+    return css.replace(";}", "}").strip()
+
+
+def _dedupe_css(css: str) -> str:
+    # Later duplicates win the cascade anyway, so keep the last occurrence.
+    seen: set[str] = set()
+    kept: list[str] = []
+    for rule in reversed(_split_css_rules(css)):
+        if rule not in seen:
+            seen.add(rule)
+            kept.append(rule)
+    return "".join(reversed(kept))
+
+
+def _outside_protected(svg: str, transform: re.Pattern[str], repl: str) -> str:
+    pieces: list[str] = []
+    last = 0
+    for match in _PROTECTED_RE.finditer(svg):
+        start, end = match.span(2)
+        pieces.append(transform.sub(repl, svg[last:start]))
+        pieces.append(match.group(2))
+        last = end
+    pieces.append(transform.sub(repl, svg[last:]))
+    return "".join(pieces)
+
+
+def _strip_unused_definitions(svg: str) -> str:
+    for _ in range(_MAX_DEFS_PASSES):
+        references = Counter(_REFERENCE_RE.findall(svg))
+        unused: list[tuple[int, int]] = []
+        for match in _DEFINITION_RE.finditer(svg):
+            ident = match.group(2)
+            # Only self-references inside the definition itself: unused.
+            inner = _REFERENCE_RE.findall(match.group()).count(ident)
+            if references[ident] == inner:
+                unused.append(match.span())
+        if not unused:
+            break
+        for start, end in reversed(unused):
+            svg = svg[:start] + svg[end:]
+    return _EMPTY_DEFS_RE.sub("", svg)
+
+
+@dataclass(frozen=True)
+class SvgOptimizer:
+    """Configurable text-level SVG optimizer.
+
+    ``precision`` is the number of decimals kept in geometry attributes;
+    ``None`` leaves numbers untouched.
+    """
+
+    precision: int | None = DEFAULT_PRECISION
+    minify_whitespace: bool = True
+    dedupe_styles: bool = True
+    strip_unused_defs: bool = True
+
+    def optimize(self, svg: str) -> str:
+        svg = _COMMENT_RE.sub("", svg)
+        if self.minify_whitespace or self.dedupe_styles:
+            svg = _STYLE_RE.sub(self._rewrite_style, svg)
+        if self.precision is not None:
+            precision = self.precision
+            svg = _GEOMETRY_ATTR_RE.sub(
+                lambda m: f'{m.group(1)}="{_round_numbers(m.group(2), precision)}"',
+                svg,
+            )
+        if self.strip_unused_defs:
+            svg = _strip_unused_definitions(svg)
+        if self.minify_whitespace:
+            svg = _outside_protected(svg, _INTER_TAG_SPACE_RE, "><").strip()
+        return svg
+
+    def _rewrite_style(self, match: re.Match[str]) -> str:
+        css = _minify_css(match.group(2)) if self.minify_whitespace else match.group(2)
+        if self.dedupe_styles:
+            css = _dedupe_css(css)
+        return f"{match.group(1)}{css}{match.group(3)}"
+
+    def optimize_file(self, path: str | Path) -> SvgOptimization:
+        """Optimize ``path`` in place, replacing it atomically."""
+        target = Path(path)
+        raw = target.read_bytes()
+        optimized = self.optimize(raw.decode("utf-8")).encode("utf-8")
+        if len(optimized) < len(raw):
+            fd, tmp_name = tempfile.mkstemp(
+                dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+            )
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(optimized)
+            Path(tmp_name).replace(target)
+        else:
+            optimized = raw
+        return SvgOptimization(
+            path=target,
+            bytes_before=len(raw),
+            bytes_after=len(optimized),
+            precision=self.precision,
+        )
+
+
+def optimize_svg(svg: str, *, precision: int | None = DEFAULT_PRECISION) -> str:
+    """Optimize SVG text with every stage enabled."""
+    return SvgOptimizer(precision=precision).optimize(svg)
+
+
+__all__ = [
+    "DEFAULT_PRECISION",
+    "SvgOptimization",
+    "SvgOptimizer",
+    "optimize_svg",
+]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import os
+from typing import TYPE_CHECKING
+
+from x_make_mermaid_x.class_extract import (
+    ClassCache,
+    extract_classes,
+    generate_class_diagram,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+MODULE_COUNT = 10
+
+SHAPES = """
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class Shape(Generic[T]):
+    sides: int = 0
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._area: float | None = None
+
+    def area(self) -> float:
+        return 0.0
+
+    class Meta:
+        ordering = "name"
+
+
+class Square(Shape[int]):
+    def _scale(self, factor: float) -> None:
+        self.side: list[float] = [factor]
+"""
+
+
+def test_extract_classes_collects_members_and_bases() -> None:
+    shape, meta, square = extract_classes(SHAPES, "pkg.shapes")
+
+    assert shape.qualname == "Shape"
+    assert shape.bases == ("Generic",)
+    assert shape.fields == (("sides", "int"), ("name", None), ("_area", "float | None"))
+    assert shape.methods == ("__init__", "area")
+    assert meta.qualname == "Shape.Meta"
+    assert square.bases == ("Shape",)
+    assert square.fields == (("side", "list[float]"),)
+
+
+def _write_package(root: Path) -> None:
+    root.mkdir()
+    (root / "__init__.py").write_text("", encoding="utf-8")
+    (root / "shapes.py").write_text(SHAPES, encoding="utf-8")
+    (root / "broken.py").write_text("class Oops(:\n", encoding="utf-8")
+    for index in range(MODULE_COUNT):
+        (root / f"mod{index}.py").write_text(
+            f"from .shapes import Square\n\n\nclass Tile{index}(Square):\n"
+            f"    colour: str\n",
+            encoding="utf-8",
+        )
+
+
+def test_generate_class_diagram_reuses_cache(tmp_path: Path) -> None:
+    package = tmp_path / "pkg"
+    _write_package(package)
+    cache_file = tmp_path / "cache" / "classes.json"
+    total_files = MODULE_COUNT + 3
+
+    builder = MermaidBuilder()
+    first = generate_class_diagram(
+        builder, package, cache=ClassCache(cache_file), max_workers=2
+    )
+    lines = builder.source().splitlines()
+
+    assert first.files == total_files
+    assert (first.parsed, first.cached, first.failed) == (total_files, 0, 1)
+    assert lines[0] == "classDiagram"
+    assert "  -_area float|None" in lines
+    assert "  +side list~float~" in lines
+    assert "Shape <|-- Square" in lines
+    assert "Square <|-- Tile3" in lines
+    assert first.relationships == MODULE_COUNT + 1, "Generic is external"
+
+    touched = package / "mod0.py"
+    stat = touched.stat()
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    (package / "mod1.py").write_text("class Fresh:\n    pass\n", encoding="utf-8")
+
+    rerun = MermaidBuilder()
+    second = generate_class_diagram(rerun, package, cache=ClassCache(cache_file))
+
+    assert (second.parsed, second.failed) == (1, 1), "touched file is hashed only"
+    assert second.cached == total_files - 1, "parse failures are cached too"
+    assert "class Fresh {" in rerun.source().splitlines()
+    assert "Square <|-- Tile1" not in rerun.source()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from x_make_mermaid_x.diagram_diff import (
+    FlowchartSyntaxError,
+    diff_flowcharts,
+    main,
+    parse_flowchart,
+    render_diff,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from _pytest.capture import CaptureFixture
+
+OLD = """flowchart LR
+  api["API"] --> db[(Postgres)]
+  api --> cache
+  worker -->|jobs| db
+"""
+
+NEW = """flowchart LR
+  %% cache was retired
+  api["Gateway"] --> db[(Postgres)]
+  api --> queue{{Queue}} -- jobs --> worker
+  worker -->|batches| db
+  style api fill:#fff
+"""
+
+
+def test_parse_flowchart_matches_builder_structure() -> None:
+    doc = parse_flowchart(NEW)
+
+    assert doc.header == "flowchart LR"
+    assert doc.nodes["queue"].shape == "hexagon"
+    assert [(e.src, e.dst, e.label) for e in doc.edges] == [
+        ("api", "db", None),
+        ("api", "queue", None),
+        ("queue", "worker", "jobs"),
+        ("worker", "db", "batches"),
+    ]
+    assert "style api fill:#fff" in doc.lines
+
+    rebuilt = parse_flowchart(MermaidBuilder().replace_doc(doc).source())
+    assert (rebuilt.nodes, rebuilt.edges) == (doc.nodes, doc.edges)
+    with pytest.raises(FlowchartSyntaxError, match="line 2"):
+        parse_flowchart("flowchart TD\n  a --> & b\n")
+
+
+def test_diff_flowcharts_reports_and_highlights_changes() -> None:
+    old = MermaidBuilder().replace_doc(parse_flowchart(OLD))
+
+    diff = diff_flowcharts(old, parse_flowchart(NEW))
+
+    assert diff.to_metadata() == {
+        "added_nodes": ["queue"],
+        "removed_nodes": ["cache"],
+        "changed_nodes": ["api"],
+        "added_edges": [["api", "queue"], ["queue", "worker"]],
+        "removed_edges": [["api", "cache"]],
+        "changed_edges": [["worker", "db"]],
+    }
+    assert diff_flowcharts(old, old).is_empty
+
+    lines = render_diff(MermaidBuilder(), diff).source().splitlines()
+    assert lines[0] == "flowchart LR"
+    assert "api --> cache" in lines, "removed edges are drawn too"
+    assert "style cache fill:#ffeef0,stroke:#cb2431,stroke-dasharray:5 5" in lines
+    assert any(line.startswith("style api fill:#fff5b1") for line in lines)
+    assert "linkStyle 4 stroke:#cb2431,stroke-dasharray:5 5" in lines
+    assert "linkStyle 3 stroke:#b08800,stroke-width:2px" in lines
+
+
+def test_main_exit_status_and_highlight(
+    tmp_path: Path, capsys: CaptureFixture[str]
+) -> None:
+    old_file = tmp_path / "old.mmd"
+    new_file = tmp_path / "new.mmd"
+    old_file.write_text(OLD, encoding="utf-8")
+    new_file.write_text(NEW, encoding="utf-8")
+    highlight = tmp_path / "diff.mmd"
+
+    assert main([str(old_file), str(new_file), "--highlight", str(highlight)]) == 1
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["removed_nodes"] == ["cache"]
+    assert highlight.read_text(encoding="utf-8").startswith("flowchart LR")
+    assert main([str(old_file), str(old_file)]) == 0
+
+
+def test_builder_diffs_clean_against_its_saved_source() -> None:
+    builder = MermaidBuilder().flowchart("TD")
+    for index, shape in enumerate(
+        ("circle", "stadium", "rect", "round", "hexagon", "unknown", None)
+    ):
+        builder.node(f"n{index}", f"node {index}", shape)
+        builder.edge(f"n{index}", f"n{index + 1}", "next")
+    builder.node("bare", shape="circle")
+
+    diff = diff_flowcharts(builder, parse_flowchart(builder.source()))
+
+    assert diff.is_empty, diff.to_metadata()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+from typing import TYPE_CHECKING
+
+import pytest
+
+from x_make_mermaid_x.dir_mindmap import (
+    MindmapOptions,
+    format_size,
+    generate_dir_mindmap,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _tree(root: Path) -> None:
+    (root / "src" / "pkg" / "deep").mkdir(parents=True)
+    (root / "src" / "pkg" / "deep" / "leaf.py").write_bytes(b"x" * 2048)
+    (root / "src" / "main (copy).py").write_bytes(b"x" * 10)
+    for index in range(5):
+        (root / "docs").mkdir(exist_ok=True)
+        (root / "docs" / f"page{index}.md").write_bytes(b"x" * 100)
+    (root / ".git").mkdir()
+    (root / ".git" / "HEAD").write_bytes(b"ref")
+
+
+def test_mindmap_nests_aggregates_and_overflows(tmp_path: Path) -> None:
+    root = tmp_path / "project"
+    _tree(root)
+    builder = MermaidBuilder()
+
+    report = generate_dir_mindmap(
+        builder, root, MindmapOptions(max_depth=2, max_children=3)
+    )
+
+    body = builder.source().splitlines()[1:]
+    texts = [line.strip() for line in body]
+    indents = [len(line) - len(line.lstrip()) for line in body]
+    expected_files = 7
+    assert report.files == expected_files, "hidden entries are skipped"
+    assert texts[0] == 'n1["project/ · 7 files · 2.5 KiB"]'
+    assert texts[1] == 'n2["docs/ · 5 files · 500 B"]'
+    assert texts[2:5] == [
+        'n3("page0.md · 100 B")',
+        'n4("page1.md · 100 B")',
+        'n5("page2.md · 100 B")',
+    ]
+    assert texts[5] == 'n6{{"2 more… · 200 B"}}'
+    assert texts[6] == 'n7["src/ · 2 files · 2.0 KiB"]'
+    assert texts[7] == 'n8["pkg/ · 1 files · 2.0 KiB"]', "summarised at max depth"
+    assert texts[8] == 'n9("main (copy).py · 10 B")'
+    assert len(texts) == report.nodes
+    assert indents[:3] == [indents[0], indents[0] + 2, indents[0] + 4]
+    assert report.overflow_nodes == 1
+
+
+def test_mindmap_entry_does_not_repeat_ancestors() -> None:
+    builder = MermaidBuilder().mindmap()
+    builder.mindmap_entry(0, "root").mindmap_entry(1, "a").mindmap_entry(2, "b")
+    builder.mindmap_entry(1, "c")
+
+    assert [line.strip() for line in builder.source().splitlines()[1:]] == [
+        "root",
+        "a",
+        "b",
+        "c",
+    ]
+
+
+def test_format_size_and_missing_root(tmp_path: Path) -> None:
+    assert format_size(0) == "0 B"
+    assert format_size(1536) == "1.5 KiB"
+    with pytest.raises(NotADirectoryError):
+        generate_dir_mindmap(MermaidBuilder(), tmp_path / "missing")
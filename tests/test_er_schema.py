@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import sqlite3
+from typing import TYPE_CHECKING
+
+import pytest
+
+from x_make_mermaid_x.er_schema import (
+    ErOptions,
+    SQLiteIntrospector,
+    generate_er,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SHOP_SCHEMA = """
+CREATE TABLE customers (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+    email VARCHAR(255), notes);
+CREATE TABLE orders (id INTEGER PRIMARY KEY,
+    customer_id INTEGER NOT NULL REFERENCES customers(id), placed_at TEXT);
+CREATE TABLE products (id INTEGER PRIMARY KEY, price DECIMAL(10, 2));
+CREATE TABLE order_items (order_id INTEGER REFERENCES orders(id),
+    product_id INTEGER REFERENCES products(id), quantity INTEGER,
+    PRIMARY KEY (order_id, product_id));
+CREATE TABLE audit_log (id INTEGER PRIMARY KEY, payload TEXT);
+"""
+
+
+def _database(tmp_path: Path, script: str) -> Path:
+    path = tmp_path / "schema.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(script)
+        connection.execute("INSERT INTO customers (name) VALUES ('x')")
+    return path
+
+
+def test_generate_er_emits_entities_and_foreign_keys(tmp_path: Path) -> None:
+    builder = MermaidBuilder()
+    with SQLiteIntrospector(_database(tmp_path, SHOP_SCHEMA)) as schema:
+        report = generate_er(builder, schema)
+
+    lines = builder.source().splitlines()
+    expected_tables = 5
+    expected_relationships = 3
+    assert report.tables == expected_tables, "sqlite_sequence is skipped"
+    assert report.relationships == expected_relationships
+    assert lines[0] == "erDiagram"
+    assert (
+        "customers { INTEGER id PK; TEXT name; VARCHAR(255) email; BLOB notes }"
+        in lines
+    )
+    assert "products { INTEGER id PK; DECIMAL(10_2) price }" in lines
+    assert 'orders }o--|| customers : "customer_id"' in lines
+    assert 'order_items }o--o| orders : "order_id"' in lines
+
+
+def test_options_filter_truncate_and_follow_seed(tmp_path: Path) -> None:
+    path = _database(tmp_path, SHOP_SCHEMA)
+    builder = MermaidBuilder()
+    options = ErOptions(exclude=("products",), seed="customers", depth=1, max_columns=2)
+    with SQLiteIntrospector(path) as schema:
+        report = generate_er(builder, schema, options)
+
+    lines = builder.source().splitlines()
+    expected_hidden = 3
+    assert report.tables == len(["customers", "orders"])
+    assert report.truncated_columns == expected_hidden
+    assert (
+        lines[1]
+        == 'customers { INTEGER id PK; TEXT name; string _more "2 more columns" }'
+    )
+    assert lines[2] == (
+        'orders { INTEGER id PK; INTEGER customer_id FK; string _more "1 more columns" }'
+    ), "key columns outrank plain ones"
+    assert not any(line.startswith("order_items") for line in lines)
+
+    with SQLiteIntrospector(path) as schema, pytest.raises(ValueError, match="seed"):
+        generate_er(
+            MermaidBuilder(), schema, ErOptions(seed="products", exclude=("p*",))
+        )
+
+
+def test_large_schema_streams_with_table_cap(tmp_path: Path) -> None:
+    table_count = 2000
+    script = "CREATE TABLE t0000 (id INTEGER PRIMARY KEY);\n" + "".join(
+        f"CREATE TABLE t{i:04d} (id INTEGER PRIMARY KEY, "
+        f"parent INTEGER REFERENCES t{i - 1:04d}(id));\n"
+        for i in range(1, table_count)
+    )
+    path = tmp_path / "wide.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(script)
+
+    builder = MermaidBuilder()
+    cap = 50
+    with SQLiteIntrospector(path) as schema:
+        report = generate_er(builder, schema, ErOptions(max_tables=cap))
+
+    assert report.tables == cap
+    assert report.omitted_tables == table_count - cap
+    assert report.relationships == cap - 1, "edges to omitted tables are dropped"
+
+
+def test_colliding_table_names_get_distinct_entities(tmp_path: Path) -> None:
+    path = tmp_path / "collide.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript("""
+            CREATE TABLE "a b" (id INTEGER PRIMARY KEY);
+            CREATE TABLE a_b (id INTEGER PRIMARY KEY,
+                parent_id INTEGER REFERENCES "a b"(id));
+            """)
+    builder = MermaidBuilder()
+    with SQLiteIntrospector(path) as schema:
+        generate_er(builder, schema)
+
+    lines = builder.source().splitlines()
+    entities = sorted(line.split(" {")[0] for line in lines if " {" in line)
+    assert entities == ["a_b", "a_b_2"]
+    assert any(line.startswith("a_b_2 }o--o| a_b :") for line in lines), lines
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import shutil
+import subprocess
+from typing import TYPE_CHECKING
+
+import pytest
+
+from x_make_mermaid_x.git_graph import (
+    GitCommit,
+    GitGraphOptions,
+    generate_gitgraph,
+    read_git_log,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+GIT = ("git", "-c", "user.name=t", "-c", "user.email=t@example.com")
+
+
+def _body(builder: MermaidBuilder) -> list[str]:
+    return [line.strip() for line in builder.source().splitlines()[1:]]
+
+
+def test_generate_gitgraph_collapses_runs_and_merges() -> None:
+    # Newest first: main a1..a6 with feature f1..f3 forked at a2, merged at a5.
+    commits = [
+        GitCommit("a6", ("a5",), branches=("main",), head=True),
+        GitCommit("a5", ("a4", "f3"), subject="Merge branch 'feature'"),
+        GitCommit("f3", ("f2",), tags=("v1",)),
+        GitCommit("f2", ("f1",)),
+        GitCommit("f1", ("a2",)),
+        GitCommit("a4", ("a3",)),
+        GitCommit("a3", ("a2",)),
+        GitCommit("a2", ("a1",)),
+        GitCommit("a1", ()),
+    ]
+    builder = MermaidBuilder()
+
+    report = generate_gitgraph(builder, commits)
+
+    expected_nodes = 7
+    assert _body(builder) == [
+        'commit id: "a1"',
+        'commit id: "a2"',
+        "branch feature",
+        "checkout main",
+        'commit id: "a3"',
+        'commit id: "a4"',
+        "checkout feature",
+        'commit id: "f1..f3 (3)" tag: "v1"',
+        "checkout main",
+        'merge feature id: "a5"',
+        'commit id: "a6"',
+    ]
+    assert (report.commits, report.nodes, report.merges) == (
+        len(commits),
+        expected_nodes,
+        1,
+    )
+
+    capped = MermaidBuilder()
+    generate_gitgraph(capped, commits, GitGraphOptions(max_commits=2, min_run=None))
+    assert _body(capped) == [
+        'commit id: "a5"',
+        'commit id: "a6"',
+    ], "parents outside the window are dropped"
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_read_git_log_streams_repository(tmp_path: Path) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(  # noqa: S603 - test helper with fixed arguments
+            [*GIT, *args], cwd=tmp_path, check=True, capture_output=True
+        )
+
+    git("init", "-q", "-b", "trunk")
+    git("commit", "-q", "--allow-empty", "-m", "root")
+    git("checkout", "-q", "-b", "topic")
+    git("commit", "-q", "--allow-empty", "-m", "work")
+    git("checkout", "-q", "trunk")
+    git("commit", "-q", "--allow-empty", "-m", "fix")
+    git("merge", "-q", "--no-ff", "-m", "Merge branch 'topic'", "topic")
+    git("tag", "v2")
+
+    expected_limit = 2
+    assert (
+        len(list(read_git_log(tmp_path, max_commits=expected_limit))) == expected_limit
+    )
+
+    builder = MermaidBuilder()
+    report = generate_gitgraph(builder, read_git_log(tmp_path))
+
+    source = builder.source()
+    assert '"mainBranchName":"trunk"' in source
+    assert "branch topic" in source
+    assert "merge topic" in source
+    assert 'tag: "v2"' in source
+    assert report.merges == 1
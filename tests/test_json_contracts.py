@@ -2,16 +2,20 @@ from __future__ import annotations
 
 # ruff: noqa: S101
 import copy
+import hashlib
 import json
-from collections.abc import Mapping
+import time
+from collections.abc import Mapping, Sequence
 from pathlib import Path
+from subprocess import CompletedProcess
 from typing import TYPE_CHECKING, Final, cast
 
 import pytest
 
-from x_make_common_x.exporters import ExportResult
+from x_make_common_x.exporters import CommandRunner, ExportResult
 from x_make_common_x.json_contracts import validate_payload, validate_schema
 from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, INPUT_SCHEMA, OUTPUT_SCHEMA
+from x_make_mermaid_x import x_cls_make_mermaid_x as mermaid_module
 from x_make_mermaid_x.x_cls_make_mermaid_x import main_json
 
 if TYPE_CHECKING:
@@ -181,6 +185,54 @@ def test_main_json_uses_raw_source(tmp_path: Path) -> None:
     assert export_svg_value is False
 
 
+def test_main_json_reports_content_hashes(tmp_path: Path) -> None:
+    def run(name: str) -> dict[str, object]:
+        payload: dict[str, object] = {
+            "command": "x_make_mermaid_x",
+            "parameters": {
+                "output_mermaid": str(tmp_path / f"{name}.mmd"),
+                "source": "flowchart LR\r\n  A-->B \n  A-->B\n",
+                "canonical": True,
+            },
+        }
+        result = main_json(payload)
+        validate_payload(result, OUTPUT_SCHEMA)
+        return cast("dict[str, object]", result["mermaid"])
+
+    first = run("first")
+    second = run("second")
+
+    written = Path(cast("str", first["source_path"])).read_bytes()
+    assert written == b"flowchart LR\n  A-->B\n  A-->B\n", "edges are never deduped"
+    assert first["source_sha256"] == hashlib.sha256(written).hexdigest()
+    assert first["source_sha256"] == second["source_sha256"]
+
+
+@pytest.mark.parametrize("diagram", ["flowchart", "sequenceDiagram", "gantt"])
+def test_main_json_counts_applied_items_for_every_diagram(
+    tmp_path: Path, diagram: str
+) -> None:
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "diagram.mmd"),
+            "document": {
+                "diagram": diagram,
+                "nodes": [{"id": "A"}, {"id": "B"}],
+                "edges": [{"source": "A", "target": "B"}],
+            },
+        },
+    }
+
+    result = main_json(payload)
+
+    summary = cast("dict[str, object]", result["summary"])
+    assert (summary["nodes"], summary["edges"]) == (
+        EXPECTED_NODE_COUNT,
+        EXPECTED_EDGE_COUNT,
+    ), "counts do not depend on the diagram kind"
+
+
 def test_main_json_reports_validation_error() -> None:
     payload: dict[str, object] = {"command": "x_make_mermaid_x", "parameters": {}}
 
@@ -193,3 +245,160 @@ def test_main_json_reports_validation_error() -> None:
     assert isinstance(message_value, str)
     assert status_value == "failure"
     assert message_value == "input payload failed validation"
+
+
+def test_main_json_reports_document_element_error_path(tmp_path: Path) -> None:
+    output_path = tmp_path / "invalid.mmd"
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(output_path),
+            "document": {
+                "diagram": "flowchart",
+                "nodes": [{"id": "A"}, {"id": "B"}],
+                "edges": [
+                    {"source": "A", "target": "B"},
+                    {"source": "B", "target": "A", "arrow": "==>"},
+                ],
+            },
+        },
+    }
+
+    result = main_json(payload)
+
+    validate_payload(result, ERROR_SCHEMA)
+    assert result["message"] == "input payload failed validation"
+    details = cast("dict[str, object]", result["details"])
+    assert details["path"] == ["parameters", "document", "edges", "1", "arrow"]
+    assert details["schema_path"], "jsonschema detail is preserved"
+    assert not output_path.exists(), "nothing is written for invalid input"
+
+
+def test_main_json_reduces_large_documents(tmp_path: Path) -> None:
+    node_total = 40
+    nodes = [{"id": f"svc{i // 10}.n{i}", "label": f"n{i}"} for i in range(node_total)]
+    edges = [
+        {"source": nodes[i]["id"], "target": nodes[i + 1]["id"]}
+        for i in range(node_total - 1)
+    ]
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "reduced.mmd"),
+            "document": {"diagram": "flowchart", "nodes": nodes, "edges": edges},
+            "reduce": {"max_nodes": 5, "strategies": ["cluster", "top_k"]},
+        },
+    }
+
+    result = main_json(payload)
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    summary_obj = result.get("summary")
+    assert isinstance(summary_obj, dict)
+    reduction_obj = cast("dict[str, object]", summary_obj).get("reduction")
+    assert isinstance(reduction_obj, dict)
+    reduction = cast("dict[str, object]", reduction_obj)
+    assert reduction.get("original_nodes") == node_total
+    clusters_obj = reduction.get("clusters")
+    assert isinstance(clusters_obj, dict)
+    assert reduction.get("nodes") == len(clusters_obj)
+    assert reduction.get("within_budget") is True
+
+
+def _chain_payload(tmp_path: Path, node_total: int) -> dict[str, object]:
+    edges = [
+        {"source": f"n{i}", "target": f"n{i + 1}", "label": "next"}
+        for i in range(node_total - 1)
+    ]
+    return {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "big.mmd"),
+            "document": {"diagram": "flowchart", "edges": edges},
+        },
+    }
+
+
+def test_main_json_rejects_documents_over_budget(tmp_path: Path) -> None:
+    payload = _chain_payload(tmp_path, 300)
+    parameters = cast("dict[str, object]", payload["parameters"])
+    parameters["budget"] = {"max_seconds": 1.5}
+
+    result = main_json(payload)
+
+    validate_payload(result, ERROR_SCHEMA)
+    assert result.get("message") == "document exceeds render budget"
+    assert not (tmp_path / "big.mmd").exists()
+
+
+def test_main_json_splits_documents_over_budget(tmp_path: Path) -> None:
+    payload = _chain_payload(tmp_path, 300)
+    parameters = cast("dict[str, object]", payload["parameters"])
+    parameters["budget"] = {"max_svg_bytes": 40_000, "action": "split"}
+
+    result = main_json(payload)
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    summary = cast("dict[str, object]", result.get("summary"))
+    budget = cast("dict[str, object]", summary.get("budget"))
+    parts = cast("list[dict[str, object]]", summary.get("parts"))
+    assert budget.get("exceeded") is True
+    assert budget.get("parts") == len(parts)
+    assert len(parts) > 1
+    for part in parts:
+        part_path = Path(cast("str", part.get("source_path")))
+        assert part_path.read_text(encoding="utf-8").startswith("flowchart LR")
+
+
+def test_budget_time_limit_applies_to_each_split_part(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    max_seconds = 2.5
+    render_seconds = 0.4
+    timeouts: list[float] = []
+
+    def slow_run_command(
+        args: Sequence[str], *, check: bool, timeout: float | None
+    ) -> CompletedProcess[str]:
+        del check
+        timeouts.append(cast("float", timeout))
+        time.sleep(render_seconds)
+        Path(args[list(args).index("-o") + 1]).write_text("<svg/>", encoding="utf-8")
+        return CompletedProcess(list(args), 0, stdout="", stderr="")
+
+    def fake_export(
+        mermaid_source: str,
+        *,
+        output_dir: Path,
+        stem: str,
+        runner: CommandRunner,
+        **_kwargs: object,
+    ) -> ExportResult:
+        del mermaid_source
+        svg_target = output_dir / f"{stem}.svg"
+        runner(["mmdc", "-o", str(svg_target)])
+        return ExportResult(
+            exporter="mermaid-cli",
+            succeeded=True,
+            output_path=svg_target,
+            command=("mmdc",),
+            stdout="",
+            stderr="",
+        )
+
+    monkeypatch.setattr(mermaid_module, "run_command", slow_run_command)
+    monkeypatch.setattr(mermaid_module, "export_mermaid_to_svg", fake_export)
+    payload = _chain_payload(tmp_path, 300)
+    parameters = cast("dict[str, object]", payload["parameters"])
+    parameters["budget"] = {"max_seconds": max_seconds, "action": "split"}
+    parameters["export_svg"] = True
+
+    result = main_json(payload)
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    summary = cast("dict[str, object]", result["summary"])
+    parts = cast("list[dict[str, object]]", summary["parts"])
+    assert len(parts) > 1
+    assert len(timeouts) == len(parts)
+    slack = render_seconds / 2
+    assert min(timeouts) > max_seconds - slack, "each part gets the full limit"
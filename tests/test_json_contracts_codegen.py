@@ -0,0 +1,178 @@
+"""Generated validators must agree with jsonschema."""
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+
+from __future__ import annotations
+
+import copy
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, INPUT_SCHEMA, OUTPUT_SCHEMA
+from x_make_mermaid_x.json_contracts.codegen import (
+    compile_validator,
+    generate_validator_source,
+    is_valid_error,
+    is_valid_input,
+    is_valid_output,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import ValidationErrorType, main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from _pytest.monkeypatch import MonkeyPatch
+
+    from x_make_mermaid_x.json_contracts.codegen import Validator
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "json_contracts"
+_DELETE = object()
+
+Path_ = tuple[str | int, ...]
+
+INPUT_MUTATIONS: list[tuple[Path_, object]] = [
+    (("command",), "other"),
+    (("command",), _DELETE),
+    (("extra",), 1),
+    (("parameters", "output_mermaid"), ""),
+    (("parameters", "output_mermaid"), _DELETE),
+    (("parameters", "export_svg"), 1),
+    (("parameters", "output_svg"), None),
+    (("parameters", "timeout_seconds"), 0),
+    (("parameters", "timeout_seconds"), 2.5),
+    (("parameters", "timeout_seconds"), True),
+    (("parameters", "reduce"), {"max_nodes": 0}),
+    (("parameters", "reduce"), {"max_nodes": 3.0}),
+    (("parameters", "reduce"), {"max_nodes": 3, "strategies": ["cluster", "x"]}),
+    (("parameters", "budget"), {"action": "reject"}),
+    (("parameters", "budget"), {"max_svg_bytes": 10}),
+    (("parameters", "budget"), {"max_seconds": 1, "model": {"time_coefficients": [1]}}),
+    (("parameters", "document", "diagram"), "flowchartz"),
+    (("parameters", "document", "direction"), None),
+    (("parameters", "document", "direction"), "XX"),
+    (("parameters", "document", "nodes", 0, "id"), ""),
+    (("parameters", "document", "nodes", 0, "label"), None),
+    (("parameters", "document", "nodes", 0, "shape"), "hexagon"),
+    (("parameters", "document", "nodes", 1), "deploy"),
+    (("parameters", "document", "edges", 0, "arrow"), "-->"),
+    (("parameters", "document", "edges", 0, "arrow"), "<<>>"),
+    (("parameters", "document", "edges", 0, "arrow"), "==>"),
+    (("parameters", "document", "edges", 0, "target"), _DELETE),
+    (("parameters", "document", "edges", 0, "weight"), 3),
+    (("parameters", "document", "lines"), ["A-->B", 7]),
+    (("parameters", "document", "instructions"), [{"type": "raw", "payload": "x"}]),
+    (("parameters", "document", "instructions"), [{"type": "nope", "payload": 1}]),
+    (("parameters", "document", "metadata", "nested"), {"a": [1, None]}),
+    (("parameters", "document", "directives"), [{"text": ""}]),
+    (("parameters", "document"), _DELETE),
+    (("parameters", "source"), _DELETE),
+]
+
+OUTPUT_MUTATIONS: list[tuple[Path_, object]] = [
+    (("status",), "failure"),
+    (("generated_at",), "not a date"),
+    (("mermaid", "source_bytes"), -1),
+    (("mermaid", "source_bytes"), 1.5),
+    (("mermaid", "svg", "detail"), _DELETE),
+    (("mermaid", "svg", "binary_path"), _DELETE),
+    (("mermaid", "svg", "inputs", "mermaid"), 3),
+    (("messages",), ["ok", None]),
+    (("summary", "parts"), [{"path": "a.mmd"}]),
+]
+
+ERROR_MUTATIONS: list[tuple[Path_, object]] = [
+    (("status",), "success"),
+    (("message",), ""),
+    (("anything",), {"allowed": True}),
+    (("details",), []),
+]
+
+
+def _load_fixture(name: str) -> dict[str, object]:
+    text = (FIXTURE_DIR / f"{name}.json").read_text(encoding="utf-8")
+    return cast("dict[str, object]", json.loads(text))
+
+
+def _mutate(payload: Mapping[str, object], path: Path_, value: object) -> object:
+    mutated = cast("dict[str, object]", copy.deepcopy(payload))
+    target: object = mutated
+    for step in path[:-1]:
+        target = cast("dict[str | int, object]", target)[step]
+    container = cast("dict[str | int, object]", target)
+    if value is _DELETE:
+        del container[path[-1]]
+    else:
+        container[path[-1]] = value
+    return mutated
+
+
+def _jsonschema_accepts(payload: object, schema: Mapping[str, object]) -> bool:
+    try:
+        validate_payload(cast("Mapping[str, object]", payload), schema)
+    except ValidationErrorType:
+        return False
+    return True
+
+
+@pytest.mark.parametrize(
+    ("fixture", "schema", "validator", "mutations"),
+    [
+        ("input", INPUT_SCHEMA, is_valid_input, INPUT_MUTATIONS),
+        ("output", OUTPUT_SCHEMA, is_valid_output, OUTPUT_MUTATIONS),
+        ("error", ERROR_SCHEMA, is_valid_error, ERROR_MUTATIONS),
+    ],
+)
+def test_generated_validators_agree_with_jsonschema(
+    fixture: str,
+    schema: Mapping[str, object],
+    validator: Validator,
+    mutations: list[tuple[Path_, object]],
+) -> None:
+    base = _load_fixture(fixture)
+    assert validator(base), f"{fixture} fixture should be accepted"
+    for path, value in mutations:
+        payload = _mutate(base, path, value)
+        expected = _jsonschema_accepts(payload, schema)
+        assert validator(payload) is expected, f"{fixture} disagrees at {path}"
+
+
+def test_generated_source_precompiles_patterns() -> None:
+    source, namespace = generate_validator_source(INPUT_SCHEMA)
+
+    assert "re.compile" not in source
+    assert any(hasattr(value, "search") for value in namespace.values())
+
+
+def test_unsupported_keywords_are_rejected() -> None:
+    with pytest.raises(ValueError, match="unsupported schema keywords"):
+        compile_validator({"type": "string", "maxLength": 3})
+
+
+def test_trusted_mode_skips_output_validation(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    checked: list[object] = []
+
+    def recording_validator(payload: object) -> bool:
+        checked.append(payload)
+        return True
+
+    monkeypatch.setattr(
+        "x_make_mermaid_x.x_cls_make_mermaid_x.is_valid_output", recording_validator
+    )
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "diagram.mmd"),
+            "source": "flowchart LR\nA-->B\n",
+        },
+    }
+
+    assert main_json(payload)["status"] == "success"
+    assert len(checked) == 1, "untrusted runs validate their output"
+    assert main_json(payload, trusted=True)["status"] == "success"
+    assert len(checked) == 1, "trusted runs skip output validation"
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import copy
+import io
+import json
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, OUTPUT_SCHEMA
+from x_make_mermaid_x.json_stream import JsonStreamReader
+from x_make_mermaid_x.result_memo import ResultMemo
+from x_make_mermaid_x.x_cls_make_mermaid_x import main_json, main_json_stream
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+TINY_CHUNK = 3
+
+
+def _flow_payload(output_mermaid: Path, node_total: int) -> dict[str, object]:
+    nodes = [{"id": f"n{i}", "label": f"node {i}"} for i in range(node_total)]
+    edges = [
+        {"source": f"n{i}", "target": f"n{i + 1}", "label": "next"}
+        for i in range(node_total - 1)
+    ]
+    return {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(output_mermaid),
+            "document": {
+                "diagram": "flowchart",
+                "direction": "LR",
+                "directives": [{"text": "init", "payload": {"theme": "dark"}}],
+                "comments": ["generated"],
+                "nodes": nodes,
+                "edges": edges,
+                "lines": ["classDef hot fill:#f00"],
+                "instructions": [{"type": "line", "payload": "class n0 hot"}],
+            },
+        },
+    }
+
+
+def test_reader_decodes_values_split_across_chunks() -> None:
+    data = {"a": [1, 23456, -7.5e3, 'x\\"y', None, True], "b": {"c": []}, "d": {}}
+    reader = JsonStreamReader(io.StringIO(json.dumps(data, indent=1)), TINY_CHUNK)
+
+    decoded: dict[str, object] = {}
+    for key in reader.iter_object():
+        if key == "a":
+            decoded[key] = list(reader.iter_values())
+        else:
+            decoded[key] = reader.read_value()
+
+    assert decoded == data
+    assert not reader.peek()
+
+
+def test_reader_waits_for_numbers_cut_at_any_chunk_size() -> None:
+    text = '{"values": [1.25, 2.5, -3.75e-2, 40E+1], "timeout_seconds": 12.5}'
+    expected = json.loads(text)
+
+    for chunk_size in range(1, len(text) + 1):
+        reader = JsonStreamReader(io.StringIO(text), chunk_size)
+        decoded: dict[str, object] = {}
+        for key in reader.iter_object():
+            decoded[key] = reader.read_value()
+        assert decoded == expected, f"chunk size {chunk_size}"
+        scalar = JsonStreamReader(io.StringIO("-0.5e1"), chunk_size)
+        assert scalar.read_value() == json.loads("-0.5e1")
+
+
+class _CountingReader(io.StringIO):
+    reads = 0
+
+    def read(self, size: int | None = -1, /) -> str:
+        self.reads += 1
+        return super().read(size)
+
+
+def test_reader_grows_reads_for_one_large_value() -> None:
+    text = "x" * 100_000
+    handle = _CountingReader(json.dumps({"source": text}))
+    reader = JsonStreamReader(handle, TINY_CHUNK)
+
+    assert [(key, reader.read_value()) for key in reader.iter_object()] == [
+        ("source", text)
+    ]
+    max_reads = 40
+    assert handle.reads < max_reads, "reads double instead of one chunk per retry"
+
+
+def test_reader_caps_the_buffer_for_malformed_values() -> None:
+    max_value_size = 1_000
+    handle = _CountingReader('{"source": "' + "x" * 100_000)
+    reader = JsonStreamReader(handle, TINY_CHUNK, max_value_size=max_value_size)
+
+    assert next(reader.iter_object()) == "source"
+    with pytest.raises(ValueError, match="longer than 1000 characters"):
+        reader.read_value()
+    assert handle.tell() < max_value_size * 4, "the rest of the file is not read"
+
+
+def test_reader_skips_nested_values_and_reports_offsets() -> None:
+    reader = JsonStreamReader(io.StringIO('{"skip": {"x": [1, [2]]}, "keep": 5}'))
+
+    keys: list[str] = []
+    kept: object = None
+    for key in reader.iter_object():
+        keys.append(key)
+        if key == "skip":
+            reader.skip_value()
+        else:
+            kept = reader.read_value()
+
+    assert keys == ["skip", "keep"]
+    assert kept == json.loads("5")
+
+    broken = JsonStreamReader(io.StringIO("[1 2]"))
+    with pytest.raises(ValueError, match="offset 3"):
+        list(broken.iter_values())
+
+
+def test_main_json_stream_matches_main_json(tmp_path: Path) -> None:
+    node_total = 50
+    eager_path = tmp_path / "eager.mmd"
+    streamed_path = tmp_path / "streamed.mmd"
+    payload_file = tmp_path / "payload.json"
+    payload_file.write_text(
+        json.dumps(_flow_payload(streamed_path, node_total)), encoding="utf-8"
+    )
+
+    eager = main_json(_flow_payload(eager_path, node_total))
+    streamed = main_json_stream(payload_file, chunk_size=TINY_CHUNK * 5)
+
+    validate_payload(streamed, OUTPUT_SCHEMA)
+    assert streamed_path.read_text(encoding="utf-8") == eager_path.read_text(
+        encoding="utf-8"
+    )
+    eager_summary = cast("dict[str, object]", eager["summary"])
+    streamed_summary = cast("dict[str, object]", streamed["summary"])
+    for key in ("diagram", "nodes", "edges", "lines", "instructions"):
+        assert streamed_summary.get(key) == eager_summary.get(key)
+    assert streamed_summary.get("nodes") == node_total
+
+
+def test_main_json_stream_shares_summary_and_memo(tmp_path: Path) -> None:
+    node_total = 5
+    output_path = tmp_path / "diagram.mmd"
+    payload_file = tmp_path / "payload.json"
+    payload_file.write_text(
+        json.dumps(_flow_payload(output_path, node_total)), encoding="utf-8"
+    )
+    memo = ResultMemo()
+
+    eager = main_json(_flow_payload(output_path, node_total), memo=ResultMemo())
+    streamed = main_json_stream(payload_file, memo=memo)
+    repeat = main_json_stream(payload_file, memo=memo)
+
+    assert streamed == eager
+    repeat_summary = cast("dict[str, object]", repeat["summary"])
+    assert repeat_summary.pop("memoized") is True
+    assert repeat == streamed
+
+    payload_file.write_text(
+        json.dumps(_flow_payload(output_path, node_total + 1)), encoding="utf-8"
+    )
+    changed = main_json_stream(payload_file, memo=memo)
+    summary = cast("dict[str, object]", changed["summary"])
+    assert "memoized" not in summary, "spooled elements are part of the key"
+    assert summary["nodes"] == node_total + 1
+
+
+def test_main_json_stream_reports_element_error_path(tmp_path: Path) -> None:
+    output_path = tmp_path / "bad.mmd"
+    payload = _flow_payload(output_path, 3)
+    document = cast(
+        "dict[str, object]",
+        cast("dict[str, object]", payload["parameters"])["document"],
+    )
+    edges = cast("list[dict[str, object]]", document["edges"])
+    edges[1]["arrow"] = "==>"
+
+    eager = main_json(copy.deepcopy(payload))
+    streamed = main_json_stream(io.StringIO(json.dumps(payload)))
+
+    validate_payload(streamed, ERROR_SCHEMA)
+    assert streamed["details"] == eager["details"]
+    assert not output_path.exists(), "no partial .mmd is left behind"
+
+
+def test_main_json_stream_reports_malformed_json() -> None:
+    result = main_json_stream(io.StringIO('{"command": "x_make_mermaid_x", '))
+
+    validate_payload(result, ERROR_SCHEMA)
+    assert result["message"] == "failed to read JSON payload"
@@ -4,17 +4,39 @@
 
 from __future__ import annotations
 
+import itertools
+import os
+import pickle
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from subprocess import CompletedProcess
 from typing import TYPE_CHECKING
 
+import pytest
+
+from x_make_common_x.exporters import ExportResult
 from x_make_mermaid_x import x_cls_make_mermaid_x as mermaid_module
-from x_make_mermaid_x.x_cls_make_mermaid_x import CommandError, MermaidBuilder
+from x_make_mermaid_x.x_cls_make_mermaid_x import (
+    CommandError,
+    CommandTimeoutError,
+    ExportJob,
+    MermaidBuilder,
+    MermaidDoc,
+    canonical_source,
+    export_concurrently,
+    merge_docs,
+    split_flowchart,
+)
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
 
+    from x_make_common_x.exporters import CommandRunner
+
     from _pytest.monkeypatch import MonkeyPatch
 
 
@@ -39,6 +61,59 @@ def test_flowchart_source_includes_nodes_and_edges() -> None:
     ), "Edge with label and style should be emitted"
 
 
+def test_canonical_source_is_byte_stable() -> None:
+    first = MermaidBuilder().flowchart("LR")
+    first.set_directive({"theme": "dark", "flowchart": {"curve": "basis"}})
+    first.raw("%%{config: {}}%%").raw("A --> B  ").raw("A --> B")
+    first.raw("subgraph one").raw("end").raw("subgraph two").raw("end")
+    second = MermaidBuilder().flowchart("LR")
+    second.set_directive({"flowchart": {"curve": "basis"}, "theme": "dark"})
+
+    assert first.doc.directives == second.doc.directives, "sorted directive keys"
+    assert "A --> B  " not in first.source(), "trailing whitespace is stripped"
+    first.node("A", "Start").node("A", "Start").style_node("A", "fill:#fff")
+    first.style_node("A", "fill:#fff")
+    canonical = first.source(sort_directives=True, dedupe_lines=True)
+    expected_repeats = 2
+    assert canonical.count("A --> B\n") == expected_repeats, "edges are kept"
+    assert canonical.count("end\n") == expected_repeats, "never deduped"
+    assert canonical.count('A["Start"]\n') == 1
+    assert canonical.count("style A fill:#fff\n") == 1
+    assert first.canonical(sort_directives=True).source() == canonical
+    assert canonical_source(canonical) == canonical
+
+
+def test_canonical_source_keeps_directive_order() -> None:
+    text = "%%{init: {'theme': 'forest'}}%%\n%%{config: {}}%%\nflowchart LR\n"
+
+    assert canonical_source(text) == text
+    assert canonical_source(text, sort_directives=True).startswith("%%{config")
+
+
+def test_canonical_dedupe_keeps_order_sensitive_diagrams() -> None:
+    git = MermaidBuilder().gitgraph()
+    for _ in range(4):
+        git.git_commit()
+    git.git_branch("dev").git_checkout("dev").git_commit().git_checkout("main")
+    git.git_merge("dev").git_checkout("dev").git_merge("main").git_checkout("main")
+    git.git_merge("dev")
+    seq = MermaidBuilder().sequence()
+    for _ in range(2):
+        seq.message("A", "B", "ping").activate("B").deactivate("B")
+    mind = MermaidBuilder().mindmap()
+    mind.mindmap_entry(0, "root").mindmap_entry(1, "a").mindmap_entry(2, "x")
+    mind.mindmap_entry(1, "b").mindmap_entry(2, "x")
+
+    for builder in (git, seq, mind):
+        verbatim = builder.source(dedupe_lines=False)
+        assert builder.canonical().source() == verbatim
+        assert canonical_source(verbatim) == verbatim
+    expected_commits, expected_checkouts = 5, 2
+    assert git.source().count("commit\n") == expected_commits
+    assert git.source().count("checkout main\n") == expected_checkouts
+    assert seq.source().count("\nactivate B\n") == expected_checkouts
+
+
 def test_to_svg_returns_none_when_cli_missing(
     tmp_path: Path,
     monkeypatch: MonkeyPatch,
@@ -170,3 +245,571 @@ def test_run_command_raises_command_error(monkeypatch: MonkeyPatch) -> None:
         "mmdc",
         "render",
     ), "CommandError should expose argv"
+
+
+def test_reduce_collapses_chains_and_reports_counts() -> None:
+    builder = MermaidBuilder().flowchart("LR")
+    builder.edge("A", "B").edge("B", "C").edge("C", "D").edge("A", "D")
+    builder.edge("A", "E").style_node("E", "fill:#f00")
+
+    report = builder.reduce(3, strategies=("chains",))
+
+    mermaid = builder.source()
+    expected_original = 5
+    expected_nodes = 3
+    expected_collapsed = 2
+    assert report.original_nodes == expected_original, "edge endpoints count"
+    assert report.nodes == expected_nodes
+    assert report.chain_nodes_collapsed == expected_collapsed, "B and C collapse"
+    assert "A -->|2 collapsed| D" in mermaid
+    assert "B" not in mermaid.split("\n")
+    assert "style E fill:#f00" in mermaid, "styles of kept nodes survive"
+
+
+def test_reduce_keeps_edge_labels_and_link_styles() -> None:
+    builder = MermaidBuilder().flowchart("LR")
+    builder.edge("H", "B", "calls").edge("B", "C", "calls").edge("C", "D", "calls")
+    builder.edge("H", "X", "reads").edge("X", "Y", "writes").edge("H", "Q")
+    builder.link_style(0, "stroke:red").link_style(5, "stroke:blue")
+
+    report = builder.reduce(6, strategies=("chains",))
+
+    lines = builder.source().splitlines()
+    assert "H -->|calls (2 collapsed)| D" in lines, "a shared label is kept"
+    assert "H -->|1 collapsed| Y" in lines
+    assert report.to_summary()["edge_labels_dropped"] == len(("reads", "writes"))
+    edges = [line for line in lines if "-->" in line]
+    assert "linkStyle 0 stroke:red" not in lines, "its edge was collapsed"
+    assert f"linkStyle {edges.index('H --> Q')} stroke:blue" in lines
+
+
+def test_reduce_clusters_by_prefix_and_enforces_budget() -> None:
+    builder = MermaidBuilder().flowchart("TD")
+    for name in ("pay.api", "pay.db", "pay.queue", "shop.web", "shop.cart"):
+        builder.node(name, name)
+    builder.edge("shop.web", "pay.api").edge("shop.cart", "pay.db")
+    builder.edge("pay.api", "pay.db").edge("extra", "shop.web")
+
+    report = builder.reduce(3, strategies=("cluster", "top_k"))
+
+    summary = report.to_summary()
+    assert summary["clusters"] == {"pay": 3, "shop": 2}
+    assert summary["applied"] == ["cluster"], "top_k is skipped once in budget"
+    assert report.within_budget
+    mermaid = builder.source()
+    assert 'subgraph cluster_1 ["pay (3)"]' in mermaid
+    assert "cluster_2 --> cluster_1" in mermaid, "cross-cluster edges are merged"
+    assert mermaid.count("cluster_2 --> cluster_1") == 1
+
+
+def test_reduce_drops_transitive_edges() -> None:
+    builder = MermaidBuilder().flowchart("LR")
+    builder.edge("A", "B").edge("B", "C").edge("A", "C")
+
+    report = builder.reduce(1, strategies=("transitive",))
+
+    assert report.transitive_edges_dropped == 1
+    assert "A --> C" not in builder.source()
+
+    cyclic = MermaidBuilder().flowchart("LR")
+    for src, dst in itertools.permutations("ABC", 2):
+        cyclic.edge(src, dst)
+    cyclic.reduce(1, strategies=("transitive",))
+    successors: dict[str, set[str]] = {}
+    for edge in cyclic.doc.edges:
+        successors.setdefault(edge.src, set()).add(edge.dst)
+    for start in "ABC":
+        reached = set(successors.get(start, ()))
+        for node in list(reached):
+            reached |= successors.get(node, set())
+        assert reached >= set("ABC") - {start}, "cycles stay strongly connected"
+
+
+def test_reduce_keeps_clusters_of_surviving_nodes() -> None:
+    builder = MermaidBuilder().flowchart("LR")
+    with builder.cluster("Payments", cluster_id="pay"):
+        builder.node("api", "API").node("db")
+    builder.subgraph("legacy", ["old"]).node("old", "Old")
+    builder.edge("api", "db").edge("db", "api")
+
+    report = builder.reduce(2, strategies=("top_k",))
+
+    assert builder.source().splitlines()[1:] == [
+        'subgraph pay ["Payments"]',
+        'api["API"]',
+        "db",
+        "end",
+        "api --> db",
+        "db --> api",
+    ], "the emptied legacy block is removed"
+    expected_dropped = 3
+    assert report.lines_dropped == expected_dropped
+
+
+def test_split_flowchart_keeps_each_raw_line_once() -> None:
+    builder = MermaidBuilder().flowchart("LR")
+    builder.raw("title Services").raw("classDef hot fill:#f00")
+    builder.edge("a1", "a2").edge("b1", "b2")
+    builder.raw("a1 -.-> a2").raw('click b2 "https://example.com"')
+    builder.raw("a2 --> b1")
+
+    parts, cut = split_flowchart(builder.doc, 2)
+
+    first, second = (part.lines for part in parts)
+    assert first == [
+        "title Services",
+        "classDef hot fill:#f00",
+        "a1 -.-> a2",
+        "a1",
+        "a2",
+        "a1 --> a2",
+    ]
+    assert second == [
+        "classDef hot fill:#f00",
+        'click b2 "https://example.com"',
+        "b1",
+        "b2",
+        "b1 --> b2",
+    ]
+    assert cut == 1, "the raw edge between parts is dropped and counted"
+
+
+def test_cluster_nests_flowchart_and_state_blocks() -> None:
+    builder = MermaidBuilder().flowchart("TD")
+    with builder.cluster("Payments", cluster_id="pay", direction="LR") as pay:
+        pay.node("api", "API")
+        with pay.cluster("workers"):
+            pay.node("w1")
+        pay.edge("api", "w1")
+    builder.node("web")
+
+    assert builder.source().splitlines()[1:] == [
+        'subgraph pay ["Payments"]',
+        "direction LR",
+        'api["API"]',
+        "subgraph workers",
+        "w1",
+        "end",
+        "api --> w1",
+        "end",
+        "web",
+    ]
+
+    states = MermaidBuilder().state()
+    with states.cluster("Active"):
+        states.state_start("Idle")
+        with (
+            states.cluster("Awaiting payment"),
+            states.cluster("Retry", cluster_id="r"),
+        ):
+            states.state_end("Idle")
+    assert states.source().splitlines()[1:] == [
+        "state Active {",
+        "[*] --> Idle",
+        'state "Awaiting payment" as Awaiting_payment {',
+        'state "Retry" as r {',
+        "Idle --> [*]",
+        "}",
+        "}",
+        "}",
+    ]
+
+
+def _fail_inside_cluster(builder: MermaidBuilder) -> None:
+    with builder.cluster("outer"):
+        message = "boom"
+        raise ValueError(message)
+
+
+def test_cluster_closes_on_error_and_scales_linearly() -> None:
+    builder = MermaidBuilder().flowchart("LR")
+    with pytest.raises(ValueError, match="boom"):
+        _fail_inside_cluster(builder)
+    assert builder.source().splitlines()[1:] == ["subgraph outer", "end"]
+
+    fanout = 12
+    nested = MermaidBuilder().flowchart("LR")
+    for a in range(fanout):
+        with nested.cluster(f"a{a}", cluster_id=f"a{a}"):
+            for b in range(fanout):
+                with nested.cluster(f"b{b}", cluster_id=f"a{a}b{b}"):
+                    for c in range(fanout):
+                        with nested.cluster(f"c{c}", cluster_id=f"a{a}b{b}c{c}"):
+                            for d in range(fanout):
+                                nested.node(f"n{a}_{b}_{c}_{d}")
+    lines = nested.source().splitlines()[1:]
+    clusters = fanout + fanout**2 + fanout**3
+    assert len(lines) == fanout**4 + 2 * clusters
+    assert lines.count("end") == clusters
+
+
+def _team(name: str) -> MermaidBuilder:
+    builder = MermaidBuilder().flowchart("TD")
+    with builder.cluster("core", cluster_id="core"):
+        builder.node("api", f"{name} api").node("db", "DB", shape="cylinder")
+    builder.edge("api", "db", "reads").style_node("api", "fill:#eee")
+    builder.click("db", "https://example.com").link_style(0, "stroke:red")
+    return builder.raw("%% kept as written")
+
+
+def test_merge_docs_namespaces_ids_and_wraps_sources() -> None:
+    teams: dict[str, MermaidBuilder | MermaidDoc] = {
+        "pay": _team("Pay"),
+        "shop": _team("Shop").doc,
+    }
+    builder = MermaidBuilder().merge(teams, subgraphs=True)
+
+    lines = builder.source().splitlines()
+    assert lines[0] == "flowchart TD"
+    assert lines[1:12] == [
+        'subgraph pay ["pay"]',
+        'subgraph pay.core ["core"]',
+        'pay.api["Pay api"]',
+        "pay.db[(DB)]",
+        "end",
+        "pay.api -->|reads| pay.db",
+        "style pay.api fill:#eee",
+        'click pay.db "https://example.com"',
+        "linkStyle 0 stroke:red",
+        "%% kept as written",
+        "end",
+    ]
+    assert "linkStyle 1 stroke:red" in lines, "link indexes follow merged edges"
+    assert "shop.api -->|reads| shop.db" in lines
+    assert sorted(builder.doc.nodes) == ["pay.api", "pay.db", "shop.api", "shop.db"]
+
+    report = builder.reduce(2, strategies=("cluster",))
+    assert report.clusters == {"pay": 2, "shop": 2}, "namespaces cluster by source"
+
+    mixed: list[MermaidBuilder | MermaidDoc] = [builder.doc, _team("Ops")]
+    merged = merge_docs(mixed, separator="_").lines
+    assert 'subgraph s1_cluster_1 ["pay (2)"]' in merged
+    assert "s1_cluster_2 --> s1_cluster_1" not in merged
+    assert "s2_api -->|reads| s2_db" in merged
+    with pytest.raises(ValueError, match="flowchart"):
+        merge_docs([MermaidBuilder().state()])
+
+
+def test_merge_docs_keeps_equal_subgraph_titles_apart() -> None:
+    def fragment() -> MermaidBuilder:
+        builder = MermaidBuilder().flowchart().node("a").node("b")
+        builder.subgraph("Svc", ["a"])
+        with builder.cluster("Svc"):
+            builder.node("c")
+        with builder.cluster("My Svc"):
+            builder.node("d")
+        return builder
+
+    lines = merge_docs({"x": fragment(), "y": fragment()}).lines
+
+    for namespace in ("x", "y"):
+        assert f'subgraph {namespace}.Svc ["Svc"]' in lines
+        assert f"{namespace}.a" in lines
+        assert f'subgraph {namespace}.My_Svc ["My Svc"]' in lines
+    subgraph_and_cluster = 2
+    assert lines.count('subgraph x.Svc ["Svc"]') == subgraph_and_cluster
+    assert "subgraph Svc" not in lines
+    assert merge_docs({"": fragment()}).lines[2] == "subgraph Svc"
+
+
+def test_merge_docs_is_linear_in_fragments() -> None:
+    fragments = 300
+    per_fragment = 40
+    sources: dict[str, MermaidBuilder | MermaidDoc] = {}
+    for index in range(fragments):
+        fragment = MermaidBuilder().flowchart()
+        for node in range(per_fragment):
+            fragment.node(f"n{node}").edge(f"n{node}", f"n{node + 1}")
+        sources[f"team{index}"] = fragment
+
+    doc = merge_docs(sources)
+
+    assert len(doc.edges) == fragments * per_fragment
+    last = f"team{fragments - 1}"
+    assert doc.lines[-1] == f"{last}.n{per_fragment - 1} --> {last}.n{per_fragment}"
+
+
+def test_compact_ids_shortens_references_and_keeps_labels() -> None:
+    adapter = "com.shop.payments.gateway.v2.Adapter"
+    service = "com.shop.core.Service"
+    builder = MermaidBuilder().flowchart("TD")
+    builder.node(adapter, "Adapter")
+    with builder.cluster("Core", cluster_id="com.shop.core"):
+        builder.node(service)
+    builder.edge(adapter, service).edge(service, "com.shop.db.Store", "query")
+    builder.style_node("com.shop.db.Store", "fill:#f00").edge("A", "n0")
+    plain = builder.source()
+
+    compact = builder.source(compact_ids=True)
+
+    assert compact.splitlines()[1:] == [
+        'n1["Adapter"]',
+        'subgraph n2 ["Core"]',
+        'n3["com.shop.core.Service"]',
+        "end",
+        "n1 --> n3",
+        'n4["com.shop.db.Store"]',
+        "n3 -->|query| n4",
+        "style n4 fill:#f00",
+        "A --> n0",
+    ], "short ids never collide with ids kept as they are"
+    assert builder.get_last_id_map() == {
+        adapter: "n1",
+        "com.shop.core": "n2",
+        service: "n3",
+        "com.shop.db.Store": "n4",
+    }
+    assert builder.source() == plain, "compaction is opt-in per call"
+    assert builder.canonical(compact_ids=True).source() == compact
+
+
+def test_subgraph_body_ids_follow_compaction_and_merging() -> None:
+    adapter = "com.shop.payments.Adapter"
+    builder = MermaidBuilder().flowchart("TD")
+    builder.subgraph("payments", [f"  {adapter}", "  x --> y"])
+    builder.node(adapter, "Adapter").edge(adapter, "com.shop.db.Store")
+
+    compact = builder.source(compact_ids=True).splitlines()
+
+    assert compact[1:4] == ["subgraph payments", '  n0["Adapter"]', "  x --> y"]
+    assert adapter not in "\n".join(compact), "no stray node under the long id"
+    merged = merge_docs({"team": builder}).lines
+    assert merged[:3] == [
+        'subgraph team.payments ["payments"]',
+        f"  team.{adapter}",
+        "  x --> y",
+    ]
+
+
+def test_compact_ids_shrinks_large_graphs() -> None:
+    builder = MermaidBuilder().flowchart()
+    modules = [f"com.shop.payments.gateway.v2.module{i}.Adapter" for i in range(500)]
+    for index, module in enumerate(modules):
+        for step in (1, 7, 31, 127):
+            builder.edge(module, modules[(index + step) % len(modules)])
+
+    plain = builder.source()
+    compact = builder.source(compact_ids=True)
+
+    expected_ratio = 3
+    assert len(plain) > expected_ratio * len(compact)
+    assert len(builder.get_last_id_map()) == len(modules)
+
+
+def test_snapshot_round_trips_builder_and_doc() -> None:
+    builder = MermaidBuilder(mermaid_cli="/opt/mmdc", export_timeout=5.0)
+    builder.canonical(compact_ids=True).flowchart("TD").add_comment("team")
+    with builder.cluster("Core", cluster_id="core"):
+        builder.node("api", "API", shape="round").node("db")
+    builder.edge("api", "db", "reads", style="stroke:red").raw("%% raw")
+
+    restored = MermaidBuilder.from_bytes(builder.to_bytes())
+
+    assert restored.source() == builder.source()
+    assert restored.doc == builder.doc
+    restored.edge("db", "api")
+    assert len(builder.doc.edges) == 1, "restored builders are independent"
+
+    doc = builder.doc
+    assert MermaidDoc.from_bytes(doc.to_bytes(compress=False)) == doc
+    assert pickle.loads(pickle.dumps(doc)) == doc  # noqa: S301 - own data
+    clone = pickle.loads(pickle.dumps(builder))  # noqa: S301 - own data
+    assert isinstance(clone, MermaidBuilder)
+    assert clone.source() == builder.source()
+
+
+def _export_source(snapshot: bytes) -> str:
+    return MermaidBuilder.from_bytes(snapshot).source()
+
+
+def test_snapshot_ships_to_worker_processes() -> None:
+    builder = MermaidBuilder().flowchart()
+    for index in range(200):
+        builder.edge(f"service{index}", f"service{index + 1}")
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        sources = list(pool.map(_export_source, [builder.to_bytes()] * 2))
+
+    assert sources == [builder.source()] * 2
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"not a snapshot",
+        MermaidBuilder().to_bytes()[:-4],
+        MermaidBuilder().doc.to_bytes(),
+    ],
+)
+def test_snapshot_rejects_foreign_or_corrupt_data(data: bytes) -> None:
+    with pytest.raises(ValueError, match="snapshot"):
+        MermaidBuilder.from_bytes(data)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups")
+def test_run_command_timeout_kills_process_group(tmp_path: Path) -> None:
+    pid_file = tmp_path / "child.pid"
+    script = (
+        "import subprocess, sys, time\n"
+        "cmd = [sys.executable, '-c', 'import time; time.sleep(60)']\n"
+        "child = subprocess.Popen(cmd)\n"
+        f"open({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+        "time.sleep(60)\n"
+    )
+
+    started = time.monotonic()
+    with pytest.raises(CommandTimeoutError) as caught:
+        mermaid_module.run_command([sys.executable, "-c", script], timeout=1.0)
+
+    max_wait_seconds = 10
+    assert time.monotonic() - started < max_wait_seconds, "timeout bounds the wait"
+    assert caught.value.timeout == 1.0
+    child_pid = int(pid_file.read_text(encoding="utf-8"))
+    deadline = time.monotonic() + 5
+    while _pid_alive(child_pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _pid_alive(child_pid), "grandchildren should be terminated too"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="shebang fake CLI")
+def test_to_svg_reports_timeout_as_failed_export(tmp_path: Path) -> None:
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text(
+        f"#!{sys.executable}\nimport time\ntime.sleep(60)\n", encoding="utf-8"
+    )
+    fake_cli.chmod(0o755)
+    builder = MermaidBuilder(mermaid_cli=str(fake_cli)).flowchart().node("A")
+
+    result = builder.to_svg(svg_path=str(tmp_path / "slow.svg"), timeout=0.5)
+
+    assert result is None
+    last_result = builder.get_last_export_result()
+    assert last_result is not None
+    assert last_result.succeeded is False
+    assert "timed out" in (last_result.detail or "")
+
+
+def test_export_reuses_cached_cli_resolution(
+    tmp_path: Path,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.delenv("MMDC", raising=False)
+    mermaid_module.get_cli_cache().clear()
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text("binary", encoding="utf-8")
+    requested: list[str | None] = []
+
+    def fake_export(
+        mermaid_source: str,
+        *,
+        output_dir: Path,
+        stem: str,
+        mermaid_cli_path: str | None = None,
+        **_kwargs: object,
+    ) -> ExportResult:
+        requested.append(mermaid_cli_path)
+        svg_path = output_dir / f"{stem}.svg"
+        svg_path.write_text(mermaid_source, encoding="utf-8")
+        return ExportResult(
+            exporter="mermaid-cli",
+            succeeded=True,
+            output_path=svg_path,
+            command=(str(fake_cli),),
+            stdout="",
+            stderr="",
+            inputs={},
+            binary_path=fake_cli,
+        )
+
+    monkeypatch.setattr(
+        "x_make_mermaid_x.x_cls_make_mermaid_x.export_mermaid_to_svg",
+        fake_export,
+    )
+    builder = MermaidBuilder().flowchart().node("A")
+
+    builder.to_svg(svg_path=str(tmp_path / "one.svg"))
+    builder.to_svg(svg_path=str(tmp_path / "two.svg"))
+    os.utime(fake_cli, ns=(0, 0))
+    builder.to_svg(svg_path=str(tmp_path / "three.svg"))
+
+    assert requested == [None, str(fake_cli), None], "mtime change invalidates"
+    mermaid_module.get_cli_cache().clear()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="shebang fake CLI")
+def test_cli_version_probe_is_cached_on_disk(tmp_path: Path) -> None:
+    calls = tmp_path / "calls.log"
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text(
+        f"#!{sys.executable}\n"
+        f"open({str(calls)!r}, 'a').write('x')\n"
+        "print('10.9.1')\n",
+        encoding="utf-8",
+    )
+    fake_cli.chmod(0o755)
+    cache_file = tmp_path / "cache" / "cli.json"
+
+    first = mermaid_module.MermaidCliCache(cache_file)
+    assert first.version(str(fake_cli)) == "10.9.1"
+    assert first.version(str(fake_cli)) == "10.9.1"
+    second = mermaid_module.MermaidCliCache(cache_file)
+    info = second.lookup(str(fake_cli))
+
+    assert calls.read_text(encoding="utf-8") == "x", "version probed only once"
+    assert info is not None
+    assert info.version == "10.9.1"
+
+
+def test_export_concurrently_uses_per_thread_runners(tmp_path: Path) -> None:
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text("binary", encoding="utf-8")
+    runner_threads: list[int] = []
+    lock = threading.Lock()
+
+    def make_runner() -> CommandRunner:
+        owner = threading.get_ident()
+        with lock:
+            runner_threads.append(owner)
+
+        def runner(command: Sequence[str]) -> CompletedProcess[str]:
+            assert threading.get_ident() == owner, "runner stays on its thread"
+            Path(command[command.index("-o") + 1]).write_text("<svg />", "utf-8")
+            return CompletedProcess(list(command), 0, stdout="", stderr="")
+
+        return runner
+
+    builder = MermaidBuilder(
+        mermaid_cli=str(fake_cli), runner_factory=make_runner
+    ).flowchart()
+    builder.edge("A", "B")
+    jobs = [
+        ExportJob(builder=builder, svg_path=str(tmp_path / f"d{index}.svg"))
+        for index in range(8)
+    ]
+
+    results = export_concurrently(jobs, max_workers=4)
+
+    assert [r.output_path for r in results] == [
+        tmp_path / f"d{i}.svg" for i in range(8)
+    ]
+    assert all(r.succeeded for r in results)
+    assert len(runner_threads) == len(set(runner_threads)), "one runner per thread"
+    assert builder.get_last_export_result() is None, "results are per thread"
+
+
+def test_export_concurrently_rejects_duplicate_targets(tmp_path: Path) -> None:
+    builder = MermaidBuilder().flowchart().node("A")
+    target = str(tmp_path / "same.svg")
+    jobs = [ExportJob(builder, target), ExportJob(builder, target)]
+
+    with pytest.raises(ValueError, match="duplicate export target"):
+        export_concurrently(jobs)
@@ -0,0 +1,124 @@
+"""Tests for the render metrics registry."""
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+
+from __future__ import annotations
+
+from pathlib import Path
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING
+
+from x_make_mermaid_x.metrics import (
+    MetricsRegistry,
+    active_metrics,
+    disable_metrics,
+    enable_metrics,
+    timed,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder, main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+EXPECTED_SVG_BYTES = 7
+
+
+def _write_svg(command: Sequence[str]) -> CompletedProcess[str]:
+    Path(command[command.index("-o") + 1]).write_text("<svg />", encoding="utf-8")
+    return CompletedProcess(list(command), 0, stdout="", stderr="")
+
+
+def test_prometheus_text_lists_counters_and_cumulative_buckets(
+    tmp_path: Path,
+) -> None:
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc("renders_total")
+    registry.inc("bytes_written_total", 42, kind="svg")
+    registry.observe("export_seconds", 0.05)
+    registry.observe("export_seconds", 0.5)
+    registry.observe("export_seconds", 5.0)
+
+    text = registry.to_prometheus()
+
+    assert "# TYPE x_make_mermaid_renders_total counter" in text
+    assert 'x_make_mermaid_bytes_written_total{kind="svg"} 42' in text
+    assert 'x_make_mermaid_export_seconds_bucket{le="0.1"} 1' in text
+    assert 'x_make_mermaid_export_seconds_bucket{le="1"} 2' in text
+    assert 'x_make_mermaid_export_seconds_bucket{le="+Inf"} 3' in text
+    assert "x_make_mermaid_export_seconds_count 3" in text
+    written = registry.write_prometheus(tmp_path / "textfile" / "mermaid.prom")
+    assert written.read_text(encoding="utf-8") == text
+
+
+def test_disabled_metrics_share_a_no_op_timer() -> None:
+    disable_metrics()
+    assert active_metrics() is None
+    assert timed("source_seconds") is timed("export_seconds")
+
+
+def test_main_json_records_metrics_and_flushes_callback(tmp_path: Path) -> None:
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text("binary", encoding="utf-8")
+    snapshots: list[Mapping[str, object]] = []
+    registry = enable_metrics(
+        MetricsRegistry(callback=snapshots.append, flush_interval=0.0)
+    )
+    try:
+        builder = MermaidBuilder(
+            runner=_write_svg,
+            mermaid_cli=str(fake_cli),
+        ).flowchart()
+        builder.edge("A", "B")
+        assert builder.to_svg(svg_path=str(tmp_path / "d.svg")) is not None
+        payload: dict[str, object] = {
+            "command": "x_make_mermaid_x",
+            "parameters": {
+                "output_mermaid": str(tmp_path / "out.mmd"),
+                "source": "flowchart LR\nA-->B\n",
+            },
+        }
+        result = main_json(payload)
+    finally:
+        disable_metrics()
+
+    assert result["status"] == "success"
+    assert registry.counter("renders_total") == 1
+    assert registry.counter("render_failures_total") == 0
+    assert registry.counter("bytes_written_total", kind="svg") == EXPECTED_SVG_BYTES
+    assert registry.counter("bytes_written_total", kind="mmd") > 0
+    assert registry.observations("source_seconds") >= 1
+    assert registry.observations("export_seconds") == 1
+    assert registry.observations("schema_validation_seconds", schema="input") == 1
+    assert registry.observations("schema_validation_seconds", schema="output") == 1
+    assert snapshots, "callback receives a snapshot after main_json"
+
+
+def test_main_json_counts_source_once_and_survives_flush_errors(
+    tmp_path: Path,
+) -> None:
+    def broken_callback(_snapshot: Mapping[str, object]) -> None:
+        message = "collector unavailable"
+        raise RuntimeError(message)
+
+    source = "flowchart LR\nA-->B\n"
+    registry = enable_metrics(
+        MetricsRegistry(callback=broken_callback, flush_interval=0.0)
+    )
+    try:
+        result = main_json(
+            {
+                "command": "x_make_mermaid_x",
+                "parameters": {
+                    "output_mermaid": str(tmp_path / "out.mmd"),
+                    "source": source,
+                    "export_svg": True,
+                    "mermaid_cli_path": str(tmp_path / "missing-mmdc"),
+                },
+            }
+        )
+    finally:
+        disable_metrics()
+
+    assert result["status"] == "success"
+    assert registry.counter("renders_total") == 1
+    assert registry.counter("bytes_written_total", kind="mmd") == len(source)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import gzip
+import threading
+from pathlib import Path
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from x_make_common_x.exporters import ExportResult
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x.json_contracts import OUTPUT_SCHEMA
+from x_make_mermaid_x.precompress import (
+    PrecompressPool,
+    available_encodings,
+    shared_precompress_pool,
+    write_sidecars,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder, main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from concurrent.futures import Future
+
+    from _pytest.monkeypatch import MonkeyPatch
+
+SVG_TEXT = "<svg>" + "<g/>" * 200 + "</svg>"
+
+
+def _svg_runner(command: Sequence[str]) -> CompletedProcess[str]:
+    Path(command[command.index("-o") + 1]).write_text(SVG_TEXT, encoding="utf-8")
+    return CompletedProcess(list(command), 0, stdout="", stderr="")
+
+
+def test_write_sidecars_is_deterministic(tmp_path: Path) -> None:
+    source = tmp_path / "diagram.svg"
+    source.write_text(SVG_TEXT, encoding="utf-8")
+
+    first = write_sidecars(source, ["gzip"])
+    first_bytes = first[0].read_bytes()
+    second = write_sidecars(source, ["gzip"])
+
+    assert first == second == [tmp_path / "diagram.svg.gz"]
+    assert second[0].read_bytes() == first_bytes, "no timestamp in gzip header"
+    assert gzip.decompress(first_bytes).decode("utf-8") == SVG_TEXT
+
+
+@pytest.mark.skipif("br" in available_encodings(), reason="brotli is installed")
+def test_pool_rejects_brotli_without_module() -> None:
+    with pytest.raises(ValueError, match="unsupported precompression"):
+        PrecompressPool(encodings=["br"])
+
+
+def test_to_svg_queues_sidecars_in_background(tmp_path: Path) -> None:
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text("binary", encoding="utf-8")
+    builder = MermaidBuilder(runner=_svg_runner, mermaid_cli=str(fake_cli))
+    builder.flowchart().edge("A", "B")
+
+    with PrecompressPool(encodings=["gzip"]) as pool:
+        for name in ("one", "two"):
+            builder.to_svg(svg_path=str(tmp_path / f"{name}.svg"), precompress=pool)
+        pool.wait()
+
+    for name in ("one", "two"):
+        svg_gz = (tmp_path / f"{name}.svg.gz").read_bytes()
+        assert gzip.decompress(svg_gz).decode("utf-8") == SVG_TEXT
+        mmd_gz = (tmp_path / f"{name}.mmd.gz").read_bytes()
+        assert gzip.decompress(mmd_gz).decode("utf-8") == builder.source()
+
+
+def test_main_json_reports_precompressed_sidecars(tmp_path: Path) -> None:
+    output_mermaid = tmp_path / "diagram.mmd"
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(output_mermaid),
+            "source": "flowchart LR\n  A --> B\n",
+            "precompress": True,
+        },
+    }
+
+    result = main_json(payload)
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    mermaid = cast("dict[str, object]", result["mermaid"])
+    sidecars = cast("list[str]", mermaid["precompressed"])
+    assert str(output_mermaid) + ".gz" in sidecars
+    shared_precompress_pool().wait()
+    assert all(Path(path).exists() for path in sidecars)
+
+
+def test_main_json_compresses_rewritten_source_after_export(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    events: list[str] = []
+
+    def fake_export(
+        mermaid_source: str, *, output_dir: Path, stem: str, **_kwargs: object
+    ) -> ExportResult:
+        events.append("export")
+        # Like mmdc's exporter, rewrite the ``.mmd`` it renders from.
+        (output_dir / f"{stem}.mmd").write_text(mermaid_source, encoding="utf-8")
+        svg_target = output_dir / f"{stem}.svg"
+        svg_target.write_text(SVG_TEXT, encoding="utf-8")
+        return ExportResult(
+            exporter="mermaid-cli",
+            succeeded=True,
+            output_path=svg_target,
+            command=("mmdc",),
+            stdout="",
+            stderr="",
+        )
+
+    class RecordingPool(PrecompressPool):
+        def submit(self, path: str | Path) -> Future[list[Path]]:
+            events.append(Path(path).suffix)
+            return super().submit(path)
+
+    module = "x_make_mermaid_x.x_cls_make_mermaid_x"
+    monkeypatch.setattr(f"{module}.export_mermaid_to_svg", fake_export)
+    with RecordingPool(encodings=["gzip"]) as pool:
+        monkeypatch.setattr(f"{module}.shared_precompress_pool", lambda: pool)
+        result = main_json(
+            {
+                "command": "x_make_mermaid_x",
+                "parameters": {
+                    "output_mermaid": str(tmp_path / "diagram.mmd"),
+                    "source": "flowchart LR\n  A --> B\n",
+                    "export_svg": True,
+                    "precompress": True,
+                },
+            }
+        )
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    assert events == ["export", ".mmd", ".svg"]
+    mmd_gz = (tmp_path / "diagram.mmd.gz").read_bytes()
+    assert gzip.decompress(mmd_gz) == (tmp_path / "diagram.mmd").read_bytes()
+
+
+def test_main_json_returns_before_sidecars_are_written(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    release = threading.Event()
+
+    def held_sidecars(path: Path, encodings: Sequence[str]) -> list[Path]:
+        release.wait()
+        return write_sidecars(path, encodings)
+
+    monkeypatch.setattr("x_make_mermaid_x.precompress.write_sidecars", held_sidecars)
+    output_mermaid = tmp_path / "diagram.mmd"
+    with PrecompressPool(encodings=["gzip"]) as pool:
+        monkeypatch.setattr(
+            "x_make_mermaid_x.x_cls_make_mermaid_x.shared_precompress_pool",
+            lambda: pool,
+        )
+        result = main_json(
+            {
+                "command": "x_make_mermaid_x",
+                "parameters": {
+                    "output_mermaid": str(output_mermaid),
+                    "source": "flowchart LR\n  A --> B\n",
+                    "precompress": True,
+                },
+            }
+        )
+        mermaid = cast("dict[str, object]", result["mermaid"])
+        assert mermaid["precompressed"] == [str(output_mermaid) + ".gz"]
+        assert not Path(str(output_mermaid) + ".gz").exists()
+        release.set()
+        pool.wait()
+    assert (
+        gzip.decompress((tmp_path / "diagram.mmd.gz").read_bytes())
+        == output_mermaid.read_bytes()
+    )
@@ -0,0 +1,69 @@
+"""Tests for the render cost estimator."""
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from x_make_mermaid_x.render_cost import (
+    DocFeatures,
+    RenderCostModel,
+    RenderSample,
+    features_from_source,
+)
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+CHAIN_LENGTH = 500
+SECONDS_TOLERANCE = 0.05
+BYTES_TOLERANCE = 200
+
+
+def _features(nodes: int, edges: int, kind: str = "flowchart") -> DocFeatures:
+    return DocFeatures(
+        kind=kind, nodes=nodes, edges=edges, label_bytes=nodes * 8, subgraph_depth=0
+    )
+
+
+def test_estimate_grows_with_graph_size() -> None:
+    small = MermaidBuilder().flowchart().edge("A", "B").estimate_render_cost()
+    large_builder = MermaidBuilder().flowchart()
+    for index in range(CHAIN_LENGTH):
+        large_builder.edge(f"n{index}", f"n{index + 1}", "step")
+    large = large_builder.estimate_render_cost()
+
+    assert large.features.nodes == CHAIN_LENGTH + 1
+    assert large.seconds > small.seconds
+    assert large.svg_bytes > small.svg_bytes
+
+
+def test_calibrate_recovers_linear_costs(tmp_path: Path) -> None:
+    samples = [
+        RenderSample(
+            features=_features(n, 2 * n),
+            seconds=1.0 + 0.01 * n + 0.002 * (2 * n),
+            svg_bytes=5000 + 300 * n,
+        )
+        for n in (10, 50, 100, 400, 800, 1600)
+    ]
+
+    model = RenderCostModel.calibrate(samples)
+    estimate = model.estimate(_features(200, 400))
+
+    expected_seconds = 1.0 + 0.01 * 200 + 0.002 * 400
+    assert abs(estimate.seconds - expected_seconds) < SECONDS_TOLERANCE
+    assert abs(estimate.svg_bytes - (5000 + 300 * 200)) < BYTES_TOLERANCE
+    restored = RenderCostModel.load(model.save(tmp_path / "model.json"))
+    assert restored.estimate(_features(200, 400)) == estimate
+
+
+def test_features_from_source_counts_edges() -> None:
+    features = features_from_source("graph TB; A-->B; B-->C;\nsubgraph X\nC\nend\n")
+
+    expected_edges = 2
+    assert features.kind == "graph"
+    assert features.edges == expected_edges
+    assert features.subgraph_depth == 1
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import multiprocessing
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, OUTPUT_SCHEMA
+from x_make_mermaid_x.render_queue import SpoolQueue, SpoolWorker
+from x_make_mermaid_x.x_cls_make_mermaid_x import main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+WORKER_PROCESSES = 3
+JOB_COUNT = 12
+LEASE_SECONDS = 5.0
+
+
+def _payload(output: Path) -> dict[str, object]:
+    return {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(output),
+            "source": f"flowchart LR\n  {output.stem} --> done\n",
+        },
+    }
+
+
+def _worker_process(root: str, log_path: str) -> None:
+    def render(payload: Mapping[str, object]) -> Mapping[str, object]:
+        with Path(log_path).open("a", encoding="utf-8") as log:
+            log.write(f"{os.getpid()}\n")
+        return main_json(payload)
+
+    queue = SpoolQueue(root, lease_seconds=LEASE_SECONDS)
+    SpoolWorker(queue, render=render).run(idle_timeout=0.5, poll_interval=0.05)
+
+
+def test_worker_processes_drain_queue_exactly_once(tmp_path: Path) -> None:
+    queue = SpoolQueue(tmp_path / "spool", lease_seconds=LEASE_SECONDS)
+    job_ids = [
+        queue.submit(_payload(tmp_path / "out" / f"job{index}.mmd"))
+        for index in range(JOB_COUNT)
+    ]
+    log_path = tmp_path / "renders.log"
+    workers = [
+        multiprocessing.Process(
+            target=_worker_process, args=(str(queue.root), str(log_path))
+        )
+        for _ in range(WORKER_PROCESSES)
+    ]
+    for worker in workers:
+        worker.start()
+    results = queue.wait(job_ids, timeout=60, poll_interval=0.05)
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert set(results) == set(job_ids)
+    for result in results.values():
+        validate_payload(result, OUTPUT_SCHEMA)
+    assert len(log_path.read_text(encoding="utf-8").splitlines()) == JOB_COUNT
+    assert queue.counts() == {
+        "pending": 0,
+        "claimed": 0,
+        "results": JOB_COUNT,
+        "dead": 0,
+    }
+
+
+def test_expired_claims_are_requeued_then_abandoned(tmp_path: Path) -> None:
+    queue = SpoolQueue(tmp_path, lease_seconds=LEASE_SECONDS, max_attempts=2)
+    job_id = queue.submit(_payload(tmp_path / "slow.mmd"), job_id="slow")
+
+    first = queue.claim()
+    assert first is not None
+    assert queue.claim() is None, "a claimed job is invisible to other workers"
+    assert queue.requeue_expired() == [], "fresh claims are left alone"
+    stale = first.path.stat().st_mtime - LEASE_SECONDS * 2
+    os.utime(first.path, (stale, stale))
+    assert queue.requeue_expired() == [job_id]
+
+    second = queue.claim()
+    assert second is not None
+    assert second.attempt == first.attempt + 1
+    os.utime(second.path, (stale, stale))
+    assert queue.requeue_expired() == [], "out of attempts"
+
+    result = queue.result(job_id)
+    assert result is not None
+    validate_payload(result, ERROR_SCHEMA)
+    assert queue.counts()["dead"] == 1
+    assert SpoolWorker(queue).run_once() is None
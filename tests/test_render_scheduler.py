@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import threading
+from typing import TYPE_CHECKING, cast
+
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, OUTPUT_SCHEMA
+from x_make_mermaid_x.render_scheduler import (
+    RenderScheduler,
+    estimate_payload_seconds,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+    from pathlib import Path
+
+
+def _payload(name: str, *, edges: int = 1, export: bool = False) -> dict[str, object]:
+    body = "".join(f"  {name}{index} --> {name}{index + 1}\n" for index in range(edges))
+    parameters: dict[str, object] = {
+        "output_mermaid": f"{name}.mmd",
+        "source": f"flowchart LR\n{body}",
+    }
+    if export:
+        parameters["output_svg"] = f"{name}.svg"
+    return {"command": "x_make_mermaid_x", "parameters": parameters}
+
+
+class _RecordingRender:
+    """Blocks the first payload until released and records dispatch order."""
+
+    def __init__(self) -> None:
+        self.order: list[str] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, payload: Mapping[str, object]) -> Mapping[str, object]:
+        parameters = cast("Mapping[str, object]", payload["parameters"])
+        name = str(parameters["output_mermaid"]).removesuffix(".mmd")
+        if name == "blocker":
+            self.started.set()
+            self.release.wait(timeout=10)
+        else:
+            self.order.append(name)
+        return {"status": "success", "summary": {}}
+
+
+def _run_behind_blocker(
+    submissions: list[tuple[dict[str, object], str, str]],
+) -> list[str]:
+    render = _RecordingRender()
+    with RenderScheduler(max_concurrent_renders=1, render=render) as scheduler:
+        scheduler.submit(_payload("blocker"))
+        assert render.started.wait(timeout=10)
+        for payload, priority, tenant in submissions:
+            scheduler.submit(payload, priority=priority, tenant=tenant)
+        render.release.set()
+    return render.order
+
+
+def test_priority_classes_then_cheapest_first() -> None:
+    big = _payload("big", edges=400, export=True)
+    small = _payload("small", export=True)
+    assert estimate_payload_seconds(small) < estimate_payload_seconds(big)
+    assert estimate_payload_seconds(_payload("plain", edges=400)) == 0.0
+
+    order = _run_behind_blocker(
+        [
+            (_payload("nightly", export=True), "batch", "ops"),
+            (big, "normal", "web"),
+            (small, "normal", "web"),
+            (_payload("preview", export=True), "interactive", "web"),
+        ]
+    )
+
+    assert order == ["preview", "small", "big", "nightly"]
+
+
+def test_tenants_share_a_priority_class() -> None:
+    submissions = [(_payload(f"a{index}"), "batch", "a") for index in range(4)]
+    submissions += [(_payload(f"b{index}"), "batch", "b") for index in range(2)]
+
+    order = _run_behind_blocker(submissions)
+
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_result_summary_reports_queue_wait(tmp_path: Path) -> None:
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "diagram.mmd"),
+            "source": "flowchart LR\n  A --> B\n",
+        },
+    }
+
+    with RenderScheduler() as scheduler:
+        result = scheduler.run(payload, priority="interactive", tenant="docs")
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    summary = cast("dict[str, object]", result["summary"])
+    queue = cast("dict[str, object]", summary["queue"])
+    assert queue["priority"] == "interactive"
+    assert queue["tenant"] == "docs"
+    assert cast("float", queue["wait_seconds"]) >= 0
+
+
+def test_failure_details_report_queue_wait(tmp_path: Path) -> None:
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "diagram.mmd"),
+            "source": "flowchart LR\n  A --> B\n",
+            "budget": {"max_seconds": 0.001},
+        },
+    }
+
+    with RenderScheduler() as scheduler:
+        result = scheduler.run(payload, priority="batch", tenant="ops")
+
+    validate_payload(result, ERROR_SCHEMA)
+    assert result["message"] == "document exceeds render budget"
+    details = cast("dict[str, object]", result["details"])
+    assert "limits" in details, "existing details are kept"
+    queue = cast("dict[str, object]", details["queue"])
+    assert queue["priority"] == "batch"
+    assert queue["tenant"] == "ops"
+    assert cast("float", queue["wait_seconds"]) >= 0
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+import os
+from typing import TYPE_CHECKING, cast
+
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x import x_cls_make_mermaid_x as mermaid_module
+from x_make_mermaid_x.json_contracts import OUTPUT_SCHEMA
+from x_make_mermaid_x.result_memo import ResultMemo, payload_key
+from x_make_mermaid_x.x_cls_make_mermaid_x import (
+    configure_result_memo,
+    get_result_memo,
+    main_json,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+def _payload(output: Path, **extra: object) -> dict[str, object]:
+    return {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(output),
+            "document": {
+                "diagram": "flowchart",
+                "nodes": [{"id": "A", "label": "Start"}],
+                "edges": [{"source": "A", "target": "B"}],
+            },
+            **extra,
+        },
+    }
+
+
+def _count_builds(monkeypatch: MonkeyPatch) -> list[str]:
+    builds: list[str] = []
+    write = mermaid_module._write_mermaid_source  # noqa: SLF001 - spy on writes
+
+    def spy(path: Path, source: str) -> tuple[str, int, str]:
+        builds.append(str(path))
+        return write(path, source)
+
+    monkeypatch.setattr(mermaid_module, "_write_mermaid_source", spy)
+    return builds
+
+
+def test_main_json_serves_repeats_from_memo(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    builds = _count_builds(monkeypatch)
+    memo = ResultMemo(tmp_path / "memo")
+    output = tmp_path / "out" / "diagram.mmd"
+
+    first = main_json(_payload(output), memo=memo)
+    second = main_json(_payload(output), memo=memo)
+
+    assert len(builds) == 1, "the repeat is not rebuilt or rewritten"
+    validate_payload(second, OUTPUT_SCHEMA)
+    summary = cast("dict[str, object]", second["summary"])
+    assert summary.pop("memoized") is True
+    assert second == first
+
+    shared = ResultMemo(tmp_path / "memo", max_entries=0)
+    assert main_json(_payload(output), memo=shared)["summary"] == summary | {
+        "memoized": True
+    }, "the disk tier is shared between memo instances"
+    assert len(builds) == 1
+
+    output.unlink()
+    main_json(_payload(output), memo=memo)
+    expected_builds = 2
+    assert len(builds) == expected_builds, "removed artifacts are rebuilt"
+    main_json(_payload(output, precompress=True), memo=memo)
+    assert len(builds) == expected_builds + 1, "parameters are part of the key"
+
+
+def test_failed_exports_are_not_memoized(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    builds = _count_builds(monkeypatch)
+    memo = ResultMemo()
+    payload = _payload(
+        tmp_path / "diagram.mmd",
+        export_svg=True,
+        mermaid_cli_path=str(tmp_path / "missing-mmdc"),
+    )
+
+    for _ in range(2):
+        main_json(payload, memo=memo)
+
+    expected_builds = 2
+    assert len(builds) == expected_builds
+    assert len(memo) == 0
+
+
+def test_memo_tiers_evict_least_recently_used(tmp_path: Path) -> None:
+    artifact = tmp_path / "artifact.txt"
+    artifact.write_text("x", encoding="utf-8")
+    memo = ResultMemo(tmp_path / "memo", max_entries=1, max_disk_entries=2)
+
+    for index, key in enumerate(("a", "b", "c")):
+        assert memo.put(key, {"n": index}, [str(artifact)])
+        entry = tmp_path / "memo" / f"{key}.json"
+        os.utime(entry, ns=(index, index))
+        if key == "b":
+            assert memo.get("a") == {"n": 0}, "a hit refreshes the disk entry"
+
+    assert len(memo) == 1
+    assert sorted(p.name for p in (tmp_path / "memo").iterdir()) == [
+        "a.json",
+        "c.json",
+    ]
+    assert memo.get("b") is None
+    assert not memo.put("d", {}, [str(tmp_path / "missing")])
+
+
+def test_payload_key_is_canonical() -> None:
+    params: dict[str, object] = {"source": "flowchart LR", "export_svg": False}
+    reordered = dict(reversed(params.items()))
+
+    key = payload_key(params, schema_version="1", cli_version=None)
+
+    assert key == payload_key(reordered, schema_version="1", cli_version=None)
+    assert key != payload_key(params, schema_version="1", cli_version="11.4.0")
+
+
+def test_configure_result_memo_sets_process_default(tmp_path: Path) -> None:
+    original = get_result_memo()
+    memo = ResultMemo()
+    try:
+        assert configure_result_memo(memo) is memo
+        main_json(_payload(tmp_path / "diagram.mmd"))
+        assert len(memo) == 1
+    finally:
+        configure_result_memo(original)
+    assert get_result_memo() is original
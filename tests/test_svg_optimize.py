@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+from pathlib import Path
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING, cast
+
+from x_make_common_x.exporters import ExportResult
+from x_make_common_x.json_contracts import validate_payload
+from x_make_mermaid_x.json_contracts import OUTPUT_SCHEMA
+from x_make_mermaid_x.svg_optimize import SvgOptimizer, optimize_svg
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder, main_json
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from _pytest.monkeypatch import MonkeyPatch
+
+MMDC_SVG = """<svg id="m1" xmlns="http://www.w3.org/2000/svg" viewBox="-8 -8 120.123456 40.5">
+  <!-- rendered by mermaid -->
+  <style>
+    #m1 .node rect { fill: #eee; stroke: #333; }
+    #m1 .edge { stroke-width: 2px; }
+    #m1 .node rect { fill: #eee; stroke: #333; }
+  </style>
+  <defs>
+    <marker id="m1_pointEnd" viewBox="0 0 10 10"><path d="M 0 0 L 10 5 z"/></marker>
+    <marker id="m1_circleEnd"><circle cx="5.000001" cy="5" r="5"/></marker>
+  </defs>
+  <g class="edge">
+    <path d="M10.123456,20.987654L100.000001,20.5" marker-end="url(#m1_pointEnd)"/>
+  </g>
+  <foreignObject width="42.654321" height="24"><div>
+    <span>two  spaces</span></div></foreignObject>
+</svg>
+"""
+
+
+def _svg_runner(command: Sequence[str]) -> CompletedProcess[str]:
+    Path(command[command.index("-o") + 1]).write_text(MMDC_SVG, encoding="utf-8")
+    return CompletedProcess(list(command), 0, stdout="", stderr="")
+
+
+def test_optimize_svg_applies_every_stage() -> None:
+    optimized = optimize_svg(MMDC_SVG)
+
+    assert "<!--" not in optimized
+    assert optimized.count("#m1 .node rect{fill:#eee;stroke:#333}") == 1
+    assert 'viewBox="-8 -8 120.12 40.5"' in optimized
+    assert 'd="M10.12,20.99L100,20.5"' in optimized
+    assert "m1_circleEnd" not in optimized, "unreferenced marker is dropped"
+    assert "m1_pointEnd" in optimized
+    assert "<span>two  spaces</span></div>" in optimized, "label text untouched"
+    assert "\n  <g" not in optimized
+
+
+def test_optimizer_keeps_numbers_separated_and_respects_options() -> None:
+    assert optimize_svg('<path d="M1.2.7 0.6"/>', precision=0) == '<path d="M1 1 1"/>'
+    assert optimize_svg('<path d="M0.25,-0.5"/>') == '<path d="M.25,-.5"/>'
+
+    untouched = SvgOptimizer(precision=None, strip_unused_defs=False)
+    optimized = untouched.optimize(MMDC_SVG)
+    assert "120.123456" in optimized
+    assert "m1_circleEnd" in optimized
+
+
+def test_to_svg_optimizes_written_file(tmp_path: Path) -> None:
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text("binary", encoding="utf-8")
+    builder = MermaidBuilder(runner=_svg_runner, mermaid_cli=str(fake_cli))
+    builder.flowchart().edge("A", "B")
+    svg_path = tmp_path / "diagram.svg"
+
+    result = builder.to_svg(svg_path=str(svg_path), optimizer=SvgOptimizer())
+
+    assert result == str(svg_path)
+    stats = builder.get_last_svg_optimization()
+    assert stats is not None
+    assert stats.bytes_before == len(MMDC_SVG.encode("utf-8"))
+    assert stats.bytes_after == svg_path.stat().st_size < stats.bytes_before
+
+
+def test_main_json_reports_svg_optimization(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    def fake_export(
+        mermaid_source: str, *, output_dir: Path, stem: str, **_kwargs: object
+    ) -> ExportResult:
+        del mermaid_source
+        svg_target = output_dir / f"{stem}.svg"
+        svg_target.write_text(MMDC_SVG, encoding="utf-8")
+        return ExportResult(
+            exporter="mermaid-cli",
+            succeeded=True,
+            output_path=svg_target,
+            command=("mmdc",),
+            stdout="",
+            stderr="",
+        )
+
+    monkeypatch.setattr(
+        "x_make_mermaid_x.x_cls_make_mermaid_x.export_mermaid_to_svg", fake_export
+    )
+    svg_path = tmp_path / "out.svg"
+    payload: dict[str, object] = {
+        "command": "x_make_mermaid_x",
+        "parameters": {
+            "output_mermaid": str(tmp_path / "out.mmd"),
+            "output_svg": str(svg_path),
+            "source": "flowchart LR\n  A --> B\n",
+            "optimize_svg": {"precision": 1},
+        },
+    }
+
+    result = main_json(payload)
+
+    validate_payload(result, OUTPUT_SCHEMA)
+    mermaid = cast("dict[str, object]", result["mermaid"])
+    svg = cast("dict[str, object]", mermaid["svg"])
+    optimization = cast("dict[str, int]", svg["optimization"])
+    assert optimization["precision"] == 1
+    assert optimization["bytes_after"] == svg_path.stat().st_size
+    assert optimization["bytes_after"] < optimization["bytes_before"]
@@ -0,0 +1,70 @@
+"""Tests for the multi-document Mermaid workspace."""
+
+# ruff: noqa: S101 - tests rely on assert statements for clarity
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING
+
+from x_make_mermaid_x.workspace import MermaidWorkspace
+from x_make_mermaid_x.x_cls_make_mermaid_x import MermaidBuilder
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from x_make_common_x.exporters import CommandRunner
+
+
+def _markdown_runner(calls: list[Sequence[str]]) -> CommandRunner:
+    def runner(command: Sequence[str]) -> CompletedProcess[str]:
+        calls.append(command)
+        source = Path(command[command.index("-i") + 1])
+        output = Path(command[command.index("-o") + 1])
+        blocks = re.findall(
+            r"```mermaid\n(.*?)```", source.read_text("utf-8"), re.DOTALL
+        )
+        for index, block in enumerate(blocks, start=1):
+            svg = output.with_name(f"{output.stem}-{index}.svg")
+            svg.write_text(f"<svg>{block.splitlines()[0]}</svg>", encoding="utf-8")
+        return CompletedProcess(list(command), 0, stdout="", stderr="")
+
+    return runner
+
+
+def test_workspace_exports_all_diagrams_in_one_run(tmp_path: Path) -> None:
+    fake_cli = tmp_path / "mmdc"
+    fake_cli.write_text("binary", encoding="utf-8")
+    calls: list[Sequence[str]] = []
+    workspace = MermaidWorkspace(
+        runner=_markdown_runner(calls),
+        mermaid_cli=str(fake_cli),
+    )
+    workspace.builder("deploy flow").flowchart("LR").edge("A", "B")
+    workspace.add("calls", MermaidBuilder().sequence().message("A", "B", "hi"))
+    workspace.add("states", MermaidBuilder().state().state_start("Idle").doc)
+
+    results = workspace.export(tmp_path / "out")
+
+    assert len(calls) == 1, "all diagrams share a single mmdc invocation"
+    assert set(results) == {"deploy flow", "calls", "states"}
+    deploy = results["deploy flow"]
+    assert deploy.succeeded
+    assert deploy.output_path == tmp_path / "out" / "deploy_flow.svg"
+    assert "flowchart LR" in deploy.output_path.read_text(encoding="utf-8")
+    calls_svg = results["calls"].output_path
+    assert calls_svg is not None
+    assert "sequenceDiagram" in calls_svg.read_text(encoding="utf-8")
+
+
+def test_workspace_save_writes_unique_stems(tmp_path: Path) -> None:
+    workspace = MermaidWorkspace()
+    workspace.builder("a/b").flowchart().node("A")
+    workspace.builder("a:b").flowchart().node("B")
+
+    written = workspace.save(tmp_path)
+
+    assert [path.name for path in written.values()] == ["a_b.mmd", "a_b_2.mmd"]
+    assert written["a:b"].read_text(encoding="utf-8").endswith("B\n")
@@ -0,0 +1,256 @@
+"""Multi-document Mermaid workspace.
+
+Holds many named diagrams, saves them in one pass and renders them with a
+single mmdc invocation over a generated Markdown file.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from x_make_common_x.exporters import CommandRunner, ExportResult
+from x_make_mermaid_x.x_cls_make_mermaid_x import (
+    CommandTimeoutError,
+    Deadline,
+    MermaidBuilder,
+    MermaidDoc,
+    deadline_runner,
+    get_cli_cache,
+    run_command,
+)
+
+if TYPE_CHECKING:
+    import subprocess
+    from collections.abc import Iterator, Mapping, Sequence
+
+_UNSAFE_STEM = re.compile(r"[^A-Za-z0-9_.-]+")
+_BATCH_STEM = "workspace"
+
+
+def _safe_stem(name: str, taken: set[str]) -> str:
+    base = _UNSAFE_STEM.sub("_", name).strip("._") or "diagram"
+    stem = base
+    suffix = 1
+    while stem.lower() in taken:
+        suffix += 1
+        stem = f"{base}_{suffix}"
+    taken.add(stem.lower())
+    return stem
+
+
+class MermaidWorkspace:
+    """Named collection of diagrams rendered together.
+
+    Typical usage:
+      ws = MermaidWorkspace()
+      ws.builder("deploy").flowchart("LR").edge("A", "B")
+      ws.add("calls", other_builder)
+      results = ws.export("reports/diagrams")
+    """
+
+    def __init__(
+        self,
+        *,
+        runner: CommandRunner | None = None,
+        mermaid_cli: str | None = None,
+    ) -> None:
+        self._builders: dict[str, MermaidBuilder] = {}
+        self._runner = runner
+        self._mermaid_cli = mermaid_cli
+
+    def builder(self, name: str) -> MermaidBuilder:
+        """Return the builder registered as ``name``, creating it if needed."""
+        existing = self._builders.get(name)
+        if existing is None:
+            existing = MermaidBuilder(
+                runner=self._runner, mermaid_cli=self._mermaid_cli
+            )
+            self._builders[name] = existing
+        return existing
+
+    def add(self, name: str, diagram: MermaidBuilder | MermaidDoc) -> MermaidBuilder:
+        builder = (
+            diagram
+            if isinstance(diagram, MermaidBuilder)
+            else MermaidBuilder.from_doc(
+                diagram, runner=self._runner, mermaid_cli=self._mermaid_cli
+            )
+        )
+        self._builders[name] = builder
+        return builder
+
+    def remove(self, name: str) -> None:
+        del self._builders[name]
+
+    def __len__(self) -> int:
+        return len(self._builders)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._builders)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._builders
+
+    def __getitem__(self, name: str) -> MermaidDoc:
+        return self._builders[name].doc
+
+    @property
+    def docs(self) -> Mapping[str, MermaidDoc]:
+        return {name: builder.doc for name, builder in self._builders.items()}
+
+    def stems(self) -> dict[str, str]:
+        """Filesystem-safe, case-insensitively unique file stem per name."""
+        taken: set[str] = set()
+        return {name: _safe_stem(name, taken) for name in self._builders}
+
+    def sources(self) -> dict[str, str]:
+        return {name: builder.source() for name, builder in self._builders.items()}
+
+    def save(self, directory: str | Path) -> dict[str, Path]:
+        """Write every diagram as ``<stem>.mmd`` under ``directory``."""
+        target = Path(directory)
+        target.mkdir(parents=True, exist_ok=True)
+        stems = self.stems()
+        written: dict[str, Path] = {}
+        for name, source in self.sources().items():
+            path = target / f"{stems[name]}.mmd"
+            path.write_text(source, encoding="utf-8")
+            written[name] = path
+        return written
+
+    def to_markdown(self) -> str:
+        blocks = [
+            f"## {name}\n\n```mermaid\n{source}```\n"
+            for name, source in self.sources().items()
+        ]
+        return "\n".join(blocks)
+
+    def export(
+        self,
+        directory: str | Path,
+        *,
+        timeout: float | Deadline | None = None,
+        extra_args: Sequence[str] | None = None,
+        fallback_individual: bool = True,
+    ) -> dict[str, ExportResult]:
+        """Render all diagrams with one mmdc run over a generated Markdown file.
+
+        mmdc writes one ``<batch>-<n>.svg`` per Mermaid block; each is renamed
+        to its diagram's stem. When the batch run fails and
+        ``fallback_individual`` is set, diagrams are exported one by one.
+        """
+        target = Path(directory)
+        sources = self.save(target)
+        if not sources:
+            return {}
+        deadline = (
+            Deadline.after(timeout) if isinstance(timeout, (int, float)) else timeout
+        )
+        results = self._export_batch(target, sources, deadline, extra_args)
+        if fallback_individual and not any(r.succeeded for r in results.values()):
+            return self._export_individually(target, deadline, extra_args)
+        return results
+
+    def _export_batch(
+        self,
+        target: Path,
+        sources: Mapping[str, Path],
+        deadline: Deadline | None,
+        extra_args: Sequence[str] | None,
+    ) -> dict[str, ExportResult]:
+        markdown_path = target / f"{_BATCH_STEM}.md"
+        markdown_path.write_text(self.to_markdown(), encoding="utf-8")
+        rendered_md = target / f"{_BATCH_STEM}.rendered.md"
+        info = get_cli_cache().resolve(self._mermaid_cli)
+        if info is None:
+            return self._failed(sources, markdown_path, (), "Mermaid CLI not found")
+        command = (
+            str(info.path),
+            "-i",
+            str(markdown_path),
+            "-o",
+            str(rendered_md),
+            *(extra_args or ()),
+        )
+        runner = self._runner
+        if runner is None:
+            runner = deadline_runner(deadline) if deadline is not None else _run
+        try:
+            completed = runner(command)
+        except CommandTimeoutError as exc:
+            detail = f"Mermaid CLI timed out after {exc.timeout:g}s"
+            return self._failed(sources, markdown_path, command, detail)
+        except OSError as exc:
+            return self._failed(sources, markdown_path, command, str(exc))
+
+        stems = self.stems()
+        results: dict[str, ExportResult] = {}
+        for index, (name, mmd_path) in enumerate(sources.items(), start=1):
+            produced = target / f"{rendered_md.stem}-{index}.svg"
+            svg_path = target / f"{stems[name]}.svg"
+            succeeded = completed.returncode == 0 and produced.exists()
+            if succeeded:
+                produced.replace(svg_path)
+            results[name] = ExportResult(
+                exporter="mermaid-cli",
+                succeeded=succeeded,
+                output_path=svg_path if succeeded else None,
+                command=command,
+                stdout=completed.stdout or "",
+                stderr=completed.stderr or "",
+                inputs={"mermaid": mmd_path, "markdown": markdown_path},
+                binary_path=info.path,
+                detail=(
+                    None
+                    if succeeded
+                    else f"batch render produced no SVG for block {index}"
+                ),
+            )
+        return results
+
+    def _export_individually(
+        self,
+        target: Path,
+        deadline: Deadline | None,
+        extra_args: Sequence[str] | None,
+    ) -> dict[str, ExportResult]:
+        stems = self.stems()
+        results: dict[str, ExportResult] = {}
+        for name, builder in self._builders.items():
+            results[name] = builder.export_svg(
+                svg_path=str(target / f"{stems[name]}.svg"),
+                extra_args=list(extra_args) if extra_args else None,
+                timeout=deadline,
+            )
+        return results
+
+    @staticmethod
+    def _failed(
+        sources: Mapping[str, Path],
+        markdown_path: Path,
+        command: tuple[str, ...],
+        detail: str,
+    ) -> dict[str, ExportResult]:
+        return {
+            name: ExportResult(
+                exporter="mermaid-cli",
+                succeeded=False,
+                output_path=None,
+                command=command,
+                stdout="",
+                stderr="",
+                inputs={"mermaid": mmd_path, "markdown": markdown_path},
+                binary_path=None,
+                detail=detail,
+            )
+            for name, mmd_path in sources.items()
+        }
+
+
+def _run(command: Sequence[str]) -> subprocess.CompletedProcess[str]:
+    return run_command(command, check=False)
+
+
+__all__ = ["MermaidWorkspace"]
@@ -7,19 +7,31 @@ Output is a plain string suitable for Markdown or Mermaid CLI.
 from __future__ import annotations
 
 import argparse
+import hashlib
 import importlib
+import itertools
 import json
 import logging
+import marshal
+import os
+import re
+import shutil
+import signal
 import subprocess
 import sys as _sys
-from collections.abc import Callable, Iterable, Mapping, Sequence
+import tempfile
+import threading
+import time
+import zlib
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
 from collections.abc import Iterable as _Iterable
-from contextlib import suppress
-from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager, nullcontext, suppress
+from dataclasses import dataclass, field, replace
 from datetime import UTC, datetime
 from pathlib import Path
 from types import MappingProxyType
-from typing import IO, Protocol, Self, cast
+from typing import IO, Protocol, Required, Self, TypedDict, cast
 
 from x_make_common_x.exporters import (
     CommandRunner,
@@ -28,6 +40,31 @@ from x_make_common_x.exporters import (
 )
 from x_make_common_x.json_contracts import validate_payload
 from x_make_mermaid_x.json_contracts import ERROR_SCHEMA, INPUT_SCHEMA, OUTPUT_SCHEMA
+from x_make_mermaid_x.json_contracts.codegen import (
+    DOCUMENT_ITEM_SCHEMAS,
+    DOCUMENT_ITEM_VALIDATORS,
+    is_valid_error,
+    is_valid_input,
+    is_valid_input_shell,
+    is_valid_output,
+)
+from x_make_mermaid_x.json_stream import DEFAULT_CHUNK_SIZE, JsonStreamReader
+from x_make_mermaid_x.metrics import active_metrics, flush_metrics, timed
+from x_make_mermaid_x.precompress import PrecompressPool, shared_precompress_pool
+from x_make_mermaid_x.svg_optimize import (
+    DEFAULT_PRECISION,
+    SvgOptimization,
+    SvgOptimizer,
+)
+from x_make_mermaid_x.render_cost import (
+    DEFAULT_COST_MODEL,
+    RenderCostModel,
+    RenderEstimate,
+    RenderSample,
+    extract_features,
+    features_from_source,
+)
+from x_make_mermaid_x.result_memo import ResultMemo, payload_key
 
 
 class CommandError(RuntimeError):
@@ -50,18 +87,120 @@ class CommandError(RuntimeError):
         self.stderr = stderr
 
 
+class CommandTimeoutError(CommandError):
+    def __init__(
+        self,
+        argv: tuple[str, ...],
+        timeout: float,
+        stdout: str,
+        stderr: str,
+    ) -> None:
+        super().__init__(
+            argv,
+            _TIMEOUT_RETURN_CODE,
+            stdout,
+            stderr or f"timed out after {timeout:g}s",
+        )
+        self.timeout = timeout
+
+
+# Mirrors coreutils ``timeout`` so logs read the same either way.
+_TIMEOUT_RETURN_CODE = 124
+_KILL_GRACE_SECONDS = 2.0
+# Process-group signalling is POSIX-only; Windows falls back to taskkill /T.
+_KILLPG: Callable[[int, int], None] | None = getattr(os, "killpg", None)
+_SIGKILL: int = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """An absolute point on the monotonic clock shared by related exports."""
+
+    expires_at: float
+    seconds: float
+
+    @classmethod
+    def after(cls, seconds: float) -> Deadline:
+        return cls(expires_at=time.monotonic() + seconds, seconds=seconds)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+def _terminate_process_tree(process: subprocess.Popen[str]) -> None:
+    """Stop ``process`` and every child it spawned (e.g. headless Chromium)."""
+    if process.poll() is not None:
+        return
+    if _KILLPG is None:
+        with suppress(OSError):
+            subprocess.run(  # noqa: S603
+                ["taskkill", "/T", "/F", "/PID", str(process.pid)],  # noqa: S607
+                capture_output=True,
+                check=False,
+            )
+    else:
+        with suppress(ProcessLookupError, PermissionError):
+            _KILLPG(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=_KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            with suppress(ProcessLookupError, PermissionError):
+                _KILLPG(process.pid, _SIGKILL)
+    with suppress(subprocess.TimeoutExpired):
+        process.wait(timeout=_KILL_GRACE_SECONDS)
+
+
+def _run_with_timeout(
+    argv: tuple[str, ...], timeout: float
+) -> subprocess.CompletedProcess[str]:
+    if timeout <= 0:
+        raise CommandTimeoutError(argv, timeout, "", "deadline expired before start")
+    # A fresh session/process group lets a timeout take down the whole tree.
+    process = subprocess.Popen(  # noqa: S603
+        list(argv),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=_KILLPG is not None,
+        creationflags=getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0),
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _terminate_process_tree(process)
+        stdout, stderr = "", ""
+        with suppress(subprocess.TimeoutExpired, ValueError):
+            stdout, stderr = process.communicate(timeout=_KILL_GRACE_SECONDS)
+        raise CommandTimeoutError(argv, timeout, stdout or "", stderr or "") from None
+    return subprocess.CompletedProcess(list(argv), process.returncode, stdout, stderr)
+
+
 def run_command(
     args: _Iterable[str],
     *,
     check: bool = True,
+    timeout: float | None = None,
 ) -> subprocess.CompletedProcess[str]:
+    """Run ``args`` capturing text output.
+
+    With ``timeout`` the command runs in its own process group, which is
+    terminated (then killed) on expiry and reported as ``CommandTimeoutError``
+    regardless of ``check``.
+    """
     argv = tuple(args)
-    completed = subprocess.run(  # noqa: S603
-        list(argv),
-        capture_output=True,
-        text=True,
-        check=False,
-    )
+    if timeout is not None:
+        completed = _run_with_timeout(argv, timeout)
+    else:
+        completed = subprocess.run(  # noqa: S603
+            list(argv),
+            capture_output=True,
+            text=True,
+            check=False,
+        )
     if check and completed.returncode != 0:
         raise CommandError(
             argv,
@@ -72,6 +211,227 @@ def run_command(
     return completed
 
 
+def deadline_runner(deadline: Deadline) -> CommandRunner:
+    """Return a ``CommandRunner`` that enforces ``deadline`` on each command."""
+
+    def _runner(command: Sequence[str]) -> subprocess.CompletedProcess[str]:
+        return run_command(command, check=False, timeout=deadline.remaining())
+
+    return _runner
+
+
+# mmdc resolution cache
+
+_CLI_VERSION_TIMEOUT_SECONDS = 30.0
+_CLI_CACHE_ENV = "X_MAKE_MERMAID_CLI_CACHE"
+_RESULT_MEMO_ENV = "X_MAKE_MERMAID_RESULT_MEMO"
+_MMDC_ENV = "MMDC"
+_MMDC_NAMES: tuple[str, ...] = ("mmdc", "mmdc.cmd")
+
+
+@dataclass(frozen=True)
+class MermaidCliInfo:
+    """A resolved mmdc binary, valid while its mtime is unchanged."""
+
+    path: Path
+    mtime_ns: int
+    version: str | None = None
+
+    @classmethod
+    def probe(cls, path: Path) -> MermaidCliInfo | None:
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            return None
+        return cls(path=path, mtime_ns=mtime_ns)
+
+    def is_current(self) -> bool:
+        try:
+            return self.path.stat().st_mtime_ns == self.mtime_ns
+        except OSError:
+            return False
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "path": str(self.path),
+            "mtime_ns": self.mtime_ns,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_json(cls, payload: Mapping[str, object]) -> MermaidCliInfo | None:
+        path_obj = payload.get("path")
+        mtime_obj = payload.get("mtime_ns")
+        version_obj = payload.get("version")
+        if not isinstance(path_obj, str) or not isinstance(mtime_obj, int):
+            return None
+        return cls(
+            path=Path(path_obj),
+            mtime_ns=mtime_obj,
+            version=version_obj if isinstance(version_obj, str) else None,
+        )
+
+
+class MermaidCliCache:
+    """Process-wide cache of resolved mmdc binaries and their versions.
+
+    Entries are keyed by the requested CLI path (or the ``MMDC`` environment
+    value when none was requested) and dropped once the binary's mtime moves.
+    With ``cache_file`` the entries are also persisted as JSON across runs.
+    """
+
+    def __init__(self, cache_file: Path | None = None) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[str, MermaidCliInfo] = {}
+        self._cache_file = cache_file
+        self._disk_loaded = cache_file is None
+
+    @staticmethod
+    def key(requested: str | None) -> str:
+        return requested or f"env:{os.environ.get(_MMDC_ENV, '')}"
+
+    def lookup(self, requested: str | None) -> MermaidCliInfo | None:
+        key = self.key(requested)
+        with self._lock:
+            self._load_disk()
+            info = self._entries.get(key)
+            if info is not None and not info.is_current():
+                del self._entries[key]
+                self._save_disk()
+                info = None
+        metrics = active_metrics()
+        if metrics is not None:
+            metrics.inc("cli_cache_hits_total" if info else "cli_cache_misses_total")
+        return info
+
+    def remember(self, requested: str | None, binary: Path) -> MermaidCliInfo | None:
+        info = MermaidCliInfo.probe(binary)
+        if info is None:
+            return None
+        with self._lock:
+            self._entries[self.key(requested)] = info
+            self._save_disk()
+        return info
+
+    def resolve(self, requested: str | None) -> MermaidCliInfo | None:
+        """Return the cached binary, searching explicit path, env and PATH once."""
+        cached = self.lookup(requested)
+        if cached is not None:
+            return cached
+        candidate: str | None = requested or os.environ.get(_MMDC_ENV)
+        if not candidate:
+            candidate = next(
+                (found for name in _MMDC_NAMES if (found := shutil.which(name))), None
+            )
+        return self.remember(requested, Path(candidate)) if candidate else None
+
+    def version(self, requested: str | None) -> str | None:
+        info = self.resolve(requested)
+        if info is None:
+            return None
+        if info.version is not None:
+            return info.version
+        try:
+            completed = run_command(
+                [str(info.path), "--version"],
+                check=False,
+                timeout=_CLI_VERSION_TIMEOUT_SECONDS,
+            )
+        except (OSError, CommandError):
+            return None
+        version = completed.stdout.strip() or None
+        if completed.returncode != 0 or version is None:
+            return None
+        with self._lock:
+            self._entries[self.key(requested)] = replace(info, version=version)
+            self._save_disk()
+        return version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._disk_loaded = self._cache_file is None
+            if self._cache_file is not None:
+                with suppress(OSError):
+                    self._cache_file.unlink()
+
+    def _load_disk(self) -> None:
+        if self._disk_loaded or self._cache_file is None:
+            return
+        self._disk_loaded = True
+        try:
+            payload_obj = cast(
+                "object", json.loads(self._cache_file.read_text(encoding="utf-8"))
+            )
+        except (OSError, ValueError):
+            return
+        if not isinstance(payload_obj, Mapping):
+            return
+        entries_obj = cast("Mapping[str, object]", payload_obj).get("entries")
+        if not isinstance(entries_obj, Mapping):
+            return
+        for key, value in cast("Mapping[str, object]", entries_obj).items():
+            if isinstance(value, Mapping):
+                info = MermaidCliInfo.from_json(cast("Mapping[str, object]", value))
+                if info is not None:
+                    self._entries.setdefault(key, info)
+
+    def _save_disk(self) -> None:
+        if self._cache_file is None:
+            return
+        payload = {
+            "entries": {key: info.to_json() for key, info in self._entries.items()}
+        }
+        with suppress(OSError):
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            staging = self._cache_file.with_suffix(f".{os.getpid()}.tmp")
+            staging.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+            staging.replace(self._cache_file)
+
+
+def _default_cli_cache() -> MermaidCliCache:
+    cache_file = os.environ.get(_CLI_CACHE_ENV)
+    return MermaidCliCache(Path(cache_file) if cache_file else None)
+
+
+_CLI_CACHE = _default_cli_cache()
+
+
+def get_cli_cache() -> MermaidCliCache:
+    return _CLI_CACHE
+
+
+def configure_cli_cache(cache_file: str | Path | None) -> MermaidCliCache:
+    """Replace the process-wide cache, optionally persisting it to ``cache_file``."""
+    global _CLI_CACHE  # noqa: PLW0603 - process-wide cache by design
+    _CLI_CACHE = MermaidCliCache(Path(cache_file) if cache_file else None)
+    return _CLI_CACHE
+
+
+def mermaid_cli_version(mermaid_cli_path: str | None = None) -> str | None:
+    """Cached ``mmdc --version`` output for the resolved binary."""
+    return _CLI_CACHE.version(mermaid_cli_path)
+
+
+def _default_result_memo() -> ResultMemo | None:
+    directory = os.environ.get(_RESULT_MEMO_ENV)
+    return ResultMemo(directory) if directory else None
+
+
+_RESULT_MEMO = _default_result_memo()
+
+
+def get_result_memo() -> ResultMemo | None:
+    return _RESULT_MEMO
+
+
+def configure_result_memo(memo: ResultMemo | None) -> ResultMemo | None:
+    """Set the memo ``main_json`` uses by default; ``None`` turns it off."""
+    global _RESULT_MEMO  # noqa: PLW0603 - process-wide memo by design
+    _RESULT_MEMO = memo
+    return _RESULT_MEMO
+
+
 _LOGGER = logging.getLogger("x_make")
 
 
@@ -95,17 +455,22 @@ ValidationErrorType: type[_SchemaValidationError] = _load_validation_error()
 _EMPTY_MAPPING: Mapping[str, object] = MappingProxyType(cast("dict[str, object]", {}))
 
 
+_INFO_LOCK = threading.Lock()
+
+
 def _info(*args: object) -> None:
     msg = " ".join(str(a) for a in args)
-    with suppress(Exception):
-        _LOGGER.info("%s", msg)
-    printed = False
-    with suppress(Exception):
-        print(msg)
-        printed = True
-    if not printed:
+    # Export threads share stdout; keep each message on its own line.
+    with _INFO_LOCK:
         with suppress(Exception):
-            _sys.stdout.write(msg + "\n")
+            _LOGGER.info("%s", msg)
+        printed = False
+        with suppress(Exception):
+            print(msg)
+            printed = True
+        if not printed:
+            with suppress(Exception):
+                _sys.stdout.write(msg + "\n")
 
 
 SCHEMA_VERSION = "x_make_mermaid_x.run/1.0"
@@ -130,8 +495,9 @@ def _failure_payload(
     }
     if details:
         payload["details"] = dict(details)
-    with suppress(ValidationErrorType):
-        validate_payload(payload, ERROR_SCHEMA)
+    if not is_valid_error(payload):
+        with suppress(ValidationErrorType):
+            validate_payload(payload, ERROR_SCHEMA)
     return payload
 
 
@@ -168,6 +534,161 @@ def _esc(s: str) -> str:
     return s.replace("\n", "\\n")
 
 
+def _git_entry(command: str, commit_id: str | None, tag: str | None) -> str:
+    parts = [command]
+    if commit_id:
+        parts.append(f'id: "{_esc(commit_id)}"')
+    if tag:
+        parts.append(f'tag: "{_esc(tag)}"')
+    return " ".join(parts)
+
+
+# Flowchart statements that only declare something: repeating one is a
+# no-op, so canonical output drops the copies. Node declarations are scoped
+# to their subgraph block (a repeat elsewhere moves the node); edges, block
+# keywords and every other diagram kind depend on order and count and are
+# always kept.
+_FLOWCHART_HEADERS = (_FLOW, "graph")
+_GLOBAL_DECLARATIONS = ("style ", "classDef ", "class ")
+_FLOWCHART_KEYWORDS = frozenset(
+    {"subgraph", "end", "direction", "click", "linkStyle", "style", "classDef", "class"}
+)
+_QUOTED_RE = re.compile(r'"[^"]*"')
+_NODE_DECLARATION_RE = re.compile(r"[\w.]+\s*(?:[\[({>].*[\])}])?")
+_LINK_TOKENS = ("--", "==", "-.", "~~~", "&", ";", "|")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+_DIRECTIVE_PREFIX = "%%{"
+
+
+def _is_flowchart_header(header: str) -> bool:
+    words = header.split(maxsplit=1)
+    return bool(words) and words[0] in _FLOWCHART_HEADERS
+
+
+def _is_node_declaration(statement: str) -> bool:
+    bare = _QUOTED_RE.sub('""', statement)
+    return (
+        _NODE_DECLARATION_RE.fullmatch(bare) is not None
+        and bare not in _FLOWCHART_KEYWORDS
+        and not any(token in bare for token in _LINK_TOKENS)
+    )
+
+
+def _dedupe_flowchart_lines(lines: Iterable[str]) -> list[str]:
+    """Drop repeated node, ``style``, ``classDef`` and ``class`` statements."""
+    seen: set[tuple[int, str]] = set()
+    scopes = [0]
+    opened = 0
+    kept: list[str] = []
+    for line in lines:
+        statement = line.strip()
+        word = statement.split(maxsplit=1)[0] if statement else ""
+        if word == "subgraph":
+            opened += 1
+            scopes.append(opened)
+        elif word == "end" and len(scopes) > 1:
+            scopes.pop()
+        key: tuple[int, str] | None = None
+        if statement.startswith(_GLOBAL_DECLARATIONS):
+            key = (-1, statement)
+        elif _is_node_declaration(statement):
+            key = (scopes[-1], statement)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(line)
+    return kept
+
+
+def _dedupe_adjacent(lines: Iterable[str]) -> list[str]:
+    """Drop consecutive copies; separated repeats may re-apply an override."""
+    kept: list[str] = []
+    for line in lines:
+        if not kept or kept[-1].rstrip() != line.rstrip():
+            kept.append(line)
+    return kept
+
+
+def _join_canonical(parts: Iterable[str]) -> str:
+    """Join source lines with ``\\n`` only and no trailing whitespace."""
+    text = "\n".join(parts)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # Substring probes are far cheaper than the regex on clean sources.
+    if " \n" in text or "\t\n" in text or text.endswith((" ", "\t")):
+        text = _TRAILING_SPACE_RE.sub("", text)
+    return text + "\n"
+
+
+def canonical_source(
+    text: str, *, sort_directives: bool = False, dedupe_lines: bool = True
+) -> str:
+    """Canonical form of hand-written Mermaid text, as ``source()`` emits it.
+
+    Leading ``%%{...}%%`` directive lines keep their order unless
+    ``sort_directives`` is set; with ``dedupe_lines`` adjacent duplicate
+    directives and, in flowcharts, repeated node, ``style``, ``classDef`` and
+    ``class`` declarations are dropped. Edges and other diagram kinds are
+    left as written.
+    """
+    lines = _join_canonical([text.rstrip("\r\n")]).splitlines()
+    split = 0
+    while split < len(lines) and lines[split].startswith(_DIRECTIVE_PREFIX):
+        split += 1
+    directives, body = lines[:split], lines[split:]
+    if sort_directives:
+        directives.sort()
+    if dedupe_lines:
+        directives = _dedupe_adjacent(directives)
+        header = next(
+            (line for line in body if line.strip() and not line.startswith("%%")),
+            "",
+        )
+        if _is_flowchart_header(header):
+            body = _dedupe_flowchart_lines(body)
+    return _join_canonical([*directives, *body])
+
+
+@dataclass(frozen=True)
+class FlowNode:
+    node_id: str
+    label: str | None = None
+    shape: str | None = None
+
+
+@dataclass(frozen=True)
+class FlowEdge:
+    src: str
+    dst: str
+    label: str | None = None
+    arrow: str = "-->"
+    style: str | None = None
+
+
+# Line roles recorded for flowchart lines emitted by the builder API.
+_ROLE_NODE = "node"
+_ROLE_EDGE = "edge"
+_ROLE_SUBGRAPH = "subgraph"
+_ROLE_STYLE = "style"
+_ROLE_LINK_STYLE = "link_style"
+_ROLE_CLICK = "click"
+
+LineRef = tuple[str, tuple[str, ...]]
+
+
+def _new_node_map() -> dict[str, FlowNode]:
+    return {}
+
+
+def _new_edge_list() -> list[FlowEdge]:
+    return []
+
+
+def _new_line_refs() -> dict[int, LineRef]:
+    return {}
+
+
 @dataclass
 class MermaidDoc:
     kind: str
@@ -177,6 +698,1085 @@ class MermaidDoc:
         default_factory=_new_str_list
     )  # e.g., %%{init: {...}}%%
     comments: list[str] = field(default_factory=_new_str_list)
+    # Structured flowchart graph; lines remain the rendered form.
+    nodes: dict[str, FlowNode] = field(default_factory=_new_node_map)
+    edges: list[FlowEdge] = field(default_factory=_new_edge_list)
+    line_refs: dict[int, LineRef] = field(default_factory=_new_line_refs)
+
+    def to_bytes(self, *, compress: bool = True) -> bytes:
+        """Compact snapshot for other processes or caches; see :meth:`from_bytes`."""
+        return _dump_snapshot(_SNAPSHOT_DOC, (_doc_state(self),), compress=compress)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> MermaidDoc:
+        """Rebuild a document from :meth:`to_bytes` output of a trusted source."""
+        return _load_snapshot(data, _SNAPSHOT_DOC, 0)[0]
+
+    def __reduce__(self) -> tuple[Callable[[bytes], MermaidDoc], tuple[bytes]]:
+        # Pickles through the snapshot, which is several times faster.
+        return (MermaidDoc.from_bytes, (self.to_bytes(),))
+
+
+# Snapshot layout: magic, format version, payload kind and compression flag,
+# then a marshal-encoded tuple of primitives (the document state followed by
+# any builder settings).
+_SNAPSHOT_MAGIC = b"XMMD"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_DOC = ord("D")
+_SNAPSHOT_BUILDER = ord("B")
+_SNAPSHOT_HEADER_SIZE = len(_SNAPSHOT_MAGIC) + 3
+_SNAPSHOT_ZLIB_LEVEL = 1
+
+_DocState = tuple[
+    str,
+    str,
+    list[str],
+    list[str],
+    list[str],
+    list[tuple[str, str | None, str | None]],
+    list[tuple[str, str, str | None, str, str | None]],
+    list[tuple[int, str, tuple[str, ...]]],
+]
+
+
+def _doc_state(doc: MermaidDoc) -> _DocState:
+    return (
+        doc.kind,
+        doc.header,
+        doc.lines,
+        doc.directives,
+        doc.comments,
+        [(node.node_id, node.label, node.shape) for node in doc.nodes.values()],
+        [(e.src, e.dst, e.label, e.arrow, e.style) for e in doc.edges],
+        [(index, role, ids) for index, (role, ids) in doc.line_refs.items()],
+    )
+
+
+def _doc_from_state(state: _DocState) -> MermaidDoc:
+    kind, header, lines, directives, comments, nodes, edges, refs = state
+    return MermaidDoc(
+        kind=kind,
+        header=header,
+        lines=lines,
+        directives=directives,
+        comments=comments,
+        nodes={node[0]: FlowNode(*node) for node in nodes},
+        edges=[FlowEdge(*edge) for edge in edges],
+        line_refs={index: (role, ids) for index, role, ids in refs},
+    )
+
+
+_SnapshotState = tuple[_DocState | bool | str | float | None, ...]
+
+
+def _dump_snapshot(kind: int, state: _SnapshotState, *, compress: bool) -> bytes:
+    payload = marshal.dumps(state)
+    if compress:
+        payload = zlib.compress(payload, _SNAPSHOT_ZLIB_LEVEL)
+    header = bytes((_SNAPSHOT_VERSION, kind, int(compress)))
+    return _SNAPSHOT_MAGIC + header + payload
+
+
+def _load_snapshot(
+    data: bytes, kind: int, settings: int
+) -> tuple[MermaidDoc, tuple[object, ...]]:
+    """Decode a snapshot into its document and ``settings`` trailing values."""
+    if len(data) < _SNAPSHOT_HEADER_SIZE or not data.startswith(_SNAPSHOT_MAGIC):
+        message = "not a Mermaid snapshot"
+        raise ValueError(message)
+    version, found, compressed = data[len(_SNAPSHOT_MAGIC) : _SNAPSHOT_HEADER_SIZE]
+    if version != _SNAPSHOT_VERSION:
+        message = f"unsupported Mermaid snapshot version {version}"
+        raise ValueError(message)
+    if found != kind:
+        message = f"expected a {chr(kind)!r} snapshot, got {chr(found)!r}"
+        raise ValueError(message)
+    try:
+        payload = data[_SNAPSHOT_HEADER_SIZE:]
+        if compressed:
+            payload = zlib.decompress(payload)
+        # marshal only yields primitives; snapshots come from trusted peers.
+        state = cast("tuple[object, ...]", marshal.loads(payload))  # noqa: S302
+        if len(state) != settings + 1:
+            message = "snapshot has an unexpected layout"
+            raise ValueError(message)  # noqa: TRY301 - reported as corrupt below
+        doc = _doc_from_state(cast("_DocState", state[0]))
+    except (EOFError, TypeError, ValueError, zlib.error) as exc:
+        message = "corrupt Mermaid snapshot"
+        raise ValueError(message) from exc
+    return doc, state[1:]
+
+
+_SHAPE_DELIMS: dict[str, tuple[str, str]] = {
+    "rect": ("[", "]"),
+    "round": ("(", ")"),
+    "stadium": ("((", "))"),
+    "subroutine": ("[[", "]]"),
+    "cylinder": ("[(", ")]"),
+    "circle": ("((", "))"),
+    "asym": (">", "]"),
+    "rhombus": ("{", "}"),
+    "hexagon": ("{{", "}}"),
+}
+
+
+_STATE_ID_RE = re.compile(r"\w+")
+
+
+def _state_cluster_name(title: str, cluster_id: str | None) -> str:
+    """``state Name``, or ``state "title" as id`` when the title needs an id."""
+    if cluster_id is None and _STATE_ID_RE.fullmatch(title):
+        return f"state {title}"
+    state_id = cluster_id or re.sub(r"\W+", "_", title).strip("_") or "cluster"
+    return f'state "{_esc(title)}" as {state_id}'
+
+
+def _render_flow_node(node: FlowNode) -> str:
+    if node.label is None:
+        return node.node_id
+    delims = _SHAPE_DELIMS.get(node.shape) if node.shape else None
+    if delims:
+        return f"{node.node_id}{delims[0]}{_esc(node.label)}{delims[1]}"
+    return f'{node.node_id}["{_esc(node.label)}"]'
+
+
+def _render_flow_edge(edge: FlowEdge) -> str:
+    mid = f"|{_esc(edge.label)}|" if edge.label else ""
+    sfx = f" {edge.style}" if edge.style else ""
+    return f"{edge.src} {edge.arrow}{mid} {edge.dst}{sfx}"
+
+
+# Level-of-detail reduction for flowcharts
+
+REDUCTION_STRATEGIES: tuple[str, ...] = ("transitive", "chains", "cluster", "top_k")
+
+_MIN_CLUSTER_SIZE = 2
+_CLUSTER_SHAPE = "cluster"
+
+ClusterKey = Callable[[FlowNode], str | None]
+
+
+def _prefix_cluster_key(separator: str, depth: int) -> ClusterKey:
+    def _key(node: FlowNode) -> str | None:
+        parts = node.node_id.split(separator)
+        if len(parts) <= depth:
+            return None
+        return separator.join(parts[:depth])
+
+    return _key
+
+
+def _shape_cluster_key(node: FlowNode) -> str | None:
+    return node.shape
+
+
+def _mapping_cluster_key(groups: Mapping[str, str]) -> ClusterKey:
+    def _key(node: FlowNode) -> str | None:
+        return groups.get(node.node_id)
+
+    return _key
+
+
+@dataclass
+class ReductionReport:
+    """What a level-of-detail reduction removed or merged."""
+
+    target_nodes: int
+    original_nodes: int
+    original_edges: int
+    nodes: int = 0
+    edges: int = 0
+    applied: list[str] = field(default_factory=_new_str_list)
+    transitive_edges_dropped: int = 0
+    chain_nodes_collapsed: int = 0
+    clusters: dict[str, int] = field(default_factory=dict)
+    top_k_nodes_dropped: int = 0
+    top_k_edges_dropped: int = 0
+    edge_labels_dropped: int = 0
+    lines_dropped: int = 0
+
+    @property
+    def within_budget(self) -> bool:
+        return self.nodes <= self.target_nodes
+
+    def to_summary(self) -> dict[str, object]:
+        return {
+            "target_nodes": self.target_nodes,
+            "original_nodes": self.original_nodes,
+            "original_edges": self.original_edges,
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "within_budget": self.within_budget,
+            "applied": list(self.applied),
+            "transitive_edges_dropped": self.transitive_edges_dropped,
+            "chain_nodes_collapsed": self.chain_nodes_collapsed,
+            "clusters": dict(self.clusters),
+            "top_k_nodes_dropped": self.top_k_nodes_dropped,
+            "top_k_edges_dropped": self.top_k_edges_dropped,
+            "edge_labels_dropped": self.edge_labels_dropped,
+            "lines_dropped": self.lines_dropped,
+        }
+
+
+@dataclass
+class _ReductionGraph:
+    nodes: dict[str, FlowNode]
+    edges: list[FlowEdge]
+    clusters: dict[str, str] = field(default_factory=dict)
+    # Labels of edges merged into bridge or cluster edges that could not
+    # carry them.
+    edge_labels_dropped: int = 0
+
+    @classmethod
+    def from_doc(cls, doc: MermaidDoc) -> _ReductionGraph:
+        nodes = dict(doc.nodes)
+        for edge in doc.edges:
+            if edge.src not in nodes:
+                nodes[edge.src] = FlowNode(edge.src)
+            if edge.dst not in nodes:
+                nodes[edge.dst] = FlowNode(edge.dst)
+        clusters = {
+            node_id: node.label or node_id
+            for node_id, node in nodes.items()
+            if node.shape == _CLUSTER_SHAPE
+        }
+        return cls(nodes=nodes, edges=list(doc.edges), clusters=clusters)
+
+    def degrees(self) -> dict[str, int]:
+        degree = dict.fromkeys(self.nodes, 0)
+        for edge in self.edges:
+            degree[edge.src] += 1
+            degree[edge.dst] += 1
+        return degree
+
+
+def _drop_transitive_edges(graph: _ReductionGraph) -> int:
+    """Drop ``u -> w`` when a two-hop path ``u -> v -> w`` also exists.
+
+    Edges are dropped one at a time against the edges still kept, so the
+    path that implied a dropped edge always survives and reachability is
+    preserved, cycles included.
+    """
+    succ: dict[str, set[str]] = {}
+    pred: dict[str, set[str]] = {}
+    for edge in graph.edges:
+        succ.setdefault(edge.src, set()).add(edge.dst)
+        pred.setdefault(edge.dst, set()).add(edge.src)
+    kept: list[FlowEdge] = []
+    dropped = 0
+    for edge in graph.edges:
+        src, dst = edge.src, edge.dst
+        outgoing = succ.get(src, set())
+        incoming = pred.get(dst, set())
+        smaller, larger = (
+            (outgoing, incoming)
+            if len(outgoing) <= len(incoming)
+            else (incoming, outgoing)
+        )
+        implied = src != dst and any(
+            mid not in {src, dst} and mid in larger for mid in smaller
+        )
+        if implied:
+            dropped += 1
+            outgoing.discard(dst)
+            incoming.discard(src)
+        else:
+            kept.append(edge)
+    graph.edges = kept
+    return dropped
+
+
+def _bridge_edge(chain: Sequence[FlowEdge], graph: _ReductionGraph) -> FlowEdge:
+    """One edge standing for ``chain``, keeping a label and style all share."""
+    first, last = chain[0], chain[-1]
+    collapsed = len(chain) - 1
+    labels = {edge.label for edge in chain}
+    shared = first.label if len(labels) == 1 else None
+    if shared is None:
+        graph.edge_labels_dropped += sum(1 for edge in chain if edge.label)
+    styles = {edge.style for edge in chain}
+    return FlowEdge(
+        first.src,
+        last.dst,
+        f"{shared} ({collapsed} collapsed)" if shared else f"{collapsed} collapsed",
+        arrow=first.arrow,
+        style=first.style if len(styles) == 1 else None,
+    )
+
+
+def _collapse_chains(graph: _ReductionGraph) -> int:
+    """Replace runs of in=1/out=1 nodes with a single summarising edge."""
+    incoming: dict[str, list[FlowEdge]] = {}
+    outgoing: dict[str, list[FlowEdge]] = {}
+    for edge in graph.edges:
+        outgoing.setdefault(edge.src, []).append(edge)
+        incoming.setdefault(edge.dst, []).append(edge)
+
+    def _interior(node_id: str) -> bool:
+        ins = incoming.get(node_id, ())
+        outs = outgoing.get(node_id, ())
+        return (
+            node_id not in graph.clusters
+            and len(ins) == 1
+            and len(outs) == 1
+            and ins[0].src != node_id
+            and outs[0].dst != node_id
+        )
+
+    consumed: set[str] = set()
+    bridges: list[FlowEdge] = []
+    for edge in graph.edges:
+        if _interior(edge.src) or not _interior(edge.dst):
+            continue
+        run: set[str] = set()
+        chain = [edge]
+        current = edge.dst
+        while _interior(current) and current not in run:
+            run.add(current)
+            chain.append(outgoing[current][0])
+            current = chain[-1].dst
+        if current == edge.src or current in run:
+            continue
+        consumed.update(run)
+        bridges.append(_bridge_edge(chain, graph))
+    if not consumed:
+        return 0
+    graph.edges = [
+        edge
+        for edge in graph.edges
+        if edge.src not in consumed and edge.dst not in consumed
+    ]
+    graph.edges.extend(bridges)
+    for node_id in consumed:
+        del graph.nodes[node_id]
+    return len(consumed)
+
+
+def _unique_id(base: str, taken: Mapping[str, object]) -> str:
+    candidate = base
+    suffix = 1
+    while candidate in taken:
+        suffix += 1
+        candidate = f"{base}_{suffix}"
+    return candidate
+
+
+def _cluster_members(graph: _ReductionGraph, key: ClusterKey) -> dict[str, list[str]]:
+    members: dict[str, list[str]] = {}
+    for node_id, node in graph.nodes.items():
+        if node_id in graph.clusters:
+            continue
+        group = key(node)
+        if group:
+            members.setdefault(group, []).append(node_id)
+    return members
+
+
+def _remap_edges(
+    edges: Iterable[FlowEdge], remap: Mapping[str, str]
+) -> tuple[list[FlowEdge], int]:
+    """Edges between remapped endpoints, and how many labels they lost."""
+    seen: set[tuple[str, str]] = set()
+    remapped: list[FlowEdge] = []
+    labels_dropped = 0
+    for edge in edges:
+        src = remap.get(edge.src, edge.src)
+        dst = remap.get(edge.dst, edge.dst)
+        if src == edge.src and dst == edge.dst:
+            remapped.append(edge)
+            continue
+        if src == dst:
+            continue
+        if edge.label:
+            labels_dropped += 1
+        if (src, dst) not in seen:
+            seen.add((src, dst))
+            remapped.append(FlowEdge(src, dst, arrow=edge.arrow))
+    return remapped, labels_dropped
+
+
+def _cluster_nodes(graph: _ReductionGraph, key: ClusterKey) -> dict[str, int]:
+    """Merge nodes sharing a cluster key into one subgraph super-node."""
+    remap: dict[str, str] = {}
+    report: dict[str, int] = {}
+    for group, ids in _cluster_members(graph, key).items():
+        if len(ids) < _MIN_CLUSTER_SIZE:
+            continue
+        cluster_id = _unique_id(f"cluster_{len(graph.clusters) + 1}", graph.nodes)
+        for node_id in ids:
+            remap[node_id] = cluster_id
+            del graph.nodes[node_id]
+        graph.nodes[cluster_id] = FlowNode(
+            cluster_id, f"{group} ({len(ids)})", _CLUSTER_SHAPE
+        )
+        graph.clusters[cluster_id] = group
+        report[group] = len(ids)
+    if remap:
+        graph.edges, labels_dropped = _remap_edges(graph.edges, remap)
+        graph.edge_labels_dropped += labels_dropped
+    return report
+
+
+def _keep_top_k(graph: _ReductionGraph, k: int) -> tuple[int, int]:
+    if len(graph.nodes) <= k:
+        return 0, 0
+    degree = graph.degrees()
+    order = {node_id: index for index, node_id in enumerate(graph.nodes)}
+    ranked = sorted(graph.nodes, key=lambda nid: (-degree[nid], order[nid]))
+    keep = set(ranked[:k])
+    dropped_nodes = len(graph.nodes) - len(keep)
+    graph.nodes = {nid: node for nid, node in graph.nodes.items() if nid in keep}
+    for cluster_id in [cid for cid in graph.clusters if cid not in keep]:
+        del graph.clusters[cluster_id]
+    before = len(graph.edges)
+    graph.edges = [
+        edge for edge in graph.edges if edge.src in keep and edge.dst in keep
+    ]
+    return dropped_nodes, before - len(graph.edges)
+
+
+def _step_transitive(
+    graph: _ReductionGraph, report: ReductionReport, key: ClusterKey
+) -> None:
+    del key
+    report.transitive_edges_dropped += _drop_transitive_edges(graph)
+
+
+def _step_chains(
+    graph: _ReductionGraph, report: ReductionReport, key: ClusterKey
+) -> None:
+    del key
+    report.chain_nodes_collapsed += _collapse_chains(graph)
+
+
+def _step_cluster(
+    graph: _ReductionGraph, report: ReductionReport, key: ClusterKey
+) -> None:
+    report.clusters.update(_cluster_nodes(graph, key))
+
+
+def _step_top_k(
+    graph: _ReductionGraph, report: ReductionReport, key: ClusterKey
+) -> None:
+    del key
+    dropped_nodes, dropped_edges = _keep_top_k(graph, report.target_nodes)
+    report.top_k_nodes_dropped += dropped_nodes
+    report.top_k_edges_dropped += dropped_edges
+
+
+_REDUCTION_STEPS: dict[
+    str, Callable[[_ReductionGraph, ReductionReport, ClusterKey], None]
+] = {
+    "transitive": _step_transitive,
+    "chains": _step_chains,
+    "cluster": _step_cluster,
+    "top_k": _step_top_k,
+}
+
+
+_BLOCK_KEYWORDS = ("subgraph ", "direction ")
+
+
+class _GraphRenderer:
+    """Renders a reduced graph inside the cluster structure of its source doc.
+
+    Surviving nodes are declared where ``doc`` declared them, so they stay in
+    their ``subgraph()``/``cluster()`` blocks; blocks left without content
+    are removed. Nodes ``doc`` never declared (edge endpoints, reduction
+    clusters) and all edges follow the original lines. ``link_style()``
+    lines are renumbered to their edge's new position, or dropped with it.
+    """
+
+    def __init__(
+        self,
+        doc: MermaidDoc,
+        graph: _ReductionGraph,
+        keep_raw: Callable[[int], bool] | None = None,
+    ) -> None:
+        self.doc = doc
+        self.graph = graph
+        self.keep_raw = keep_raw
+        self.out = MermaidDoc(
+            kind=doc.kind,
+            header=doc.header,
+            directives=list(doc.directives),
+            comments=list(doc.comments),
+        )
+        self.declared: set[str] = set()
+        self.blocks: list[int] = []
+        self.dropped = 0
+        # linkStyle index in ``doc`` -> index of that edge in the output. The
+        # ``doc`` edges are alive, so ``id()`` tells survivors from new edges.
+        position = {id(edge): index for index, edge in enumerate(graph.edges)}
+        self.links = {
+            index: position[id(edge)]
+            for index, edge in enumerate(doc.edges)
+            if id(edge) in position
+        }
+
+    def _append(self, ref: LineRef | None, line: str) -> None:
+        if ref is not None:
+            self.out.line_refs[len(self.out.lines)] = ref
+        self.out.lines.append(line)
+
+    def _declare(self, node_id: str) -> None:
+        node = self.graph.nodes[node_id]
+        self.declared.add(node_id)
+        self.out.nodes[node_id] = node
+        if node.shape == _CLUSTER_SHAPE:
+            rendered = [f'subgraph {node_id} ["{_esc(node.label or node_id)}"]', "end"]
+        else:
+            rendered = [_render_flow_node(node)]
+        for line in rendered:
+            self._append((_ROLE_NODE, (node_id,)), line)
+
+    def _close_block(self, ref: LineRef, line: str) -> None:
+        start = self.blocks.pop()
+        body = self.out.lines[start + 1 :]
+        if any(not b.strip().startswith(_BLOCK_KEYWORDS) for b in body):
+            self._append(ref, line)
+            return
+        # Every node of the block was reduced away.
+        self.dropped += len(body) + 2
+        for index in range(start, len(self.out.lines)):
+            self.out.line_refs.pop(index, None)
+        del self.out.lines[start:]
+
+    def _subgraph_line(self, ref: LineRef, line: str) -> None:
+        statement = line.strip()
+        if statement.startswith("subgraph "):
+            self.blocks.append(len(self.out.lines))
+            self._append(ref, line)
+        elif statement == "end" and self.blocks:
+            self._close_block(ref, line)
+        elif statement.startswith("direction "):
+            self._append(ref, line)
+        elif statement in self.graph.nodes:
+            # A subgraph() body line naming a node.
+            self._append(ref, line)
+        else:
+            self.dropped += 1
+
+    def _link_style(self, ref: LineRef, line: str) -> None:
+        keyword, link, rest = line.split(" ", 2)
+        if link.isdigit() and int(link) in self.links:
+            self._append(ref, f"{keyword} {self.links[int(link)]} {rest}")
+        else:
+            self.dropped += 1
+
+    def _builder_line(self, ref: LineRef, line: str) -> None:
+        role, ids = ref
+        nodes = self.graph.nodes
+        if role == _ROLE_NODE:
+            if ids[0] in nodes and ids[0] not in self.declared:
+                self._declare(ids[0])
+        elif role == _ROLE_SUBGRAPH:
+            self._subgraph_line(ref, line)
+        elif role in {_ROLE_STYLE, _ROLE_CLICK} and all(i in nodes for i in ids):
+            self._append(ref, line)
+        elif role == _ROLE_LINK_STYLE:
+            self._link_style(ref, line)
+        elif role != _ROLE_EDGE:
+            self.dropped += 1
+
+    def render(self) -> MermaidDoc:
+        graph = self.graph
+        for index, line in enumerate(self.doc.lines):
+            ref = self.doc.line_refs.get(index)
+            if ref is not None:
+                self._builder_line(ref, line)
+            elif self.keep_raw is None or self.keep_raw(index):
+                self._append(None, line)
+        for node_id in graph.nodes:
+            if node_id not in self.declared:
+                self._declare(node_id)
+        for edge in graph.edges:
+            self.out.edges.append(edge)
+            self._append((_ROLE_EDGE, (edge.src, edge.dst)), _render_flow_edge(edge))
+        return self.out
+
+
+def _render_graph(
+    doc: MermaidDoc,
+    graph: _ReductionGraph,
+    keep_raw: Callable[[int], bool] | None = None,
+) -> tuple[MermaidDoc, int]:
+    """Render ``graph`` with the header, raw lines and surviving decorations of ``doc``.
+
+    ``keep_raw`` selects raw lines by index (all are kept by default).
+    Returns the new document and the number of builder lines left behind.
+    """
+    renderer = _GraphRenderer(doc, graph, keep_raw)
+    return renderer.render(), renderer.dropped
+
+
+def reduce_flowchart(
+    doc: MermaidDoc,
+    max_nodes: int,
+    *,
+    strategies: Sequence[str] = REDUCTION_STRATEGIES,
+    cluster_by: ClusterKey | None = None,
+) -> tuple[MermaidDoc, ReductionReport]:
+    """Return a reduced copy of ``doc`` holding at most ``max_nodes`` nodes.
+
+    Strategies run in the given order and stop once the budget is met;
+    ``top_k`` is the only one that always enforces the budget. Lines written
+    through ``raw()`` are carried over verbatim; ``subgraph()`` and
+    ``cluster()`` blocks keep their surviving nodes and are removed once
+    none are left.
+    """
+    if max_nodes < 1:
+        message = "max_nodes must be at least 1"
+        raise ValueError(message)
+    unknown = [name for name in strategies if name not in _REDUCTION_STEPS]
+    if unknown:
+        message = f"unknown reduction strategies: {', '.join(unknown)}"
+        raise ValueError(message)
+
+    graph = _ReductionGraph.from_doc(doc)
+    report = ReductionReport(
+        target_nodes=max_nodes,
+        original_nodes=len(graph.nodes),
+        original_edges=len(graph.edges),
+    )
+    key = cluster_by or _prefix_cluster_key(".", 1)
+    for name in strategies:
+        if len(graph.nodes) <= max_nodes:
+            break
+        _REDUCTION_STEPS[name](graph, report, key)
+        report.applied.append(name)
+
+    reduced, report.lines_dropped = _render_graph(doc, graph)
+    report.edge_labels_dropped = graph.edge_labels_dropped
+    report.nodes = len(graph.nodes)
+    report.edges = len(graph.edges)
+    return reduced, report
+
+
+def _component_order(graph: _ReductionGraph) -> list[list[str]]:
+    """Weakly connected components, each listed in breadth-first order."""
+    neighbours: dict[str, list[str]] = {node_id: [] for node_id in graph.nodes}
+    for edge in graph.edges:
+        neighbours[edge.src].append(edge.dst)
+        neighbours[edge.dst].append(edge.src)
+    seen: set[str] = set()
+    components: list[list[str]] = []
+    for start in graph.nodes:
+        if start in seen:
+            continue
+        seen.add(start)
+        component = [start]
+        for current in component:
+            for nxt in neighbours[current]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    component.append(nxt)
+        components.append(component)
+    return components
+
+
+_RAW_TOKEN_RE = re.compile(r"[\w.]+")
+# Raw definitions any part may refer to.
+_SHARED_RAW_PREFIXES = ("classDef ", "%%")
+
+
+def _raw_line_owners(
+    doc: MermaidDoc, part_of: Mapping[str, int], first: int
+) -> dict[int, int | None]:
+    """Part that keeps each raw line; ``None`` for every part, -1 for none.
+
+    Lines naming nodes go to the part holding them and are dropped when
+    those nodes were split apart. Other lines go to the first part, except
+    ``classDef`` and comment lines, which every part keeps.
+    """
+    owners: dict[int, int | None] = {}
+    for index, line in enumerate(doc.lines):
+        if index in doc.line_refs:
+            continue
+        parts = {part_of[t] for t in _RAW_TOKEN_RE.findall(line) if t in part_of}
+        if len(parts) == 1:
+            owners[index] = parts.pop()
+        elif parts:
+            owners[index] = -1
+        elif line.lstrip().startswith(_SHARED_RAW_PREFIXES):
+            owners[index] = None
+        else:
+            owners[index] = first
+    return owners
+
+
+def split_flowchart(doc: MermaidDoc, max_nodes: int) -> tuple[list[MermaidDoc], int]:
+    """Split ``doc`` into parts of at most ``max_nodes`` nodes.
+
+    Connected components are packed together where they fit; larger ones are
+    cut in breadth-first order. Raw lines are kept once, in the part holding
+    the nodes they name (see :func:`_raw_line_owners`). Returns the parts and
+    the number of edges and raw lines that crossed a part boundary and were
+    dropped.
+    """
+    if max_nodes < 1:
+        message = "max_nodes must be at least 1"
+        raise ValueError(message)
+    graph = _ReductionGraph.from_doc(doc)
+    buckets: list[list[str]] = [[]]
+    for component in _component_order(graph):
+        for start in range(0, len(component), max_nodes):
+            chunk = component[start : start + max_nodes]
+            if len(buckets[-1]) + len(chunk) > max_nodes:
+                buckets.append([])
+            buckets[-1].extend(chunk)
+    part_of = {node_id: index for index, ids in enumerate(buckets) for node_id in ids}
+    part_edges: list[list[FlowEdge]] = [[] for _ in buckets]
+    cut = 0
+    for edge in graph.edges:
+        part = part_of[edge.src]
+        if part_of[edge.dst] == part:
+            part_edges[part].append(edge)
+        else:
+            cut += 1
+    first = next((index for index, ids in enumerate(buckets) if ids), 0)
+    owners = _raw_line_owners(doc, part_of, first)
+    cut += sum(1 for owner in owners.values() if owner == -1)
+    parts: list[MermaidDoc] = []
+    for part, (ids, edges) in enumerate(zip(buckets, part_edges, strict=True)):
+        if not ids:
+            continue
+        part_graph = _ReductionGraph(
+            nodes={node_id: graph.nodes[node_id] for node_id in ids}, edges=edges
+        )
+
+        def keep(index: int, part: int = part) -> bool:
+            return owners[index] in (None, part)
+
+        parts.append(_render_graph(doc, part_graph, keep)[0])
+    return parts, cut
+
+
+DEFAULT_NAMESPACE_SEPARATOR = "."
+
+# Builder lines that start with a fixed keyword followed by the id they
+# reference; merging rewrites them by splicing in the namespaced id.
+_ID_LINE_PREFIXES: dict[str, str] = {
+    _ROLE_STYLE: "style ",
+    _ROLE_CLICK: "click ",
+    _ROLE_SUBGRAPH: "subgraph ",
+}
+
+
+def _splice_id(line: str, prefix: str, old: str, new: str) -> str:
+    return f"{prefix}{new}{line[len(prefix) + len(old) :]}"
+
+
+_SUBGRAPH_SLUG_RE = re.compile(r"\W+")
+
+
+class _DocMerger:
+    """Appends namespaced copies of flowcharts to one document."""
+
+    def __init__(self, merged: MermaidDoc, separator: str) -> None:
+        self.merged = merged
+        self.separator = separator
+        self.links = 0
+
+    def _titled_subgraph(
+        self, line: str, prefix: str, titles: dict[str, str]
+    ) -> tuple[str, str] | None:
+        """Namespaced id and opening for a ``subgraph Title`` line, if it is one.
+
+        Mermaid uses such a title as the subgraph id, so the same title in two
+        sources would otherwise merge their clusters into one box.
+        """
+        stripped = line.strip()
+        if not prefix or not stripped.startswith("subgraph "):
+            return None
+        title = stripped.removeprefix("subgraph ").strip()
+        if "[" in title:
+            return None
+        slug = titles.get(title)
+        if slug is None:
+            base = _SUBGRAPH_SLUG_RE.sub("_", title).strip("_") or "subgraph"
+            slug, suffix = base, 2
+            while slug in titles.values():
+                slug, suffix = f"{base}_{suffix}", suffix + 1
+            titles[title] = slug
+        indent = line[: len(line) - len(stripped)]
+        label = title.replace('"', "#quot;")
+        return f"{prefix}{slug}", f'{indent}subgraph {prefix}{slug} ["{label}"]'
+
+    def _unnamed_subgraph_line(
+        self, line: str, prefix: str, known: set[str], titles: dict[str, str]
+    ) -> None:
+        """Copy a ``subgraph()`` line, or an untitled-id ``cluster()`` opening."""
+        titled = self._titled_subgraph(line, prefix, titles)
+        if titled is not None:
+            self._append(_ROLE_SUBGRAPH, (titled[0],), titled[1])
+        elif line.strip() in known:
+            # A subgraph() body line naming a node.
+            indent = line[: len(line) - len(line.lstrip())]
+            self._append(_ROLE_SUBGRAPH, (), indent + prefix + line.strip())
+        else:
+            self._append(_ROLE_SUBGRAPH, (), line)
+
+    def _append(self, role: str, ids: tuple[str, ...], line: str) -> None:
+        self.merged.line_refs[len(self.merged.lines)] = (role, ids)
+        self.merged.lines.append(line)
+
+    def _rewrite(
+        self, doc: MermaidDoc, ref: LineRef, new_ids: tuple[str, ...], line: str
+    ) -> str:
+        role, ids = ref
+        if role == _ROLE_LINK_STYLE:
+            keyword, link, rest = line.split(" ", 2)
+            return f"{keyword} {int(link) + self.links} {rest}"
+        if role == _ROLE_NODE and line != "end":
+            node = doc.nodes.get(ids[0])
+            cluster = node is not None and node.shape == _CLUSTER_SHAPE
+            opening = "subgraph " if cluster else ""
+            return _splice_id(line, opening, ids[0], new_ids[0])
+        if ids and role in _ID_LINE_PREFIXES:
+            return _splice_id(line, _ID_LINE_PREFIXES[role], ids[0], new_ids[0])
+        return line
+
+    def add(self, doc: MermaidDoc, namespace: str, *, wrap: bool) -> None:
+        prefix = f"{namespace}{self.separator}" if namespace else ""
+
+        def rename(node_id: str) -> str:
+            return f"{prefix}{node_id}"
+
+        merged = self.merged
+        merged.directives.extend(
+            d for d in doc.directives if d not in merged.directives
+        )
+        merged.comments.extend(doc.comments)
+        if wrap:
+            self._append(
+                _ROLE_SUBGRAPH,
+                (namespace,),
+                f'subgraph {namespace} ["{_esc(namespace)}"]',
+            )
+        for node_id, node in doc.nodes.items():
+            merged.nodes[rename(node_id)] = replace(node, node_id=rename(node_id))
+        known = set(doc.nodes)
+        for edge in doc.edges:
+            known.update((edge.src, edge.dst))
+        titles: dict[str, str] = {}
+        edges = iter(doc.edges)
+        for index, line in enumerate(doc.lines):
+            ref = doc.line_refs.get(index)
+            if ref is None:
+                merged.lines.append(line)
+                continue
+            role, ids = ref
+            new_ids = tuple(rename(i) for i in ids)
+            if role == _ROLE_EDGE:
+                edge = next(edges)
+                edge = replace(edge, src=rename(edge.src), dst=rename(edge.dst))
+                merged.edges.append(edge)
+                self._append(role, new_ids, _render_flow_edge(edge))
+            elif role == _ROLE_SUBGRAPH and not ids:
+                self._unnamed_subgraph_line(line, prefix, known, titles)
+            else:
+                self._append(role, new_ids, self._rewrite(doc, ref, new_ids, line))
+        if wrap:
+            self._append(_ROLE_SUBGRAPH, (), "end")
+        self.links += len(doc.edges)
+
+
+def merge_docs(
+    sources: (
+        Mapping[str, MermaidDoc | MermaidBuilder]
+        | Iterable[MermaidDoc | MermaidBuilder]
+    ),
+    *,
+    separator: str = DEFAULT_NAMESPACE_SEPARATOR,
+    subgraphs: bool = False,
+    direction: str | None = None,
+) -> MermaidDoc:
+    """Merge flowcharts into one, prefixing each source's ids with a namespace.
+
+    ``sources`` maps namespaces to documents or builders; a plain iterable
+    is namespaced ``s1``, ``s2``, ... and an empty namespace keeps a
+    source's ids unchanged. Ids are rewritten from the roles recorded for
+    builder lines, so merging is linear in the number of lines; lines added
+    through ``raw()`` and ``subgraph()`` body lines other than a bare node
+    id are copied verbatim. Subgraphs opened by title alone (``subgraph()``
+    or ``cluster()`` without ``cluster_id``) get a namespaced id with the
+    title as their label, so equal titles stay separate clusters. With
+    ``subgraphs`` every namespaced source is wrapped in a subgraph whose id
+    and title are its namespace.
+
+    With the default ``.`` separator, ``reduce()``'s default clustering
+    groups the merged nodes by source.
+    """
+    named = (
+        sources.items()
+        if isinstance(sources, Mapping)
+        else ((f"s{index}", source) for index, source in enumerate(sources, 1))
+    )
+    merger: _DocMerger | None = None
+    for namespace, source in named:
+        doc = source.doc if isinstance(source, MermaidBuilder) else source
+        if doc.kind != _FLOW:
+            message = "merge_docs() only supports flowchart diagrams"
+            raise ValueError(message)
+        if merger is None:
+            header = f"{_FLOW} {direction}" if direction else doc.header
+            merger = _DocMerger(MermaidDoc(kind=_FLOW, header=header), separator)
+        merger.add(doc, namespace, wrap=subgraphs and bool(namespace))
+    if merger is None:
+        return MermaidDoc(kind=_FLOW, header=f"{_FLOW} {direction or 'LR'}")
+    return merger.merged
+
+
+_COMPACT_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _compact_token(number: int) -> str:
+    digits = ""
+    while True:
+        number, digit = divmod(number, len(_COMPACT_DIGITS))
+        digits = _COMPACT_DIGITS[digit] + digits
+        if not number:
+            return f"n{digits}"
+
+
+class _IdCompactor:
+    """Rewrites a flowchart with short generated ids, labelled with the originals."""
+
+    def __init__(self, doc: MermaidDoc) -> None:
+        self.doc = doc
+        self.taken = set(doc.nodes)
+        for edge in doc.edges:
+            self.taken.update((edge.src, edge.dst))
+        self.ids: dict[str, str] = {}
+        self.labelled: set[str] = set()
+        self.counter = 0
+        self.out = MermaidDoc(
+            kind=doc.kind,
+            header=doc.header,
+            directives=list(doc.directives),
+            comments=list(doc.comments),
+        )
+
+    def short(self, node_id: str) -> str:
+        short = self.ids.get(node_id)
+        if short is not None:
+            return short
+        while (candidate := _compact_token(self.counter)) in self.taken:
+            self.counter += 1
+        # Ids already as short as a generated one are left alone.
+        if len(candidate) < len(node_id):
+            self.counter += 1
+            short = candidate
+        else:
+            short = node_id
+        self.ids[node_id] = short
+        return short
+
+    def _append(self, role: str, ids: tuple[str, ...], line: str) -> None:
+        self.out.line_refs[len(self.out.lines)] = (role, ids)
+        self.out.lines.append(line)
+
+    def _declaration(self, node_id: str) -> str | None:
+        """First use of a renamed id: a declaration labelled with the original."""
+        short = self.short(node_id)
+        if short == node_id or node_id in self.labelled:
+            return None
+        self.labelled.add(node_id)
+        known = self.doc.nodes.get(node_id)
+        node = FlowNode(
+            short,
+            (known.label if known else None) or node_id,
+            known.shape if known else None,
+        )
+        self.out.nodes[short] = node
+        return _render_flow_node(node)
+
+    def _declare(self, node_ids: tuple[str, ...]) -> None:
+        """Label renamed ids on first use so the diagram shows the originals."""
+        for node_id in node_ids:
+            declaration = self._declaration(node_id)
+            if declaration is not None:
+                self._append(_ROLE_NODE, (self.short(node_id),), declaration)
+
+    def _body_line(self, line: str) -> str:
+        """A ``subgraph()`` body line; bare node ids follow the new ids."""
+        node_id = line.strip()
+        if node_id not in self.taken:
+            return line
+        indent = line[: len(line) - len(line.lstrip())]
+        return indent + (self._declaration(node_id) or self.short(node_id))
+
+    def _node_line(self, node_id: str, line: str) -> str:
+        short = self.short(node_id)
+        known = self.doc.nodes.get(node_id)
+        if known is not None and known.shape == _CLUSTER_SHAPE:
+            self.labelled.add(node_id)
+            return (
+                line if line == "end" else _splice_id(line, "subgraph ", node_id, short)
+            )
+        if line == node_id and short != node_id:
+            # A bare declaration: the original id becomes the label.
+            line = _render_flow_node(FlowNode(short, node_id))
+        else:
+            line = _splice_id(line, "", node_id, short)
+        self.labelled.add(node_id)
+        if known is not None:
+            label = known.label if known.label is not None else node_id
+            self.out.nodes[short] = replace(known, node_id=short, label=label)
+        return line
+
+    def compact(self) -> MermaidDoc:
+        edges = iter(self.doc.edges)
+        for index, line in enumerate(self.doc.lines):
+            ref = self.doc.line_refs.get(index)
+            if ref is None:
+                self.out.lines.append(line)
+                continue
+            role, ids = ref
+            if role == _ROLE_NODE:
+                self._append(role, (self.short(ids[0]),), self._node_line(ids[0], line))
+                continue
+            if role == _ROLE_SUBGRAPH and not ids:
+                self._append(role, ids, self._body_line(line))
+                continue
+            if role == _ROLE_SUBGRAPH:
+                # Cluster ids carry their own title.
+                self.labelled.update(ids)
+            else:
+                self._declare(ids)
+            new_ids = tuple(self.short(i) for i in ids)
+            rewritten = line
+            if role == _ROLE_EDGE:
+                edge = next(edges)
+                edge = replace(edge, src=self.short(edge.src), dst=self.short(edge.dst))
+                self.out.edges.append(edge)
+                rewritten = _render_flow_edge(edge)
+            elif ids and role in _ID_LINE_PREFIXES:
+                prefix = _ID_LINE_PREFIXES[role]
+                rewritten = _splice_id(line, prefix, ids[0], new_ids[0])
+            self._append(role, new_ids, rewritten)
+        return self.out
+
+
+def compact_flowchart(doc: MermaidDoc) -> tuple[MermaidDoc, dict[str, str]]:
+    """Return ``doc`` with long node ids replaced by short generated ones.
+
+    Renamed nodes keep their original id as the label, declared where the id
+    is first used; style, click and cluster lines follow the new ids, as do
+    ``subgraph()`` body lines that are a bare node id. Lines added through
+    ``raw()`` and other ``subgraph()`` body lines (edges, labelled
+    declarations) are copied verbatim, so references in them should be
+    written with the returned mapping of original to short ids. Documents
+    other than flowcharts are returned unchanged.
+    """
+    if doc.kind != _FLOW:
+        return doc, {}
+    compactor = _IdCompactor(doc)
+    compacted = compactor.compact()
+    return compacted, {
+        node_id: short for node_id, short in compactor.ids.items() if short != node_id
+    }
 
 
 def _handle_flowchart(
@@ -413,82 +2013,6 @@ def _set_diagram(builder: MermaidBuilder, document: Mapping[str, object]) -> str
     return diagram
 
 
-def _apply_directives(builder: MermaidBuilder, directives: object) -> None:
-    if not isinstance(directives, Sequence):
-        return
-    for entry in directives:
-        if not isinstance(entry, Mapping):
-            continue
-        text_obj = entry.get("text")
-        payload_obj = entry.get("payload")
-        if isinstance(payload_obj, Mapping):
-            typed_payload = cast("Mapping[str, object]", payload_obj)
-            builder.set_directive(dict(typed_payload))
-        elif isinstance(text_obj, str) and text_obj:
-            builder.set_directive(text_obj)
-
-
-def _apply_comments(builder: MermaidBuilder, comments: object) -> None:
-    if not isinstance(comments, Sequence):
-        return
-    for item in comments:
-        if isinstance(item, str) and item:
-            builder.add_comment(item)
-
-
-def _apply_nodes(builder: MermaidBuilder, nodes: object) -> int:
-    if not isinstance(nodes, Sequence):
-        return 0
-    count = 0
-    for entry in nodes:
-        if not isinstance(entry, Mapping):
-            continue
-        node_id_obj = entry.get("id")
-        if not isinstance(node_id_obj, str) or not node_id_obj:
-            continue
-        label_obj = entry.get("label")
-        label = None
-        if isinstance(label_obj, str) and label_obj:
-            label = label_obj
-        shape_obj = entry.get("shape")
-        shape = shape_obj if isinstance(shape_obj, str) and shape_obj else None
-        builder.node(node_id_obj, label, shape)
-        count += 1
-    return count
-
-
-def _apply_edges(builder: MermaidBuilder, edges: object) -> int:
-    if not isinstance(edges, Sequence):
-        return 0
-    count = 0
-    for entry in edges:
-        if not isinstance(entry, Mapping):
-            continue
-        src = entry.get("source")
-        dst = entry.get("target")
-        if not isinstance(src, str) or not isinstance(dst, str):
-            continue
-        label_obj = entry.get("label")
-        label = None
-        if isinstance(label_obj, str) and label_obj:
-            label = label_obj
-        arrow_obj = entry.get("arrow")
-        arrow = arrow_obj if isinstance(arrow_obj, str) and arrow_obj else "-->"
-        style_obj = entry.get("style")
-        style = style_obj if isinstance(style_obj, str) and style_obj else None
-        builder.edge(src, dst, label, arrow=arrow, style=style)
-        count += 1
-    return count
-
-
-def _apply_lines(builder: MermaidBuilder, lines: object) -> None:
-    if not isinstance(lines, Sequence):
-        return
-    for line in lines:
-        if isinstance(line, str) and line:
-            builder.raw(line)
-
-
 def _instruction_participant(builder: MermaidBuilder, payload: object) -> None:
     if not isinstance(payload, Mapping):
         return
@@ -727,58 +2251,275 @@ def _apply_instruction(
         handler(builder, payload)
 
 
-def _apply_instructions(builder: MermaidBuilder, instructions: object) -> None:
-    if not isinstance(instructions, Sequence):
-        return
-    for entry in instructions:
-        if not isinstance(entry, Mapping):
-            continue
-        type_obj = entry.get("type")
-        payload = entry.get("payload")
-        if isinstance(type_obj, str) and type_obj:
-            _apply_instruction(builder, type_obj, payload)
+class _DocumentItemError(Exception):
+    """A document array element failed its generated item validator."""
+
+    def __init__(self, array: str, index: int) -> None:
+        super().__init__(f"document {array}[{index}] failed validation")
+        self.array = array
+        self.index = index
+        self.path: list[str | int] = ["parameters", "document", array, index]
+
+
+# Element shapes guaranteed by DOCUMENT_ITEM_VALIDATORS; typing the arrays
+# once avoids per-element casts in the hot loops below.
+class _DirectiveItem(TypedDict, total=False):
+    text: Required[str]
+    payload: dict[str, object]
+
+
+class _NodeItem(TypedDict, total=False):
+    id: Required[str]
+    label: str | None
+    shape: str | None
+
+
+class _EdgeItem(TypedDict, total=False):
+    source: Required[str]
+    target: Required[str]
+    label: str | None
+    arrow: str | None
+    style: str | None
+
+
+class _InstructionItem(TypedDict):
+    type: str
+    payload: object
+
+
+def _document_items(document: Mapping[str, object], array: str) -> list[object]:
+    # The input shell validator already guaranteed a list when present.
+    return cast("list[object] | None", document.get(array)) or []
+
+
+def _check_items(items: list[object], array: str) -> None:
+    validator = DOCUMENT_ITEM_VALIDATORS[array]
+    for index, entry in enumerate(items):
+        if not validator(entry):
+            raise _DocumentItemError(array, index)
+
+
+def _apply_flow_nodes(builder: MermaidBuilder, items: list[object]) -> int:
+    doc = builder.doc
+    array = "nodes"
+    validator = DOCUMENT_ITEM_VALIDATORS[array]
+    if doc.kind != _FLOW:
+        _check_items(items, array)
+        return len(items)
+    lines, refs, nodes = doc.lines, doc.line_refs, doc.nodes
+    for index, entry in enumerate(cast("list[_NodeItem]", items)):
+        if not validator(entry):
+            raise _DocumentItemError(array, index)
+        node_id = entry["id"]
+        node = FlowNode(node_id, entry.get("label"), entry.get("shape"))
+        nodes[node_id] = node
+        refs[len(lines)] = (_ROLE_NODE, (node_id,))
+        lines.append(_render_flow_node(node))
+    return len(items)
+
+
+def _apply_flow_edges(builder: MermaidBuilder, items: list[object]) -> int:
+    doc = builder.doc
+    array = "edges"
+    validator = DOCUMENT_ITEM_VALIDATORS[array]
+    if doc.kind != _FLOW:
+        _check_items(items, array)
+        return len(items)
+    lines, refs, edges = doc.lines, doc.line_refs, doc.edges
+    for index, entry in enumerate(cast("list[_EdgeItem]", items)):
+        if not validator(entry):
+            raise _DocumentItemError(array, index)
+        src, dst = entry["source"], entry["target"]
+        edge = FlowEdge(
+            src,
+            dst,
+            entry.get("label"),
+            entry.get("arrow") or "-->",
+            entry.get("style"),
+        )
+        edges.append(edge)
+        refs[len(lines)] = (_ROLE_EDGE, (src, dst))
+        lines.append(_render_flow_edge(edge))
+    return len(items)
 
 
-def _apply_document(
-    builder: MermaidBuilder,
-    document: Mapping[str, object],
-) -> dict[str, object]:
+def _apply_raw_lines(builder: MermaidBuilder, items: list[object]) -> int:
+    _check_items(items, "lines")
+    for line in cast("list[str]", items):
+        if line:
+            builder.raw(line)
+    return len(items)
+
+
+def _apply_instruction_items(builder: MermaidBuilder, items: list[object]) -> int:
+    _check_items(items, "instructions")
+    for instruction in cast("list[_InstructionItem]", items):
+        _apply_instruction(builder, instruction["type"], instruction["payload"])
+    return len(items)
+
+
+# Arrays whose rendered lines follow the header, in emission order.
+_BODY_APPLIERS: dict[str, Callable[[MermaidBuilder, list[object]], int]] = {
+    "nodes": _apply_flow_nodes,
+    "edges": _apply_flow_edges,
+    "lines": _apply_raw_lines,
+    "instructions": _apply_instruction_items,
+}
+
+
+def _apply_preamble(builder: MermaidBuilder, document: Mapping[str, object]) -> str:
+    """Set the diagram kind and apply directives and comments."""
     diagram = _set_diagram(builder, document)
-    _apply_directives(builder, document.get("directives"))
-    _apply_comments(builder, document.get("comments"))
-    node_count = _apply_nodes(builder, document.get("nodes"))
-    edge_count = _apply_edges(builder, document.get("edges"))
-    _apply_lines(builder, document.get("lines"))
-    _apply_instructions(builder, document.get("instructions"))
-    metadata_obj = document.get("metadata")
+    directives = _document_items(document, "directives")
+    _check_items(directives, "directives")
+    for directive in cast("list[_DirectiveItem]", directives):
+        payload = directive.get("payload")
+        builder.set_directive(payload if payload is not None else directive["text"])
+    comments = _document_items(document, "comments")
+    _check_items(comments, "comments")
+    for comment in cast("list[str]", comments):
+        builder.add_comment(comment)
+    return diagram
+
+
+def _document_summary(
+    diagram: str, counts: Mapping[str, int], document: Mapping[str, object]
+) -> dict[str, object]:
     summary: dict[str, object] = {
         "diagram": diagram,
-        "nodes": node_count,
-        "edges": edge_count,
+        "nodes": counts.get("nodes", 0),
+        "edges": counts.get("edges", 0),
     }
+    metadata_obj = document.get("metadata")
     if isinstance(metadata_obj, Mapping):
         typed_metadata = cast("Mapping[str, object]", metadata_obj)
         summary["metadata"] = dict(typed_metadata)
     return summary
 
 
-def _maybe_to_svg(
+def _apply_document(
+    builder: MermaidBuilder,
+    document: Mapping[str, object],
+) -> dict[str, object]:
+    """Validate and apply document arrays in one pass, without copying them.
+
+    ``document`` must already have passed ``is_valid_input_shell``; each array
+    element is checked by its generated validator as it is applied, and the
+    first invalid one raises ``_DocumentItemError``.
+    """
+    diagram = _apply_preamble(builder, document)
+    counts = {
+        array: applier(builder, _document_items(document, array))
+        for array, applier in _BODY_APPLIERS.items()
+    }
+    return _document_summary(diagram, counts, document)
+
+
+def _export_with_deadline(  # noqa: PLR0913 - mirrors export_mermaid_to_svg
+    mermaid_source: str,
+    *,
+    output_dir: Path,
+    stem: str,
+    mermaid_cli_path: str | None,
+    runner: CommandRunner | None,
+    extra_args: list[str] | None = None,
+    deadline: Deadline | None = None,
+    count_source: bool = True,
+) -> ExportResult:
+    """Export via mmdc, bounding the default runner by ``deadline``.
+
+    Custom runners are trusted to enforce their own limits; a timeout they
+    raise as ``CommandTimeoutError`` is still reported as a failed export.
+    ``count_source=False`` leaves the exporter's ``.mmd`` out of
+    ``bytes_written_total`` when the caller already counted that file.
+    """
+    if deadline is not None and runner is None:
+        runner = deadline_runner(deadline)
+    # Hand the exporter an already-resolved binary so it skips its search.
+    cached = _CLI_CACHE.lookup(mermaid_cli_path)
+    try:
+        with timed("export_seconds"):
+            result = export_mermaid_to_svg(
+                mermaid_source,
+                output_dir=output_dir,
+                stem=stem,
+                mermaid_cli_path=str(cached.path) if cached else mermaid_cli_path,
+                runner=runner,
+                extra_args=extra_args,
+            )
+    except CommandTimeoutError as exc:
+        result = ExportResult(
+            exporter="mermaid-cli",
+            succeeded=False,
+            output_path=None,
+            command=exc.argv,
+            stdout=exc.stdout,
+            stderr=exc.stderr,
+            inputs={"mermaid": output_dir / f"{stem}.mmd"},
+            binary_path=Path(exc.argv[0]) if exc.argv else None,
+            detail=f"Mermaid CLI timed out after {exc.timeout:g}s",
+        )
+    else:
+        if cached is None and result.binary_path is not None:
+            _CLI_CACHE.remember(mermaid_cli_path, Path(result.binary_path))
+    _record_export(result, mermaid_source if count_source else None)
+    return result
+
+
+def _record_export(result: ExportResult, mermaid_source: str | None) -> None:
+    metrics = active_metrics()
+    if metrics is None:
+        return
+    metrics.inc("renders_total")
+    if mermaid_source is not None:
+        metrics.inc(
+            "bytes_written_total", len(mermaid_source.encode("utf-8")), kind="mmd"
+        )
+    if not result.succeeded or result.output_path is None:
+        metrics.inc("render_failures_total")
+        return
+    with suppress(OSError):
+        metrics.inc(
+            "bytes_written_total", Path(result.output_path).stat().st_size, kind="svg"
+        )
+
+
+def _optimize_export(
+    result: ExportResult, optimizer: SvgOptimizer | None
+) -> SvgOptimization | None:
+    """Run ``optimizer`` over a successful export's SVG in place."""
+    if optimizer is None or not result.succeeded or result.output_path is None:
+        return None
+    optimization = optimizer.optimize_file(result.output_path)
+    metrics = active_metrics()
+    if metrics is not None:
+        metrics.inc("svg_bytes_saved_total", optimization.saved)
+    return optimization
+
+
+def _maybe_to_svg(  # noqa: PLR0913 - export settings travel together
     mermaid_source: str,
     *,
     output_svg: str | None,
     output_mermaid: Path,
     mermaid_cli_path: str | None,
     builder: MermaidBuilder | None,
+    deadline: Deadline | None = None,
+    optimizer: SvgOptimizer | None = None,
 ) -> tuple[dict[str, object] | None, list[str]]:
     messages: list[str] = []
     export_result: dict[str, object] | None = None
-    output_path = Path(output_svg) if output_svg else output_mermaid.with_suffix(".svg")
-    export = export_mermaid_to_svg(
+    output_path = _svg_output_path(output_svg, output_mermaid)
+    export = _export_with_deadline(
         mermaid_source,
         output_dir=output_path.parent,
         stem=output_path.stem,
         mermaid_cli_path=mermaid_cli_path,
         runner=builder.get_runner() if builder else None,
+        deadline=deadline,
+        # The exporter rewrites output_mermaid itself unless the SVG goes
+        # elsewhere; the caller has already counted that file.
+        count_source=output_path.with_suffix(".mmd") != output_mermaid,
     )
     if export.succeeded:
         messages.append("Mermaid CLI executed successfully")
@@ -786,19 +2527,63 @@ def _maybe_to_svg(
         detail = export.detail or "Mermaid CLI execution failed"
         messages.append(detail)
     export_result = export.to_metadata()
+    optimization = _optimize_export(export, optimizer)
+    if optimization is not None:
+        export_result["optimization"] = optimization.to_metadata()
+        messages.append(
+            f"SVG optimized from {optimization.bytes_before}"
+            f" to {optimization.bytes_after} bytes"
+        )
     return export_result, messages
 
 
-def _write_mermaid_source(path: Path, source: str) -> tuple[str, int]:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(source, encoding="utf-8")
-    size = path.stat().st_size
-    return str(path), size
+def _svg_output_path(output_svg: str | None, output_mermaid: Path) -> Path:
+    return Path(output_svg) if output_svg else output_mermaid.with_suffix(".svg")
 
 
-def _validate_input_schema(payload: Mapping[str, object]) -> dict[str, object] | None:
+def _file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _attach_svg(artifact: dict[str, object], svg_payload: dict[str, object]) -> None:
+    """Store export metadata and, for a written SVG, its content hash."""
+    artifact["svg"] = svg_payload
+    output_path = svg_payload.get("output_path")
+    if svg_payload.get("succeeded") is True and isinstance(output_path, str):
+        artifact["svg_sha256"] = _file_sha256(output_path)
+
+
+def _write_mermaid_source(path: Path, source: str) -> tuple[str, int, str]:
+    """Write ``source`` as UTF-8 bytes; return path, size and SHA-256."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = source.encode("utf-8")
+    path.write_bytes(data)
+    size = len(data)
+    metrics = active_metrics()
+    if metrics is not None:
+        metrics.inc("bytes_written_total", size, kind="mmd")
+    return str(path), size, hashlib.sha256(data).hexdigest()
+
+
+def _validate_input_schema(
+    payload: Mapping[str, object], *, defer_document_items: bool = False
+) -> dict[str, object] | None:
+    """Return a failure payload when ``payload`` does not match INPUT_SCHEMA.
+
+    The generated validator accepts valid payloads quickly; jsonschema only
+    runs to report why a payload was rejected. With ``defer_document_items``
+    document array elements are left to ``_apply_document``.
+    """
+    fast_check = is_valid_input_shell if defer_document_items else is_valid_input
     try:
-        validate_payload(payload, INPUT_SCHEMA)
+        with timed("schema_validation_seconds", schema="input"):
+            if fast_check(payload):
+                return None
+            validate_payload(payload, INPUT_SCHEMA)
     except ValidationErrorType as exc:
         error = exc
         return _failure_payload(
@@ -815,8 +2600,7 @@ def _validate_input_schema(payload: Mapping[str, object]) -> dict[str, object] |
 def _extract_parameters(payload: Mapping[str, object]) -> Mapping[str, object]:
     parameters_obj = payload.get("parameters")
     if isinstance(parameters_obj, Mapping):
-        typed_parameters = cast("Mapping[str, object]", parameters_obj)
-        return MappingProxyType(dict(typed_parameters))
+        return cast("Mapping[str, object]", parameters_obj)
     return _EMPTY_MAPPING
 
 
@@ -850,33 +2634,374 @@ def _extract_export_options(
     return export_svg, output_svg, mermaid_cli_path
 
 
-def _prepare_mermaid_source(
+def _extract_svg_optimizer(parameters: Mapping[str, object]) -> SvgOptimizer | None:
+    option = parameters.get("optimize_svg")
+    if isinstance(option, Mapping):
+        settings = cast("Mapping[str, object]", option)
+        precision = settings.get("precision", DEFAULT_PRECISION)
+        return SvgOptimizer(precision=precision if isinstance(precision, int) else None)
+    return SvgOptimizer() if option is True else None
+
+
+def _precompress_pool(option: bool | PrecompressPool) -> PrecompressPool | None:
+    if isinstance(option, PrecompressPool):
+        return option
+    return shared_precompress_pool() if option else None
+
+
+def _artifact_files(artifact: Mapping[str, object]) -> list[str]:
+    """The ``.mmd`` and, when the export succeeded, the SVG of ``artifact``."""
+    files = [str(artifact["source_path"])]
+    svg_obj = artifact.get("svg")
+    if isinstance(svg_obj, Mapping):
+        svg = cast("Mapping[str, object]", svg_obj)
+        output_path = svg.get("output_path")
+        if svg.get("succeeded") is True and isinstance(output_path, str):
+            files.append(output_path)
+    return files
+
+
+def _start_precompression(
+    parameters: Mapping[str, object], source_path: str | None
+) -> tuple[PrecompressPool | None, list[str]]:
+    """Queue the ``.mmd`` sidecars so they compress while mmdc renders.
+
+    ``source_path`` is ``None`` when the export rewrites the ``.mmd``; it is
+    then queued by :func:`_finish_precompression` instead.
+    """
+    pool = _precompress_pool(parameters.get("precompress") is True)
+    if pool is None or source_path is None:
+        return pool, []
+    pool.submit(source_path)
+    return pool, [source_path]
+
+
+def _finish_precompression(
+    pool: PrecompressPool | None,
+    queued: Sequence[str],
+    mermaid_artifact: dict[str, object],
+    part_artifacts: Sequence[dict[str, object]],
+) -> None:
+    """Queue the remaining files and record the sidecars they will get.
+
+    Compression is left running so it overlaps with the next render, as
+    with :meth:`MermaidBuilder.to_svg`; ``PrecompressPool.wait()`` blocks
+    until the listed sidecars exist.
+    """
+    if pool is None:
+        return
+    for artifact in (mermaid_artifact, *part_artifacts):
+        files = _artifact_files(artifact)
+        pool.submit_all(path for path in files if path not in queued)
+        artifact["precompressed"] = [
+            str(sidecar) for path in files for sidecar in pool.sidecar_paths(path)
+        ]
+
+
+def _extract_reduce_options(
+    parameters: Mapping[str, object],
+) -> tuple[int, tuple[str, ...], ClusterKey] | None:
+    reduce_obj = parameters.get("reduce")
+    if not isinstance(reduce_obj, Mapping):
+        return None
+    options = cast("Mapping[str, object]", reduce_obj)
+    max_nodes_obj = options.get("max_nodes")
+    if not isinstance(max_nodes_obj, int):
+        return None
+    strategies_obj = options.get("strategies")
+    strategies = (
+        tuple(str(name) for name in strategies_obj)
+        if isinstance(strategies_obj, Sequence) and strategies_obj
+        else REDUCTION_STRATEGIES
+    )
+    cluster_by = options.get("cluster_by")
+    key: ClusterKey
+    if cluster_by == "shape":
+        key = _shape_cluster_key
+    elif cluster_by == "group":
+        groups_obj = options.get("groups")
+        groups = (
+            {str(k): str(v) for k, v in groups_obj.items()}
+            if isinstance(groups_obj, Mapping)
+            else {}
+        )
+        key = _mapping_cluster_key(groups)
+    else:
+        separator_obj = options.get("prefix_separator")
+        depth_obj = options.get("prefix_depth")
+        key = _prefix_cluster_key(
+            separator_obj if isinstance(separator_obj, str) and separator_obj else ".",
+            depth_obj if isinstance(depth_obj, int) and depth_obj > 0 else 1,
+        )
+    return max_nodes_obj, strategies, key
+
+
+def _document_item_failure(
+    parameters: Mapping[str, object], error: _DocumentItemError
+) -> dict[str, object]:
+    # The shell validator pinned the payload to exactly these two keys, so
+    # full validation of the rebuilt payload reports jsonschema's own path.
+    payload = {"command": "x_make_mermaid_x", "parameters": parameters}
+    return _validate_input_schema(payload) or _failure_payload(
+        "input payload failed validation",
+        details={"error": str(error), "path": [str(p) for p in error.path]},
+    )
+
+
+def _prepare_mermaid_source(
+    parameters: Mapping[str, object],
+    *,
+    ctx: object | None,
+) -> tuple[MermaidBuilder | None, str, dict[str, object]] | dict[str, object]:
+    document_obj = parameters.get("document")
+    document = None
+    if isinstance(document_obj, Mapping):
+        document = cast("Mapping[str, object]", document_obj)
+    builder: MermaidBuilder | None = None
+    summary_data: dict[str, object] = {}
+    document_source: str | None = None
+    canonical = parameters.get("canonical") is True
+    if document is not None:
+        builder = MermaidBuilder(ctx=ctx)
+        try:
+            summary_data = _apply_document(builder, document)
+        except _DocumentItemError as exc:
+            return _document_item_failure(parameters, exc)
+        reduce_options = _extract_reduce_options(parameters)
+        if reduce_options is not None and summary_data.get("diagram") == _FLOW:
+            max_nodes, strategies, key = reduce_options
+            report = builder.reduce(max_nodes, strategies=strategies, cluster_by=key)
+            summary_data["reduction"] = report.to_summary()
+        if canonical:
+            builder.canonical()
+        document_source = builder.source()
+
+    source_obj = parameters.get("source")
+    explicit_source = source_obj if isinstance(source_obj, str) and source_obj else None
+    if explicit_source is not None and canonical:
+        explicit_source = canonical_source(explicit_source)
+    mermaid_source = explicit_source if explicit_source is not None else document_source
+    if mermaid_source is None:
+        return _failure_payload(
+            "no Mermaid document or source provided",
+            details={"reason": "document and source were empty"},
+        )
+    return builder, mermaid_source, summary_data
+
+
+@dataclass(frozen=True)
+class _RenderBudget:
+    max_seconds: float | None
+    max_svg_bytes: int | None
+    action: str
+    model: RenderCostModel
+
+    def fits(self, estimate: RenderEstimate) -> bool:
+        return not estimate.exceeds(
+            max_seconds=self.max_seconds, max_svg_bytes=self.max_svg_bytes
+        )
+
+    def limits(self) -> dict[str, object]:
+        return {"max_seconds": self.max_seconds, "max_svg_bytes": self.max_svg_bytes}
+
+
+def _extract_budget(parameters: Mapping[str, object]) -> _RenderBudget | None:
+    budget_obj = parameters.get("budget")
+    if not isinstance(budget_obj, Mapping):
+        return None
+    options = cast("Mapping[str, object]", budget_obj)
+    seconds_obj = options.get("max_seconds")
+    bytes_obj = options.get("max_svg_bytes")
+    action_obj = options.get("action")
+    model_obj = options.get("model")
+    return _RenderBudget(
+        max_seconds=(
+            float(seconds_obj) if isinstance(seconds_obj, (int, float)) else None
+        ),
+        max_svg_bytes=bytes_obj if isinstance(bytes_obj, int) else None,
+        action=action_obj if isinstance(action_obj, str) else "reject",
+        model=(
+            RenderCostModel.from_json(cast("Mapping[str, object]", model_obj))
+            if isinstance(model_obj, Mapping)
+            else DEFAULT_COST_MODEL
+        ),
+    )
+
+
+def _largest_fitting(upper: int, fits: Callable[[int], bool]) -> int | None:
+    """Binary search the largest ``n`` in ``1..upper`` for which ``fits(n)``."""
+    low, high, best = 1, upper, None
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best, low = middle, middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def _budget_failure(
+    budget: _RenderBudget, report: Mapping[str, object]
+) -> dict[str, object]:
+    return _failure_payload(
+        "document exceeds render budget",
+        details={"budget": dict(report), "limits": budget.limits()},
+    )
+
+
+def _apply_budget(
+    budget: _RenderBudget,
+    doc: MermaidDoc | None,
+    mermaid_source: str,
+    summary_data: dict[str, object],
+) -> tuple[MermaidDoc | None, list[MermaidDoc]] | dict[str, object]:
+    """Enforce ``budget`` and return a replacement document and split parts.
+
+    ``doc`` is ``None`` when the caller supplied raw source; such payloads can
+    only be accepted or rejected.
+    """
+    features = (
+        extract_features(doc)
+        if doc is not None
+        else features_from_source(mermaid_source)
+    )
+    estimate = budget.model.estimate(features)
+    report: dict[str, object] = {
+        "action": budget.action,
+        "estimate": estimate.to_metadata(),
+        "exceeded": not budget.fits(estimate),
+    }
+    summary_data["budget"] = report
+    if budget.fits(estimate):
+        return None, []
+    if budget.action == "reject" or doc is None or doc.kind != _FLOW:
+        return _budget_failure(budget, report)
+
+    def _doc_fits(candidate: MermaidDoc) -> bool:
+        return budget.fits(budget.model.estimate(extract_features(candidate)))
+
+    if budget.action == "reduce":
+        best = _largest_fitting(
+            features.nodes, lambda n: _doc_fits(reduce_flowchart(doc, n)[0])
+        )
+        if best is None:
+            return _budget_failure(budget, report)
+        reduced, reduction = reduce_flowchart(doc, best)
+        report["reduction"] = reduction.to_summary()
+        report["estimate_after"] = budget.model.estimate(
+            extract_features(reduced)
+        ).to_metadata()
+        return reduced, []
+
+    best = _largest_fitting(
+        features.nodes,
+        lambda n: all(_doc_fits(part) for part in split_flowchart(doc, n)[0]),
+    )
+    if best is None:
+        return _budget_failure(budget, report)
+    parts, cut_edges = split_flowchart(doc, best)
+    report["parts"] = len(parts)
+    report["cut_edges"] = cut_edges
+    return None, parts
+
+
+def _write_split_parts(  # noqa: PLR0913 - export settings travel together
+    parts: Sequence[MermaidDoc],
+    *,
+    output_mermaid: Path,
+    export_options: tuple[bool, str | None, str | None],
+    builder: MermaidBuilder | None,
+    deadline: Deadline | None,
+    optimizer: SvgOptimizer | None = None,
+    export_seconds: float | None = None,
+) -> tuple[list[dict[str, object]], list[str]]:
+    """Write each part and export it.
+
+    ``deadline`` bounds all exports together; without one, each export gets
+    its own ``export_seconds``, since the budget sized every part to fit that
+    limit alone.
+    """
+    export_svg, output_svg, mermaid_cli_path = export_options
+    export = export_svg or output_svg is not None
+    svg_base = Path(output_svg) if output_svg else output_mermaid.with_suffix(".svg")
+    artifacts: list[dict[str, object]] = []
+    messages: list[str] = []
+    for index, part in enumerate(parts, start=1):
+        part_source = MermaidBuilder.from_doc(part).source()
+        part_path = output_mermaid.with_name(
+            f"{output_mermaid.stem}.part{index}{output_mermaid.suffix}"
+        )
+        path_str, size, digest = _write_mermaid_source(part_path, part_source)
+        artifact: dict[str, object] = {
+            "source_path": path_str,
+            "source_bytes": size,
+            "source_sha256": digest,
+        }
+        if export:
+            svg_payload, export_messages = _maybe_to_svg(
+                part_source,
+                output_svg=str(svg_base.with_name(f"{svg_base.stem}.part{index}.svg")),
+                output_mermaid=part_path,
+                mermaid_cli_path=mermaid_cli_path,
+                builder=builder,
+                deadline=_export_deadline(deadline, export_seconds),
+                optimizer=optimizer,
+            )
+            messages.extend(export_messages)
+            if svg_payload is not None:
+                _attach_svg(artifact, svg_payload)
+        artifacts.append(artifact)
+    messages.append(f"document split into {len(parts)} parts to fit render budget")
+    return artifacts, messages
+
+
+def _resolve_deadline(parameters: Mapping[str, object]) -> Deadline | None:
+    """Deadline for all of a run's exports, from ``timeout_seconds``."""
+    timeout_obj = parameters.get("timeout_seconds")
+    if isinstance(timeout_obj, (int, float)) and timeout_obj > 0:
+        return Deadline.after(float(timeout_obj))
+    return None
+
+
+def _budget_seconds(parameters: Mapping[str, object]) -> float | None:
+    """The budget's time limit, which applies to each export on its own."""
+    budget = _extract_budget(parameters)
+    return budget.max_seconds if budget is not None else None
+
+
+def _export_deadline(
+    deadline: Deadline | None, export_seconds: float | None
+) -> Deadline | None:
+    """``deadline``, else a fresh one of ``export_seconds`` for one export."""
+    if deadline is None and export_seconds is not None:
+        return Deadline.after(export_seconds)
+    return deadline
+
+
+def _prepare_budgeted_source(
     parameters: Mapping[str, object],
     *,
     ctx: object | None,
-) -> tuple[MermaidBuilder | None, str, dict[str, object]] | dict[str, object]:
-    document_obj = parameters.get("document")
-    document = None
-    if isinstance(document_obj, Mapping):
-        typed_document = cast("Mapping[str, object]", document_obj)
-        document = MappingProxyType(dict(typed_document))
-    builder: MermaidBuilder | None = None
-    summary_data: dict[str, object] = {}
-    document_source: str | None = None
-    if document is not None:
-        builder = MermaidBuilder(ctx=ctx)
-        summary_data = _apply_document(builder, document)
-        document_source = builder.source()
-
-    source_obj = parameters.get("source")
-    explicit_source = source_obj if isinstance(source_obj, str) and source_obj else None
-    mermaid_source = explicit_source if explicit_source is not None else document_source
-    if mermaid_source is None:
-        return _failure_payload(
-            "no Mermaid document or source provided",
-            details={"reason": "document and source were empty"},
-        )
-    return builder, mermaid_source, summary_data
+) -> (
+    tuple[MermaidBuilder | None, str, dict[str, object], list[MermaidDoc]]
+    | dict[str, object]
+):
+    prepared = _prepare_mermaid_source(parameters, ctx=ctx)
+    if isinstance(prepared, dict):
+        return prepared
+    builder, mermaid_source, summary_data = prepared
+    budget = _extract_budget(parameters)
+    if budget is None:
+        return builder, mermaid_source, summary_data, []
+    explicit_source = isinstance(parameters.get("source"), str)
+    doc = builder.doc if builder is not None and not explicit_source else None
+    outcome = _apply_budget(budget, doc, mermaid_source, summary_data)
+    if isinstance(outcome, dict):
+        return outcome
+    replacement, parts = outcome
+    if replacement is not None and builder is not None:
+        mermaid_source = builder.replace_doc(replacement).source()
+    return builder, mermaid_source, summary_data, parts
 
 
 def _compose_summary(
@@ -916,7 +3041,10 @@ def _compose_success_result(
 
 def _validate_output_schema(result: Mapping[str, object]) -> dict[str, object] | None:
     try:
-        validate_payload(result, OUTPUT_SCHEMA)
+        with timed("schema_validation_seconds", schema="output"):
+            if is_valid_output(result):
+                return None
+            validate_payload(result, OUTPUT_SCHEMA)
     except ValidationErrorType as exc:
         error = exc
         return _failure_payload(
@@ -939,19 +3067,93 @@ class MermaidBuilder:
       src = m.source()
     """
 
-    def __init__(
+    def __init__(  # noqa: PLR0913 - export settings are keyword-only
         self,
         direction: str = "LR",
         ctx: object | None = None,
         *,
         runner: CommandRunner | None = None,
         mermaid_cli: str | None = None,
+        export_timeout: float | None = None,
+        runner_factory: Callable[[], CommandRunner] | None = None,
     ) -> None:
         self._ctx = ctx
         self._doc = MermaidDoc(kind=_FLOW, header=f"{_FLOW} {direction}")
         self._runner: CommandRunner | None = runner
+        self._runner_factory = runner_factory
         self._mermaid_cli: str | None = mermaid_cli
-        self._last_export_result: ExportResult | None = None
+        self._export_timeout: float | None = export_timeout
+        # Last export result and factory-built runner are kept per thread.
+        self._local = threading.local()
+        self._sort_directives = False
+        self._dedupe_lines = False
+        self._compact_ids = False
+
+    @classmethod
+    def from_doc(
+        cls,
+        doc: MermaidDoc,
+        ctx: object | None = None,
+        *,
+        runner: CommandRunner | None = None,
+        mermaid_cli: str | None = None,
+        runner_factory: Callable[[], CommandRunner] | None = None,
+    ) -> Self:
+        """Wrap an existing document, e.g. a reduced or split flowchart."""
+        builder = cls(
+            ctx=ctx,
+            runner=runner,
+            mermaid_cli=mermaid_cli,
+            runner_factory=runner_factory,
+        )
+        return builder.replace_doc(doc)
+
+    def to_bytes(self, *, compress: bool = True) -> bytes:
+        """Snapshot of the document and the source and export settings.
+
+        The context, runners and per-thread results are not included; pass
+        them to :meth:`from_bytes`. Pickling a builder uses the same snapshot.
+        """
+        state = (
+            _doc_state(self._doc),
+            self._sort_directives,
+            self._dedupe_lines,
+            self._compact_ids,
+            self._mermaid_cli,
+            self._export_timeout,
+        )
+        return _dump_snapshot(_SNAPSHOT_BUILDER, state, compress=compress)
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes,
+        ctx: object | None = None,
+        *,
+        runner: CommandRunner | None = None,
+        runner_factory: Callable[[], CommandRunner] | None = None,
+    ) -> Self:
+        """Rebuild a builder from :meth:`to_bytes` output of a trusted source."""
+        doc, settings = _load_snapshot(data, _SNAPSHOT_BUILDER, 5)
+        sort_directives, dedupe_lines, compact_ids, mermaid_cli, export_timeout = cast(
+            "tuple[bool, bool, bool, str | None, float | None]", settings
+        )
+        builder = cls(
+            ctx=ctx,
+            runner=runner,
+            mermaid_cli=mermaid_cli,
+            export_timeout=export_timeout,
+            runner_factory=runner_factory,
+        )
+        builder.canonical(
+            sort_directives=sort_directives,
+            dedupe_lines=dedupe_lines,
+            compact_ids=compact_ids,
+        )
+        return builder.replace_doc(doc)
+
+    def __reduce__(self) -> tuple[Callable[[bytes], Self], tuple[bytes]]:
+        return (type(self).from_bytes, (self.to_bytes(),))
 
     def _is_verbose(self) -> bool:
         value: object = getattr(self._ctx, "verbose", False)
@@ -964,8 +3166,13 @@ class MermaidBuilder:
     def set_directive(self, directive_json: str | DirectivePayload) -> Self:
         """Add a directive block like %%{init: { 'theme':'dark' }}%%."""
         if isinstance(directive_json, dict):
-            # minimal serializer without imports
-            txt = json.dumps(directive_json, separators=(",", ":"))
+            # Sorted keys keep the directive text independent of dict order.
+            txt = json.dumps(
+                directive_json,
+                separators=(",", ":"),
+                sort_keys=True,
+                ensure_ascii=False,
+            )
             self._doc.directives.append(f"%%{{init: {txt}}}%%")
         else:
             self._doc.directives.append(str(directive_json))
@@ -1063,23 +3270,9 @@ class MermaidBuilder:
         """Add a node; shape can be: [], (), (()) , {} , [[]], >, etc."""
         if self._doc.kind != _FLOW:
             return self
-        if label is None:
-            self._doc.lines.append(f"{node_id}")
-            return self
-        shape_map = {
-            "rect": ("[", "]"),
-            "round": ("(", ")"),
-            "stadium": ("((", "))"),
-            "subroutine": ("[[", "]]"),
-            "cylinder": ("[(", ")]"),
-            "circle": ("((", "))"),
-            "asym": (">", "]"),
-        }
-        if shape and shape in shape_map:
-            left_delim, right_delim = shape_map[shape]
-            self._doc.lines.append(f"{node_id}{left_delim}{_esc(label)}{right_delim}")
-        else:
-            self._doc.lines.append(f'{node_id}["{_esc(label)}"]')
+        flow_node = FlowNode(node_id, label, shape)
+        self._doc.nodes[node_id] = flow_node
+        self._append_ref(_ROLE_NODE, (node_id,), _render_flow_node(flow_node))
         return self
 
     def edge(
@@ -1092,41 +3285,140 @@ class MermaidBuilder:
     ) -> Self:
         if self._doc.kind != _FLOW:
             return self
-        mid = f"|{_esc(label)}|" if label else ""
-        sfx = f" {style}" if style else ""
-        self._doc.lines.append(f"{src} {arrow}{mid} {dst}{sfx}")
+        flow_edge = FlowEdge(src, dst, label, arrow, style)
+        self._doc.edges.append(flow_edge)
+        self._append_ref(_ROLE_EDGE, (src, dst), _render_flow_edge(flow_edge))
         return self
 
     def subgraph(self, title: str, body: Iterable[str] | None = None) -> Self:
         if self._doc.kind != _FLOW:
             return self
-        self._doc.lines.append(f"subgraph {_esc(title)}")
+        self._append_ref(_ROLE_SUBGRAPH, (), f"subgraph {_esc(title)}")
         if body:
             for ln in body:
-                self._doc.lines.append(ln)
-        self._doc.lines.append("end")
+                self._append_ref(_ROLE_SUBGRAPH, (), ln)
+        self._append_ref(_ROLE_SUBGRAPH, (), "end")
         return self
 
+    @contextmanager
+    def cluster(
+        self,
+        title: str,
+        *,
+        cluster_id: str | None = None,
+        direction: str | None = None,
+    ) -> Iterator[Self]:
+        """Nest everything added inside the ``with`` block in a cluster.
+
+        Flowcharts get a ``subgraph``, state diagrams a composite state;
+        other kinds are left untouched. Clusters nest by nesting ``with``
+        blocks, and lines are written as they are added, so building is
+        linear in the size of the diagram::
+
+            with builder.cluster("payments", cluster_id="pay") as pay:
+                pay.node("api")
+                with pay.cluster("workers"):
+                    pay.node("w1")
+        """
+        doc = self._doc
+        if doc.kind == _FLOW:
+            opening = (
+                f'subgraph {cluster_id} ["{_esc(title)}"]'
+                if cluster_id
+                else f"subgraph {_esc(title)}"
+            )
+            closing = "end"
+        elif doc.kind == _STATE:
+            opening, closing = f"{_state_cluster_name(title, cluster_id)} {{", "}"
+        else:
+            yield self
+            return
+        ids = (cluster_id,) if cluster_id and doc.kind == _FLOW else ()
+        self._append_ref(_ROLE_SUBGRAPH, ids, opening)
+        if direction:
+            self._append_ref(_ROLE_SUBGRAPH, (), f"direction {direction}")
+        try:
+            yield self
+        finally:
+            # Close even when the block raised. A block that switched to a new
+            # diagram has discarded the one it opened on, so nothing is closed.
+            if self._doc is doc:
+                self._append_ref(_ROLE_SUBGRAPH, (), closing)
+
     def style_node(self, node_id: str, css: str) -> Self:
         if self._doc.kind == _FLOW:
-            self._doc.lines.append(f"style {node_id} {_esc(css)}")
+            self._append_ref(_ROLE_STYLE, (node_id,), f"style {node_id} {_esc(css)}")
         return self
 
     def link_style(self, idx: int, css: str) -> Self:
         if self._doc.kind == _FLOW:
-            self._doc.lines.append(f"linkStyle {idx} {_esc(css)}")
+            self._append_ref(_ROLE_LINK_STYLE, (), f"linkStyle {idx} {_esc(css)}")
         return self
 
     def click(self, node_id: str, url: str, tooltip: str | None = None) -> Self:
         if self._doc.kind == _FLOW:
             if tooltip:
-                self._doc.lines.append(
-                    f'click {node_id} "{_esc(url)}" "{_esc(tooltip)}"'
+                self._append_ref(
+                    _ROLE_CLICK,
+                    (node_id,),
+                    f'click {node_id} "{_esc(url)}" "{_esc(tooltip)}"',
                 )
             else:
-                self._doc.lines.append(f'click {node_id} "{_esc(url)}"')
+                self._append_ref(
+                    _ROLE_CLICK, (node_id,), f'click {node_id} "{_esc(url)}"'
+                )
+        return self
+
+    def _append_ref(self, role: str, ids: tuple[str, ...], line: str) -> None:
+        self._doc.line_refs[len(self._doc.lines)] = (role, ids)
+        self._doc.lines.append(line)
+
+    def merge(
+        self,
+        sources: (
+            Mapping[str, MermaidDoc | MermaidBuilder]
+            | Iterable[MermaidDoc | MermaidBuilder]
+        ),
+        *,
+        separator: str = DEFAULT_NAMESPACE_SEPARATOR,
+        subgraphs: bool = False,
+        direction: str | None = None,
+    ) -> Self:
+        """Replace the current document with :func:`merge_docs` of ``sources``."""
+        self._doc = merge_docs(
+            sources, separator=separator, subgraphs=subgraphs, direction=direction
+        )
         return self
 
+    def reduce(
+        self,
+        max_nodes: int,
+        *,
+        strategies: Sequence[str] = REDUCTION_STRATEGIES,
+        cluster_by: ClusterKey | None = None,
+    ) -> ReductionReport:
+        """Shrink the current flowchart to at most ``max_nodes`` nodes in place.
+
+        ``cluster_by`` maps a node to its cluster key; the default groups ids
+        by their first ``.``-separated segment.
+        """
+        if self._doc.kind != _FLOW:
+            message = "reduce() only supports flowchart diagrams"
+            raise ValueError(message)
+        reduced, report = reduce_flowchart(
+            self._doc,
+            max_nodes,
+            strategies=strategies,
+            cluster_by=cluster_by,
+        )
+        self._doc = reduced
+        if self._is_verbose():
+            _info(
+                f"[mermaid] reduced flowchart from {report.original_nodes} to "
+                f"{report.nodes} nodes"
+            )
+        return report
+
     # Sequence API
 
     def participant(self, pid: str, label: str | None = None) -> Self:
@@ -1306,11 +3598,11 @@ class MermaidBuilder:
 
     # GitGraph
 
-    def git_commit(self, msg: str | None = None) -> Self:
+    def git_commit(
+        self, msg: str | None = None, *, commit_id: str | None = None
+    ) -> Self:
         if self._doc.kind == _GIT:
-            tag_part = f'tag: "{_esc(msg)}"' if msg else ""
-            entry = f"commit {tag_part}".rstrip()
-            self._doc.lines.append(entry)
+            self._doc.lines.append(_git_entry("commit", commit_id, msg))
         return self
 
     def git_branch(self, name: str) -> Self:
@@ -1323,9 +3615,11 @@ class MermaidBuilder:
             self._doc.lines.append(f"checkout {name}")
         return self
 
-    def git_merge(self, name: str) -> Self:
+    def git_merge(
+        self, name: str, *, commit_id: str | None = None, tag: str | None = None
+    ) -> Self:
         if self._doc.kind == _GIT:
-            self._doc.lines.append(f"merge {name}")
+            self._doc.lines.append(_git_entry(f"merge {name}", commit_id, tag))
         return self
 
     # Mindmap
@@ -1338,6 +3632,16 @@ class MermaidBuilder:
                 self._doc.lines.append(f"{indent}{_esc(part)}")
         return self
 
+    def mindmap_entry(self, depth: int, text: str) -> Self:
+        """Add one node ``depth`` levels below the root (depth 0).
+
+        Unlike :meth:`mindmap_node`, ancestors are not re-emitted; callers
+        walking a tree emit each node once, in pre-order.
+        """
+        if self._doc.kind == _MINDMAP:
+            self._doc.lines.append(f"{'  ' * depth}{_esc(text)}")
+        return self
+
     # Requirement
 
     def req(self, kind: str, ident: str, attrs: dict[str, str]) -> Self:
@@ -1376,72 +3680,254 @@ class MermaidBuilder:
 
     # Output
 
-    def source(self) -> str:
-        parts: list[str] = []
-        parts.extend(self._doc.directives)
-        parts.extend(self._doc.comments)
-        parts.append(self._doc.header)
-        parts.extend(self._doc.lines)
-        return "\n".join(parts) + "\n"
+    def canonical(
+        self,
+        *,
+        sort_directives: bool = False,
+        dedupe_lines: bool = True,
+        compact_ids: bool = False,
+    ) -> Self:
+        """Set the :meth:`source` defaults used by ``save`` and exports."""
+        self._sort_directives = sort_directives
+        self._dedupe_lines = dedupe_lines
+        self._compact_ids = compact_ids
+        return self
+
+    def source(
+        self,
+        *,
+        sort_directives: bool | None = None,
+        dedupe_lines: bool | None = None,
+        compact_ids: bool | None = None,
+    ) -> str:
+        """Mermaid text with ``\\n`` line endings and no trailing whitespace.
+
+        ``sort_directives`` orders the ``%%{...}%%`` lines, which otherwise
+        keep the order their overrides apply in; ``dedupe_lines`` drops
+        adjacent duplicate directives and repeated flowchart declarations
+        (see :func:`canonical_source`; edges are kept); ``compact_ids``
+        writes flowcharts with short node ids (see :func:`compact_flowchart`
+        and :meth:`get_last_id_map`). All default to the settings from
+        :meth:`canonical`.
+        """
+        if sort_directives is None:
+            sort_directives = self._sort_directives
+        if dedupe_lines is None:
+            dedupe_lines = self._dedupe_lines
+        if compact_ids is None:
+            compact_ids = self._compact_ids
+        with timed("source_seconds"):
+            doc = self._doc
+            if compact_ids:
+                doc, self._local.last_id_map = compact_flowchart(doc)
+            directives = sorted(doc.directives) if sort_directives else doc.directives
+            lines = doc.lines
+            if dedupe_lines:
+                directives = _dedupe_adjacent(directives)
+                if doc.kind == _FLOW:
+                    lines = _dedupe_flowchart_lines(lines)
+            return _join_canonical([*directives, *doc.comments, doc.header, *lines])
 
     def save(self, path: str = "diagram.mmd") -> str:
         src = self.source()
         path_obj = Path(path)
-        path_obj.write_text(src, encoding="utf-8")
+        # Bytes, not text mode, so line endings do not depend on the platform.
+        path_obj.write_bytes(src.encode("utf-8"))
+        metrics = active_metrics()
+        if metrics is not None:
+            metrics.inc("bytes_written_total", len(src.encode("utf-8")), kind="mmd")
         if self._is_verbose():
             _info(f"[mermaid] saved mermaid source to {path}")
         return str(path_obj)
 
-    def to_svg(
+    def to_svg(  # noqa: PLR0913 - export settings travel together
         self,
         mmd_path: str | None = None,
         svg_path: str | None = None,
         mmdc_cmd: str | None = None,
         extra_args: list[str] | None = None,
+        timeout: float | Deadline | None = None,
+        *,
+        optimizer: SvgOptimizer | None = None,
+        precompress: bool | PrecompressPool = False,
     ) -> str | None:
         """Convert Mermaid to SVG via mermaid-cli (mmdc) if available.
 
+        ``timeout`` (seconds or a shared ``Deadline``) bounds the mmdc run and
+        defaults to the builder's ``export_timeout``. ``optimizer`` shrinks
+        the written SVG in place; see :meth:`get_last_svg_optimization`.
+        ``precompress`` (``True`` for the shared pool, or a ``PrecompressPool``)
+        queues ``.gz``/``.br`` sidecars of the SVG and ``.mmd`` in the background.
         Returns SVG path on success, or None if CLI not found or conversion failed.
         """
-        source_text = self.source()
-        # Determine output naming
+        result = self.export_svg(
+            mmd_path=mmd_path,
+            svg_path=svg_path,
+            mmdc_cmd=mmdc_cmd,
+            extra_args=extra_args,
+            timeout=timeout,
+            optimizer=optimizer,
+            precompress=precompress,
+        )
+        if result.succeeded and result.output_path is not None:
+            return str(result.output_path)
+        if self._is_verbose():
+            output_dir, stem = self._export_target(mmd_path, svg_path)
+            _info(
+                "[mermaid] mmdc export failed; retained Mermaid at",
+                str((output_dir / f"{stem}.mmd").resolve()),
+            )
+        return None
+
+    @staticmethod
+    def _export_target(mmd_path: str | None, svg_path: str | None) -> tuple[Path, str]:
         if svg_path:
             svg_candidate = Path(svg_path)
-            output_dir = svg_candidate.parent or Path()
-            stem = svg_candidate.stem
-        elif mmd_path:
+            return svg_candidate.parent or Path(), svg_candidate.stem
+        if mmd_path:
             mmd_candidate = Path(mmd_path)
-            output_dir = mmd_candidate.parent or Path()
-            stem = mmd_candidate.stem
-        else:
-            output_dir = Path()
-            stem = "diagram"
+            return mmd_candidate.parent or Path(), mmd_candidate.stem
+        return Path(), "diagram"
+
+    def export_svg(  # noqa: PLR0913 - export settings travel together
+        self,
+        mmd_path: str | None = None,
+        svg_path: str | None = None,
+        mmdc_cmd: str | None = None,
+        extra_args: list[str] | None = None,
+        timeout: float | Deadline | None = None,
+        *,
+        optimizer: SvgOptimizer | None = None,
+        precompress: bool | PrecompressPool = False,
+    ) -> ExportResult:
+        """Like :meth:`to_svg` but return this call's full ``ExportResult``.
+
+        Safe to call from several threads on one builder as long as each call
+        targets its own output path.
+        """
+        source_text = self.source()
+        output_dir, stem = self._export_target(mmd_path, svg_path)
 
         cli_path = mmdc_cmd or self._mermaid_cli
-        result = export_mermaid_to_svg(
+        limit = timeout if timeout is not None else self._export_timeout
+        result = _export_with_deadline(
             source_text,
             output_dir=output_dir,
             stem=stem,
             mermaid_cli_path=cli_path,
-            runner=self._runner,
+            runner=self.get_runner(),
             extra_args=extra_args,
+            deadline=(
+                Deadline.after(limit) if isinstance(limit, (int, float)) else limit
+            ),
         )
-        self._last_export_result = result
-
-        if result.succeeded and result.output_path is not None:
-            return str(result.output_path)
-        if self._is_verbose():
-            _info(
-                "[mermaid] mmdc export failed; retained Mermaid at",
-                str((output_dir / f"{stem}.mmd").resolve()),
-            )
-        return None
+        self._local.last_export = result
+        self._local.last_optimization = _optimize_export(result, optimizer)
+        pool = _precompress_pool(precompress)
+        if pool is not None and result.succeeded and result.output_path is not None:
+            pool.submit_all([*result.inputs.values(), result.output_path])
+        return result
+
+    def estimate_render_cost(
+        self, model: RenderCostModel | None = None
+    ) -> RenderEstimate:
+        """Predict mmdc render time and SVG size for the current document."""
+        return (model or DEFAULT_COST_MODEL).estimate(extract_features(self._doc))
+
+    def measure_render(
+        self,
+        mmd_path: str | None = None,
+        svg_path: str | None = None,
+        mmdc_cmd: str | None = None,
+    ) -> RenderSample | None:
+        """Export via :meth:`to_svg` and return a calibration sample on success."""
+        features = extract_features(self._doc)
+        started = time.perf_counter()
+        result = self.export_svg(
+            mmd_path=mmd_path, svg_path=svg_path, mmdc_cmd=mmdc_cmd
+        )
+        elapsed = time.perf_counter() - started
+        return RenderSample.from_export(features, elapsed, result)
 
     def get_last_export_result(self) -> ExportResult | None:
-        return self._last_export_result
+        """Result of the calling thread's most recent export, if any."""
+        return cast("ExportResult | None", getattr(self._local, "last_export", None))
+
+    def get_last_id_map(self) -> dict[str, str]:
+        """Original to short ids from the calling thread's last compacted source."""
+        return dict(cast("dict[str, str]", getattr(self._local, "last_id_map", {})))
+
+    def get_last_svg_optimization(self) -> SvgOptimization | None:
+        """Byte counts from the calling thread's most recent optimized export."""
+        return cast(
+            "SvgOptimization | None", getattr(self._local, "last_optimization", None)
+        )
 
     def get_runner(self) -> CommandRunner | None:
-        return self._runner
+        """Shared runner, else one built by ``runner_factory`` for this thread."""
+        if self._runner is not None or self._runner_factory is None:
+            return self._runner
+        runner = cast("CommandRunner | None", getattr(self._local, "runner", None))
+        if runner is None:
+            runner = self._runner_factory()
+            self._local.runner = runner
+        return runner
+
+    @property
+    def doc(self) -> MermaidDoc:
+        return self._doc
+
+    def replace_doc(self, doc: MermaidDoc) -> Self:
+        self._doc = doc
+        return self
+
+
+@dataclass(frozen=True)
+class ExportJob:
+    """One SVG export for :func:`export_concurrently`."""
+
+    builder: MermaidBuilder
+    svg_path: str
+    mmdc_cmd: str | None = None
+    extra_args: tuple[str, ...] = ()
+    timeout: float | Deadline | None = None
+    optimizer: SvgOptimizer | None = None
+    precompress: bool | PrecompressPool = False
+
+
+def _run_export_job(job: ExportJob) -> ExportResult:
+    return job.builder.export_svg(
+        svg_path=job.svg_path,
+        mmdc_cmd=job.mmdc_cmd,
+        extra_args=list(job.extra_args) or None,
+        timeout=job.timeout,
+        optimizer=job.optimizer,
+        precompress=job.precompress,
+    )
+
+
+def export_concurrently(
+    jobs: Iterable[ExportJob], *, max_workers: int | None = None
+) -> list[ExportResult]:
+    """Run ``jobs`` on a thread pool and return results in job order.
+
+    Jobs may share builders; each must write to a distinct SVG path because
+    the exporter also writes ``<stem>.mmd`` next to it.
+    """
+    pending = list(jobs)
+    targets: set[Path] = set()
+    for job in pending:
+        target = Path(job.svg_path).resolve()
+        if target in targets:
+            message = f"duplicate export target: {job.svg_path}"
+            raise ValueError(message)
+        targets.add(target)
+    if not pending:
+        return []
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="mermaid-export"
+    ) as pool:
+        return list(pool.map(_run_export_job, pending))
 
 
 def main() -> str:
@@ -1458,14 +3944,156 @@ def main() -> str:
     return svg or "example.mmd"
 
 
+def _memo_key(parameters: Mapping[str, object], spools: Spools | None = None) -> str:
+    export_svg, output_svg, mermaid_cli_path = _extract_export_options(parameters)
+    exporting = export_svg or output_svg is not None
+    keyed: Mapping[str, object] = parameters
+    if spools:
+        # Spooled arrays are left out of ``parameters``; key on their content.
+        digests = {array: _file_sha256(path) for array, path in spools.items()}
+        keyed = {"parameters": parameters, "spooled": digests}
+    return payload_key(
+        keyed,
+        schema_version=SCHEMA_VERSION,
+        cli_version=mermaid_cli_version(mermaid_cli_path) if exporting else None,
+    )
+
+
+def _result_artifacts(result: Mapping[str, object]) -> list[str] | None:
+    """Files a success result points at, or ``None`` when an export failed."""
+    mermaid = cast("Mapping[str, object]", result["mermaid"])
+    summary = cast("Mapping[str, object]", result["summary"])
+    parts = cast("list[Mapping[str, object]]", summary.get("parts") or [])
+    files: list[str] = []
+    for artifact in (mermaid, *parts):
+        svg = artifact.get("svg")
+        if isinstance(svg, Mapping) and svg.get("succeeded") is not True:
+            return None
+        # Sidecars are still being written in the background; see
+        # _finish_precompression.
+        files.extend(_artifact_files(artifact))
+    return files
+
+
 def main_json(
-    payload: Mapping[str, object], *, ctx: object | None = None
+    payload: Mapping[str, object],
+    *,
+    ctx: object | None = None,
+    trusted: bool = False,
+    memo: ResultMemo | None = None,
 ) -> dict[str, object]:
-    schema_failure = _validate_input_schema(payload)
+    """Run one JSON payload and return the success or failure document.
+
+    ``trusted`` skips re-validating the generated output, for callers that
+    feed back payloads this tool produced itself. ``memo`` (by default the
+    one set with :func:`configure_result_memo`) returns stored results for
+    payloads seen before, while their artifacts are unchanged; such results
+    carry ``summary.memoized``.
+    """
+    # Document elements are validated while they are applied; see
+    # _apply_document.
+    schema_failure = _validate_input_schema(payload, defer_document_items=True)
     if schema_failure:
         return schema_failure
 
-    parameters = _extract_parameters(payload)
+    return _run_memoized(
+        _extract_parameters(payload), ctx=ctx, trusted=trusted, memo=memo
+    )
+
+
+def _run_memoized(
+    parameters: Mapping[str, object],
+    *,
+    ctx: object | None,
+    trusted: bool,
+    memo: ResultMemo | None,
+    spools: Spools | None = None,
+) -> dict[str, object]:
+    memo = memo if memo is not None else _RESULT_MEMO
+    if memo is None:
+        return _run_parameters(parameters, ctx=ctx, trusted=trusted, spools=spools)
+    key = _memo_key(parameters, spools)
+    cached = memo.get(key)
+    if cached is not None:
+        cast("dict[str, object]", cached["summary"])["memoized"] = True
+        return cached
+    result = _run_parameters(parameters, ctx=ctx, trusted=trusted, spools=spools)
+    if result.get("status") == "success":
+        artifacts = _result_artifacts(result)
+        if artifacts is not None:
+            memo.put(key, result, artifacts)
+    return result
+
+
+def _flush_run_metrics() -> None:
+    """Publish metrics; a failing callback or file write never fails the run."""
+    try:
+        flush_metrics()
+    except Exception as exc:  # noqa: BLE001 - metrics are best effort
+        _LOGGER.warning("metrics flush failed: %s", exc)
+
+
+def _new_doc_list() -> list[MermaidDoc]:
+    return []
+
+
+@dataclass(frozen=True)
+class _WrittenSource:
+    """The ``.mmd`` a run wrote, and what its exports need."""
+
+    path: str
+    size: int
+    sha256: str
+    summary_data: dict[str, object]
+    builder: MermaidBuilder | None = None
+    # ``None`` when the source was streamed to disk; read back to export.
+    text: str | None = None
+    parts: list[MermaidDoc] = field(default_factory=_new_doc_list)
+
+
+def _write_built_source(
+    parameters: Mapping[str, object], output_mermaid: Path, *, ctx: object | None
+) -> _WrittenSource | dict[str, object]:
+    builder_result = _prepare_budgeted_source(parameters, ctx=ctx)
+    if isinstance(builder_result, dict):
+        return builder_result
+    builder, mermaid_source, summary_data, parts = builder_result
+    mermaid_source = _ensure_trailing_newline(mermaid_source)
+    path, size, sha256 = _write_mermaid_source(output_mermaid, mermaid_source)
+    return _WrittenSource(
+        path, size, sha256, summary_data, builder, mermaid_source, parts
+    )
+
+
+def _write_spooled_source(
+    parameters: Mapping[str, object],
+    spools: Spools,
+    output_mermaid: Path,
+    *,
+    ctx: object | None,
+) -> _WrittenSource | dict[str, object]:
+    try:
+        summary_data, size = _write_streamed_source(
+            parameters, spools, output_mermaid, ctx=ctx
+        )
+    except _DocumentItemError as exc:
+        return _streamed_item_failure(exc, parameters, spools)
+    path = str(output_mermaid)
+    return _WrittenSource(path, size, _file_sha256(path), summary_data)
+
+
+def _run_parameters(
+    parameters: Mapping[str, object],
+    *,
+    ctx: object | None,
+    trusted: bool,
+    spools: Spools | None = None,
+) -> dict[str, object]:
+    """Write, export and report one payload.
+
+    With ``spools`` the document arrays are applied from spool files while
+    the ``.mmd`` is streamed to disk (see :func:`main_json_stream`).
+    """
     output_mermaid_result = _resolve_output_mermaid(parameters)
     if isinstance(output_mermaid_result, dict):
         return output_mermaid_result
@@ -1474,33 +4102,74 @@ def main_json(
     export_svg, output_svg, mermaid_cli_path = _extract_export_options(parameters)
 
     try:
-        builder_result = _prepare_mermaid_source(parameters, ctx=ctx)
-        if isinstance(builder_result, dict):
-            return builder_result
-        builder, mermaid_source, summary_data = builder_result
-
-        mermaid_source = _ensure_trailing_newline(mermaid_source)
-        source_path_str, source_bytes = _write_mermaid_source(
-            output_mermaid_path, mermaid_source
+        written = (
+            _write_built_source(parameters, output_mermaid_path, ctx=ctx)
+            if spools is None
+            else _write_spooled_source(parameters, spools, output_mermaid_path, ctx=ctx)
+        )
+        if isinstance(written, dict):
+            return written
+        builder, summary_data, parts = (
+            written.builder,
+            written.summary_data,
+            written.parts,
+        )
+        source_path_str = written.path
+        # mmdc is fed ``<svg stem>.mmd``; when that is output_mermaid the
+        # exporter rewrites it, so compress it only once the export is done.
+        rewritten = (
+            not parts
+            and (export_svg or output_svg is not None)
+            and _svg_output_path(output_svg, output_mermaid_path).with_suffix(".mmd")
+            == output_mermaid_path
+        )
+        pool, queued = _start_precompression(
+            parameters, None if rewritten else source_path_str
         )
 
         messages: list[str] = []
         mermaid_artifact: dict[str, object] = {
             "source_path": source_path_str,
-            "source_bytes": source_bytes,
+            "source_bytes": written.size,
+            "source_sha256": written.sha256,
         }
 
-        if export_svg or output_svg is not None:
+        deadline = _resolve_deadline(parameters)
+        export_seconds = None if deadline is not None else _budget_seconds(parameters)
+        timeout = deadline.seconds if deadline is not None else export_seconds
+        if timeout is not None:
+            summary_data["timeout_seconds"] = timeout
+        part_artifacts: list[dict[str, object]] = []
+        if parts:
+            part_artifacts, part_messages = _write_split_parts(
+                parts,
+                output_mermaid=output_mermaid_path,
+                export_options=(export_svg, output_svg, mermaid_cli_path),
+                builder=builder,
+                deadline=deadline,
+                optimizer=_extract_svg_optimizer(parameters),
+                export_seconds=export_seconds,
+            )
+            messages.extend(part_messages)
+            summary_data["parts"] = part_artifacts
+        elif export_svg or output_svg is not None:
             svg_payload, export_messages = _maybe_to_svg(
-                mermaid_source,
+                (
+                    written.text
+                    if written.text is not None
+                    else output_mermaid_path.read_text(encoding="utf-8")
+                ),
                 output_svg=output_svg,
                 output_mermaid=output_mermaid_path,
                 mermaid_cli_path=mermaid_cli_path,
                 builder=builder,
+                deadline=_export_deadline(deadline, export_seconds),
+                optimizer=_extract_svg_optimizer(parameters),
             )
             messages.extend(export_messages)
             if svg_payload is not None:
-                mermaid_artifact["svg"] = svg_payload
+                _attach_svg(mermaid_artifact, svg_payload)
+        _finish_precompression(pool, queued, mermaid_artifact, part_artifacts)
 
         summary = _compose_summary(
             summary_data,
@@ -1517,26 +4186,272 @@ def main_json(
             details={"error": str(exc)},
         )
 
-    output_failure = _validate_output_schema(result)
+    output_failure = None if trusted else _validate_output_schema(result)
+    _flush_run_metrics()
     if output_failure:
         return output_failure
     return result
 
 
+# Streaming ingestion
+
+_STREAM_BATCH_SIZE = 1024
+# Options that need the whole graph in memory; such payloads load fully.
+_WHOLE_GRAPH_OPTIONS: tuple[str, ...] = ("reduce", "budget", "canonical")
+_DOCUMENT_SCHEMA_PATH: tuple[str, ...] = (
+    "properties",
+    "parameters",
+    "properties",
+    "document",
+    "properties",
+)
+
+Spools = dict[str, Path]
+
+
+def _spool_array(reader: JsonStreamReader, path: Path) -> Path:
+    with path.open("w", encoding="utf-8") as handle:
+        for element in reader.iter_values():
+            handle.write(json.dumps(element, separators=(",", ":")))
+            handle.write("\n")
+    return path
+
+
+def _read_stream_document(
+    reader: JsonStreamReader, spool_dir: Path, spools: Spools
+) -> dict[str, object]:
+    document: dict[str, object] = {}
+    for key in reader.iter_object():
+        if key in _BODY_APPLIERS and reader.peek() == "[":
+            spools[key] = _spool_array(reader, spool_dir / f"{key}.jsonl")
+            # Placeholder so the shell validator still sees an array.
+            document[key] = []
+        else:
+            document[key] = reader.read_value()
+    return document
+
+
+def _read_stream_parameters(
+    reader: JsonStreamReader, spool_dir: Path, spools: Spools
+) -> dict[str, object]:
+    parameters: dict[str, object] = {}
+    for key in reader.iter_object():
+        if key == "document" and reader.peek() == "{":
+            parameters[key] = _read_stream_document(reader, spool_dir, spools)
+        else:
+            parameters[key] = reader.read_value()
+    return parameters
+
+
+def _read_stream_payload(
+    reader: JsonStreamReader, spool_dir: Path
+) -> tuple[dict[str, object], Spools]:
+    """Read the payload envelope, spooling document body arrays to disk."""
+    if reader.peek() != "{":
+        message = "JSON payload must be a mapping"
+        raise ValueError(message)
+    spools: Spools = {}
+    payload: dict[str, object] = {}
+    for key in reader.iter_object():
+        if key == "parameters" and reader.peek() == "{":
+            payload[key] = _read_stream_parameters(reader, spool_dir, spools)
+        else:
+            payload[key] = reader.read_value()
+    if reader.peek():
+        message = f"unexpected data after JSON payload at offset {reader.offset}"
+        raise ValueError(message)
+    return payload, spools
+
+
+def _spooled_batches(path: Path | None) -> Iterator[list[object]]:
+    if path is None:
+        return
+    batch: list[object] = []
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            batch.append(json.loads(line))
+            if len(batch) >= _STREAM_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _unspool(parameters: Mapping[str, object], spools: Spools) -> None:
+    document = cast("dict[str, object]", parameters["document"])
+    for array, path in spools.items():
+        document[array] = [item for batch in _spooled_batches(path) for item in batch]
+
+
+def _drain_lines(doc: MermaidDoc, sink: IO[str] | None) -> None:
+    if sink is not None and doc.lines:
+        sink.write("\n".join(doc.lines))
+        sink.write("\n")
+    doc.lines.clear()
+    doc.line_refs.clear()
+    doc.nodes.clear()
+    doc.edges.clear()
+
+
+def _stream_body(
+    builder: MermaidBuilder, spools: Spools, sink: IO[str] | None
+) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for array, applier in _BODY_APPLIERS.items():
+        offset = 0
+        for batch in _spooled_batches(spools.get(array)):
+            try:
+                applier(builder, batch)
+            except _DocumentItemError as exc:
+                raise _DocumentItemError(array, offset + exc.index) from None
+            offset += len(batch)
+            _drain_lines(builder.doc, sink)
+        counts[array] = offset
+    _drain_lines(builder.doc, sink)
+    return counts
+
+
+def _write_streamed_source(
+    parameters: Mapping[str, object],
+    spools: Spools,
+    output_mermaid: Path,
+    *,
+    ctx: object | None,
+) -> tuple[dict[str, object], int]:
+    """Write the .mmd file while applying spooled document arrays in batches."""
+    source_obj = parameters.get("source")
+    explicit = source_obj if isinstance(source_obj, str) and source_obj else None
+    document_obj = parameters.get("document")
+    summary_data: dict[str, object] = {}
+    output_mermaid.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=output_mermaid.parent, prefix=f".{output_mermaid.name}.", suffix=".tmp"
+    )
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as handle:
+            if isinstance(document_obj, Mapping):
+                document = cast("Mapping[str, object]", document_obj)
+                builder = MermaidBuilder(ctx=ctx)
+                diagram = _apply_preamble(builder, document)
+                # An explicit source wins; the document is still validated.
+                sink = None if explicit is not None else handle
+                if sink is not None:
+                    doc = builder.doc
+                    sink.write("\n".join([*doc.directives, *doc.comments, doc.header]))
+                    sink.write("\n")
+                counts = _stream_body(builder, spools, sink)
+                summary_data = _document_summary(diagram, counts, document)
+            if explicit is not None:
+                handle.write(_ensure_trailing_newline(explicit))
+        tmp_path.replace(output_mermaid)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    size = output_mermaid.stat().st_size
+    metrics = active_metrics()
+    if metrics is not None:
+        metrics.inc("bytes_written_total", size, kind="mmd")
+    return summary_data, size
+
+
+def _streamed_item_failure(
+    error: _DocumentItemError, parameters: Mapping[str, object], spools: Spools
+) -> dict[str, object]:
+    """Failure payload for one bad element, with jsonschema's full paths."""
+    spool = spools.get(error.array)
+    if spool is not None:
+        with spool.open(encoding="utf-8") as handle:
+            line = next(itertools.islice(handle, error.index, None))
+        item = cast("object", json.loads(line))
+    else:
+        document = cast("Mapping[str, object]", parameters["document"])
+        item = _document_items(document, error.array)[error.index]
+    try:
+        validate_payload(
+            cast("Mapping[str, object]", item), DOCUMENT_ITEM_SCHEMAS[error.array]
+        )
+    except ValidationErrorType as exc:
+        schema_prefix = (*_DOCUMENT_SCHEMA_PATH, error.array, "items")
+        return _failure_payload(
+            "input payload failed validation",
+            details={
+                "error": exc.message,
+                "path": [str(p) for p in (*error.path, *exc.path)],
+                "schema_path": [str(p) for p in (*schema_prefix, *exc.schema_path)],
+            },
+        )
+    return _failure_payload(
+        "input payload failed validation",
+        details={"error": str(error), "path": [str(p) for p in error.path]},
+    )
+
+
+def _open_payload_stream(
+    source: str | Path | IO[str],
+) -> AbstractContextManager[IO[str]]:
+    if isinstance(source, (str, Path)):
+        return Path(source).open(encoding="utf-8")
+    return nullcontext(source)
+
+
+def _run_streamed_payload(
+    payload: Mapping[str, object],
+    spools: Spools,
+    *,
+    ctx: object | None,
+    trusted: bool,
+    memo: ResultMemo | None,
+) -> dict[str, object]:
+    schema_failure = _validate_input_schema(payload, defer_document_items=True)
+    if schema_failure:
+        return schema_failure
+    parameters = cast("Mapping[str, object]", payload["parameters"])
+    if any(option in parameters for option in _WHOLE_GRAPH_OPTIONS):
+        _unspool(parameters, spools)
+        return _run_memoized(parameters, ctx=ctx, trusted=trusted, memo=memo)
+    return _run_memoized(parameters, ctx=ctx, trusted=trusted, memo=memo, spools=spools)
+
+
+def main_json_stream(
+    source: str | Path | IO[str],
+    *,
+    ctx: object | None = None,
+    trusted: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    memo: ResultMemo | None = None,
+) -> dict[str, object]:
+    """Run a JSON payload read incrementally from a file path or text stream.
+
+    Document ``nodes``, ``edges``, ``lines`` and ``instructions`` are decoded
+    one element at a time, spooled to a scratch directory and applied in
+    batches while the ``.mmd`` file is written, so peak memory stays bounded
+    regardless of payload size. Payloads using ``reduce`` or ``budget`` need
+    the whole graph and are loaded back from the spools first. ``ctx``,
+    ``trusted`` and ``memo`` behave as in :func:`main_json`.
+    """
+    with tempfile.TemporaryDirectory(prefix="x_make_mermaid_stream_") as spool_name:
+        try:
+            with _open_payload_stream(source) as handle:
+                reader = JsonStreamReader(handle, chunk_size)
+                payload, spools = _read_stream_payload(reader, Path(spool_name))
+        except (OSError, ValueError) as exc:
+            return _failure_payload(
+                "failed to read JSON payload", details={"error": str(exc)}
+            )
+        return _run_streamed_payload(
+            payload, spools, ctx=ctx, trusted=trusted, memo=memo
+        )
+
+
 def _load_json_payload(file_path: str | None) -> Mapping[str, object]:
     def _load(stream: IO[str]) -> Mapping[str, object]:
         raw_payload_obj = cast("object", json.load(stream))
-        if not isinstance(raw_payload_obj, Mapping):
+        if not isinstance(raw_payload_obj, dict):
             message = "JSON payload must be a mapping"
             raise TypeError(message)
-        raw_payload = cast("Mapping[object, object]", raw_payload_obj)
-        payload_dict: dict[str, object] = {}
-        for key, value in raw_payload.items():
-            if not isinstance(key, str):
-                message = "JSON payload keys must be strings"
-                raise TypeError(message)
-            payload_dict[key] = value
-        return MappingProxyType(payload_dict)
+        # JSON object keys are always strings; hand the dict over uncopied.
+        return cast("dict[str, object]", raw_payload_obj)
 
     if file_path:
         with Path(file_path).open("r", encoding="utf-8") as handle:
@@ -1550,6 +4465,11 @@ def _run_json_cli(args: Sequence[str]) -> None:
         "--json", action="store_true", help="Read JSON payload from stdin"
     )
     parser.add_argument("--json-file", type=str, help="Path to JSON payload file")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse document arrays incrementally to bound memory on huge payloads",
+    )
     parsed = parser.parse_args(args)
 
     json_flag_obj: object = cast("object", getattr(parsed, "json", False))
@@ -1560,8 +4480,12 @@ def _run_json_cli(args: Sequence[str]) -> None:
     if not (read_from_stdin or json_file):
         parser.error("JSON input required. Use --json for stdin or --json-file <path>.")
 
-    payload = _load_json_payload(None if read_from_stdin else json_file)
-    result = main_json(payload)
+    if bool(cast("object", getattr(parsed, "stream", False))):
+        stream_source = _sys.stdin if read_from_stdin or not json_file else json_file
+        result = main_json_stream(stream_source)
+    else:
+        payload = _load_json_payload(None if read_from_stdin else json_file)
+        result = main_json(payload)
     json.dump(result, _sys.stdout, indent=2)
     _sys.stdout.write("\n")
 
@@ -1577,4 +4501,34 @@ class MermaidMake(MermaidBuilder):
 x_cls_make_mermaid_x = MermaidMake
 
 
-__all__ = ["MermaidBuilder", "MermaidMake", "main_json", "x_cls_make_mermaid_x"]
+__all__ = [
+    "DEFAULT_NAMESPACE_SEPARATOR",
+    "REDUCTION_STRATEGIES",
+    "CommandTimeoutError",
+    "Deadline",
+    "ExportJob",
+    "FlowEdge",
+    "FlowNode",
+    "MermaidBuilder",
+    "MermaidCliCache",
+    "MermaidCliInfo",
+    "MermaidDoc",
+    "MermaidMake",
+    "ReductionReport",
+    "canonical_source",
+    "compact_flowchart",
+    "configure_cli_cache",
+    "configure_result_memo",
+    "deadline_runner",
+    "export_concurrently",
+    "get_cli_cache",
+    "get_result_memo",
+    "main_json",
+    "main_json_stream",
+    "merge_docs",
+    "mermaid_cli_version",
+    "reduce_flowchart",
+    "run_command",
+    "split_flowchart",
+    "x_cls_make_mermaid_x",
+]